@@ -2,18 +2,36 @@
 # Trevor Pottinger
 # Sun Jun 15 10:27:29 PDT 2014
 
+from __future__ import division
+from __future__ import print_function
+
 import math
 import random
+import struct
 
 from random import shuffle as rand_shuffle
 from random import randint as rand_num
-from fractions import gcd
+
+import numpy as np
+
+try:
+  from math import gcd
+except ImportError:
+  from fractions import gcd
+
+# magic, version, num_funcs, num_bits, num_adds. Followed by num_funcs pairs of
+# uint64 (multiplicand, offset), and then the num_bits / 64 uint64 words.
+# Everything is little endian, and the words start 8 byte aligned.
+MAGIC = b'BLOOMFLT'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
 
 def _is_coprime(a, b):
   return gcd(a, b) == 1
 
 def _hash_builder(num_bits):
-  'Returns a simple hash function that uses num_bits as the modulo'
+  """Returns the (multiplicand, offset) pair for a simple hash function that
+  uses num_bits as the modulo. See _hash and _hash_many for how they're used"""
   assert num_bits > 1, 'Hash functions with <2 modulo are just silly'
   c = rand_num(0, num_bits-1)
   while not _is_coprime(c, num_bits):
@@ -22,22 +40,39 @@ def _hash_builder(num_bits):
   a = rand_num(1, num_bits-1)
   while not _is_coprime(a, num_bits):
     a = rand_num(1, num_bits-1)
-  def __chunks(n):
-    'Breaks n up into smaller ints, so each one is smaller than num_bits'
-    ns = []
-    while n != 0:
-      ns.append(n % num_bits)
-      n = n / num_bits
-    return ns
-  def __hash(n):
-    # does this work for strings or other types as well? 
-    ns = __chunks(n)
-    x = (a * ns[0] + c) % num_bits
-    for i in range(1, len(ns)):
-      # this doesnt quite smell right, b/c x is reused
-      x = (a * x + ns[i]) % num_bits
-    return x
-  return __hash
+  return (a, c)
+
+def _hash(a, c, num_bits, n):
+  """Breaks n up into base num_bits digits, least significant first, and
+  folds them together as x = (a * x + digit) % num_bits, where the first
+  step uses c as the digit instead. Works for python ints of any size."""
+  # does this work for strings or other types as well?
+  log_bits = num_bits.bit_length() - 1
+  x = (a * (n & (num_bits - 1)) + c) % num_bits
+  n >>= log_bits
+  while n != 0:
+    # this doesnt quite smell right, b/c x is reused
+    x = (a * x + (n & (num_bits - 1))) % num_bits
+    n >>= log_bits
+  return x
+
+def _hash_many(a, c, num_bits, ns):
+  """Same as _hash, but for a whole uint64 array at once. a and c are
+  arrays of length num_funcs, and the result has shape (num_funcs, len(ns))"""
+  log_bits = num_bits.bit_length() - 1
+  mask = np.uint64(num_bits - 1)
+  a = np.asarray(a, dtype=np.uint64).reshape(-1, 1)
+  c = np.asarray(c, dtype=np.uint64).reshape(-1, 1)
+  x = (a * (ns & mask) + c) & mask
+  # Each number only has as many digits as it needs, so only keep folding
+  # for the numbers that still have some left
+  for shift in range(log_bits, 64, log_bits):
+    rest = ns >> np.uint64(shift)
+    more = rest != 0
+    if not more.any():
+      break
+    x = np.where(more, (a * x + (rest & mask)) & mask, x)
+  return x
 
 class BloomFilter(object):
   """A naive implementation of bloom filters. Specifically targetting the use
@@ -50,12 +85,15 @@ class BloomFilter(object):
   def __init__(self, num_funcs, num_bits, to_build=True):
     assert num_bits > 64, 'Only more than 64 bits please'
     assert num_bits != 0 and ((num_bits & (num_bits - 1)) == 0), 'Only powers of two for now please'
+    # a * x has to fit in a uint64 for _hash_many
+    assert num_bits <= (1 << 32), 'Only up to 2^32 bits please'
     self.num_funcs = num_funcs
     self.num_bits = num_bits
     # begin needs building
     self.funcs = []
-    self.array = 0
-    self.array_mask = 0
+    self.multipliers = np.zeros(0, dtype=np.uint64)
+    self.offsets = np.zeros(0, dtype=np.uint64)
+    self.array = np.zeros(num_bits // 64, dtype=np.uint64)
     self.built = False
     self.num_adds = 0
     # end needs building
@@ -64,57 +102,136 @@ class BloomFilter(object):
 
   def deep_copy(self):
     copy = BloomFilter(self.num_funcs, self.num_bits, False)
-    copy.funcs = list(self.funcs) # is this really a deep copy?
-    copy.array = self.array # number assignment is by value
-    copy.array_mask = self.array_mask
+    # The hash functions are shared on purpose, so the two filters' bits line up
+    copy.setFuncs(self.funcs)
+    copy.array = self.array.copy()
+    copy.built = self.built
     return copy
 
   def __build(self):
     """Generate the necessary hash functions for this bloom filter. A
-    hash function takes a number and returns a number in the range 
+    hash function takes a number and returns a number in the range
     [0,num_bits]"""
-    print "Building %d hash functions..." % self.num_funcs
-    self.funcs = [ _hash_builder(self.num_bits) for _ in range(self.num_funcs) ]
-    print "Building an array of length 2^%d (%d)..." % (math.log(self.num_bits, 2), self.num_bits)
-    self.array = 1 << self.num_bits
-    self.array_mask = (1 << self.num_bits) - 1
+    print("Building %d hash functions..." % self.num_funcs)
+    self.setFuncs([ _hash_builder(self.num_bits) for _ in range(self.num_funcs) ])
+    print("Building an array of length 2^%d (%d)..." % (math.log(self.num_bits, 2), self.num_bits))
+    self.array = np.zeros(self.num_bits // 64, dtype=np.uint64)
     self.built = True
 
-  def load(funcs_str, arr_str):
-    bf_set = BloomFilter(len(funcs_str.split(":")), len(arr_str) / 2, False)
-    bf_set.funcs = [[]] * bf_set.num_funcs # TODO
-    bf_set.array = int(arr_str, 16)
+  @staticmethod
+  def load(in_file, mode='r'):
+    """Reads a filter written by save(). The words are memory mapped rather
+    than read, so loading is instant and processes that load the same file
+    share its pages. mode is passed to np.memmap: 'r' is read only, 'c' is
+    copy on write and 'r+' writes adds back to the file."""
+    with open(in_file, 'rb') as f:
+      magic, version, num_funcs, num_bits, num_adds = HEADER.unpack(f.read(HEADER.size))
+      if magic != MAGIC:
+        raise Exception("%s is not a saved bloom filter" % in_file)
+      if version != VERSION:
+        raise Exception("Unsupported bloom filter version %d" % version)
+      params = np.frombuffer(f.read(16 * num_funcs), dtype='<u8')
+    bf = BloomFilter(num_funcs, num_bits, False)
+    bf.setFuncs(zip(params[0::2].tolist(), params[1::2].tolist()))
+    bf.array = np.memmap(in_file, dtype='<u8', mode=mode,
+      offset=HEADER.size + 16 * num_funcs, shape=(num_bits // 64,))
+    bf.num_adds = num_adds
+    bf.built = True
+    return bf
+
+  @staticmethod
+  def loadRepr(funcs_str, arr_str):
+    'The inverse of getFunctionRepr() and getArrayRepr()'
+    funcs = [tuple(map(int, f.split(','))) for f in funcs_str.split(':')]
+    bf = BloomFilter(len(funcs), len(arr_str) * 4, False)
+    bf.setFuncs(funcs)
+    bf.setArray(int(arr_str, 16))
+    bf.built = True
+    return bf
+
+  def save(self, out_file):
+    with open(out_file, 'wb') as f:
+      f.write(HEADER.pack(MAGIC, VERSION, self.num_funcs, self.num_bits, self.num_adds))
+      params = np.zeros(2 * self.num_funcs, dtype='<u8')
+      params[0::2] = self.multipliers
+      params[1::2] = self.offsets
+      f.write(params.tobytes())
+      f.write(self.array.astype('<u8').tobytes())
+    return out_file
 
   # SETTERS
 
+  def setFuncs(self, funcs):
+    'Takes a list of (multiplicand, offset) pairs, like from _hash_builder'
+    self.funcs = list(funcs)
+    self.multipliers = np.array([a for a, _ in self.funcs], dtype=np.uint64)
+    self.offsets = np.array([c for _, c in self.funcs], dtype=np.uint64)
+    return self
+
   def add(self, n):
     self.num_adds += 1
-    self.array |= self.get_hash(n)
+    for i in self._indices(n):
+      self.array[i >> 6] |= np.uint64(1 << (i & 63))
+    return self
+
+  def add_many(self, ns):
+    """Adds every number in ns, an array of non-negative ints less than
+    2^64, with one pass per hash function instead of one per number"""
+    ns = np.asarray(ns, dtype=np.uint64).ravel()
+    self.num_adds += ns.shape[0]
+    indices = self._indices_many(ns).ravel()
+    bits = np.left_shift(np.uint64(1), indices & np.uint64(63))
+    np.bitwise_or.at(self.array, indices >> np.uint64(6), bits)
     return self
 
   def setArray(self, array):
-    self.array = array
+    'Takes either a python int or an array of num_bits / 64 uint64 words'
+    if isinstance(array, np.ndarray):
+      assert array.shape == self.array.shape, 'Array is the wrong size'
+      self.array = array.astype(np.uint64)
+      return self
+    mask = (1 << self.num_bits) - 1
+    self.array = np.frombuffer(
+      (array & mask).to_bytes(self.num_bits // 8, 'little'),
+      dtype='<u8').astype(np.uint64)
     return self
 
   # GETTERS
 
+  def _indices(self, n):
+    return [_hash(a, c, self.num_bits, n) for a, c in self.funcs]
+
+  def _indices_many(self, ns):
+    return _hash_many(self.multipliers, self.offsets, self.num_bits, ns)
+
   def get_hash(self, n):
-    # map hashes on n, results in list of indicies
-    hashes = map(lambda f: f(n), self.funcs)
-    # map indicies to integer with that bit set
-    nums = map(lambda i: 1 << i, hashes)
-    return reduce(lambda a, num: a | num, nums, 0)
+    # map hashes on n, results in list of indicies, then map indicies to an
+    # integer with that bit set
+    h = 0
+    for i in self._indices(n):
+      h |= 1 << i
+    return h
 
   def contains(self, n):
-    h = self.get_hash(n)
-    return h  == (self.array & h)
+    for i in self._indices(n):
+      if not (int(self.array[i >> 6]) >> (i & 63)) & 1:
+        return False
+    return True
+
+  def contains_many(self, ns):
+    'Returns a boolean array of whether each number in ns is in the filter'
+    ns = np.asarray(ns, dtype=np.uint64).ravel()
+    indices = self._indices_many(ns)
+    words = self.array[indices >> np.uint64(6)]
+    bits = (words >> (indices & np.uint64(63))) & np.uint64(1)
+    return bits.all(axis=0)
 
   def getArrayVal(self):
-    return self.array & self.array_mask
+    return int.from_bytes(self.array.astype('<u8').tobytes(), 'little')
 
   def getArrayRepr(self):
-    s = hex(self.getArrayVal()).lstrip('0x').rstrip('L')
-    expected_len = self.num_bits / 4 # expected string length
+    s = hex(self.getArrayVal())[2:].rstrip('L')
+    expected_len = self.num_bits // 4 # expected string length
     if len(s) < expected_len:
       return '0' * (expected_len - len(s)) + s
     elif len(s) > expected_len:
@@ -123,10 +240,11 @@ class BloomFilter(object):
       return s
 
   def getFunctionRepr(self):
-    return "<function_repr>"
+    'Returns "a,c:a,c:..." for the multiplicand and offset of each hash'
+    return ':'.join('%d,%d' % (a, c) for a, c in self.funcs)
 
   def __str__(self):
-    return hex(self.getArrayVal())[2:-1]
+    return hex(self.getArrayVal())[2:]
 
   # end BloomFilter
 
@@ -136,8 +254,14 @@ def test_bf():
   tests[0] = BloomFilter(3, 128, 255)
   tests[0].add(2**7 + 2**5)
   tests[0].add(2**5 + 2**3)
-  print tests[0].getArrayRepr()
+  print(tests[0].getArrayRepr())
+
+  print(tests[0].contains(2**7 + 2**5))
+  print(tests[0].contains(2**5 + 2**3))
+  print(tests[0].contains(2**5))
 
-  print tests[0].contains(2**7 + 2**5)
-  print tests[0].contains(2**5 + 2**3)
-  print tests[0].contains(2**5)
+  ns = np.arange(1, 1 << 12, dtype=np.uint64)
+  tests[1] = BloomFilter(3, 1 << 10).add_many(ns[::3])
+  print(tests[1].contains_many(ns).sum(), 'of', len(ns), 'maybe in the filter')
+  assert tests[1].contains_many(ns[::3]).all(), 'False negatives NEVER happen'
+  assert all(tests[1].contains(int(n)) for n in ns[::3])
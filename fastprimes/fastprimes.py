@@ -2,16 +2,33 @@
 # Trevor Pottinger
 # Sun Sep 14 22:55:00 PDT 2014
 
+from __future__ import division
+from __future__ import print_function
+
+import argparse
 import sys
 
+import numpy as np
+
 from bloom_filter import BloomFilter
+from primelist import base_primes, parsefile, sieve_block
 
-def n_primes(n):
-  "Returns the first n primes"
+# The number of integers checked against the filters at a time. Each segment
+# needs a few bytes per integer for the masks and uint64 hashes.
+SEGMENT_SIZE = 1 << 22
+
+def n_primes(n, table_file=None):
+  """Returns the first n primes. If table_file is a prime table from
+  primelist.build, the primes are read from it instead of being generated"""
   assert n < (1 << 35), 'Less than 2^35 primes please'
   assert n > 2, 'Less than 2 primes isnt interesting'
+  if table_file is not None:
+    with parsefile(table_file) as table:
+      primes = table.first_primes(n).tolist()
+    print("Read a total of %d primes from %s" % (len(primes), table_file))
+    return primes
   primes = [2, 3]
-  print "Starting the generation of primes with seed(s) %s" % str(primes)
+  print("Starting the generation of primes with seed(s) %s" % str(primes))
   while len(primes) < n:
     possible_prime = primes[-1]
     while True:
@@ -24,24 +41,82 @@ def n_primes(n):
       if is_possible:
         primes.append(possible_prime)
         break
-  print "Finished, generated a total of %d primes" % len(primes)
+  print("Finished, generated a total of %d primes" % len(primes))
   return primes
 
+def list_segments(primes, lo, hi, segment_size=SEGMENT_SIZE):
+  """Yields (start, is_prime) for consecutive segments of [lo, hi), where
+  is_prime[i] says whether start + i is in the sorted list primes"""
+  primes = np.asarray(primes, dtype=np.int64)
+  for start in range(lo, hi, segment_size):
+    end = min(start + segment_size, hi)
+    is_prime = np.zeros(end - start, dtype=np.bool_)
+    inside = primes[np.searchsorted(primes, start):np.searchsorted(primes, end)]
+    is_prime[inside - start] = True
+    yield (start, is_prime)
+
+def sieve_segments(lo, hi, segment_size=SEGMENT_SIZE):
+  """Same as list_segments, but the primes come from sieving each segment,
+  so the full list of primes is never held in memory"""
+  assert segment_size % 2 == 0, 'Segments must start on the same parity'
+  odd_primes = base_primes(int(hi ** 0.5) + 1)
+  for start in range(lo, hi, segment_size):
+    end = min(start + segment_size, hi)
+    is_prime = np.zeros(end - start, dtype=np.bool_)
+    first_odd = start | 1
+    n_odds = (end - first_odd + 1) // 2
+    if n_odds > 0:
+      is_prime[first_odd - start::2] = sieve_block(first_odd, n_odds, odd_primes)
+    if start <= 2 < end:
+      is_prime[2 - start] = True
+    yield (start, is_prime)
+
 class FastPrimes(object):
   def __init__(self, primes, num_prime_funcs, num_prime_bits, num_fp_funcs, num_fp_bits):
+    """Builds the filters over every integer in [primes[0], primes[-1]),
+    using the sorted list primes as the source of truth"""
     self.primes_bloom_filter = BloomFilter(num_prime_funcs, num_prime_bits)
     self.fps_bloom_filter = BloomFilter(num_fp_funcs, num_fp_bits)
-    print 'Adding primes'
-    for p in primes[:-1]: # why ignore the last prime?
-      self.primes_bloom_filter.add(p)
-    print 'Adding false positives..'
-    for i in range(primes[0], primes[-1]):
-      true_prime = i in primes
-      bf_prime = self.primes_bloom_filter.contains(i)
-      if true_prime and not bf_prime:
-        assert False, 'False negatives NEVER happen'
-      elif not true_prime and bf_prime:
-        self.fps_bloom_filter.add(i)
+    # why ignore the last prime?
+    lo, hi = primes[0], primes[-1]
+    self._build(lambda: list_segments(primes, lo, hi))
+
+  @classmethod
+  def fromRange(cls, lo, hi, num_prime_funcs, num_prime_bits, num_fp_funcs, num_fp_bits):
+    """Builds the filters over every integer in [lo, hi) by sieving one
+    segment at a time, instead of starting from a list of primes"""
+    fprimes = cls.__new__(cls)
+    fprimes.primes_bloom_filter = BloomFilter(num_prime_funcs, num_prime_bits)
+    fprimes.fps_bloom_filter = BloomFilter(num_fp_funcs, num_fp_bits)
+    fprimes._build(lambda: sieve_segments(lo, hi))
+    return fprimes
+
+  def _build(self, segments):
+    """segments is a function returning a fresh generator of (start,
+    is_prime) pairs. It's called twice, because false positives can only be
+    found once every prime is in the primes filter."""
+    print('Adding primes')
+    for start, is_prime in segments():
+      self.primes_bloom_filter.add_many(start + np.flatnonzero(is_prime))
+    print('Adding false positives..')
+    for start, is_prime in segments():
+      primes = start + np.flatnonzero(is_prime)
+      assert self.primes_bloom_filter.contains_many(primes).all(), 'False negatives NEVER happen'
+      composites = start + np.flatnonzero(~is_prime)
+      self.fps_bloom_filter.add_many(composites[self.primes_bloom_filter.contains_many(composites)])
+
+  @classmethod
+  def load(cls, primes_file, fps_file, mode='r'):
+    "Loads the two filters written by save(), without rebuilding anything"
+    fprimes = cls.__new__(cls)
+    fprimes.primes_bloom_filter = BloomFilter.load(primes_file, mode)
+    fprimes.fps_bloom_filter = BloomFilter.load(fps_file, mode)
+    return fprimes
+
+  def save(self, primes_file, fps_file):
+    self.primes_bloom_filter.save(primes_file)
+    self.fps_bloom_filter.save(fps_file)
+    return (primes_file, fps_file)
 
   def isPrime(self, n):
     bf_prime = self.primes_bloom_filter.contains(n)
@@ -51,19 +126,33 @@ class FastPrimes(object):
     else:
       return False
 
+  def isPrimeMany(self, ns):
+    'Returns a boolean array of isPrime for each number in the array ns'
+    ns = np.asarray(ns, dtype=np.uint64)
+    ret = self.primes_bloom_filter.contains_many(ns)
+    # Only the numbers in the primes filter need to check the other filter
+    maybe = np.flatnonzero(ret)
+    ret[maybe] = ~self.fps_bloom_filter.contains_many(ns[maybe])
+    return ret
+
   def evaluate(self, primes):
     """Tests every number between the first and last primes, including the
     numbers not in primes. We use the primes array as the source of truth."""
-    num_false_positives, num_double_fps, min_false_positive = (0, 0, primes[-1] + 1)
-    for i in range(primes[0], primes[-1]):
-      true_prime = i in primes
-      my_prime = self.isPrime(i)
-      if true_prime and not my_prime:
-        num_double_fps += 1
-      elif not true_prime and my_prime:
-        num_false_positives += 1
-        if i < min_false_positive:
-          min_false_positive = i
+    return self._evaluate(list_segments(primes, primes[0], primes[-1]), primes[-1] + 1)
+
+  def evaluateRange(self, lo, hi):
+    'Same as evaluate, but for [lo, hi) with a sieve as the source of truth'
+    return self._evaluate(sieve_segments(lo, hi), hi)
+
+  def _evaluate(self, segments, no_false_positive):
+    num_false_positives, num_double_fps, min_false_positive = (0, 0, no_false_positive)
+    for start, true_prime in segments:
+      my_prime = self.isPrimeMany(np.arange(start, start + true_prime.shape[0]))
+      num_double_fps += int(np.count_nonzero(true_prime & ~my_prime))
+      false_positives = np.flatnonzero(~true_prime & my_prime)
+      num_false_positives += false_positives.shape[0]
+      if false_positives.shape[0] > 0:
+        min_false_positive = min(min_false_positive, start + int(false_positives[0]))
     return (num_false_positives, num_double_fps, min_false_positive)
 
   def getCounts(self):
@@ -71,25 +160,37 @@ class FastPrimes(object):
 
 # main method, todo move to separate file
 if __name__ == '__main__':
-  if len(sys.argv) == 7:
-    num_primes = int(sys.argv[1])
-    num_funcs = int(sys.argv[2])
-    num_bits = 1 << int(sys.argv[3])
-    num_fp_funcs = int(sys.argv[4])
-    num_fp_bits = 1 << int(sys.argv[5])
-    num_iterations = int(sys.argv[6])
-  else:
-    num_primes = 10000
-    num_funcs = 2
-    num_bits = 1 << 16 # 64K
-    num_fp_funcs = 5
-    num_fp_bits = 1 << 10
-    num_iterations = 10
-  primes = n_primes(num_primes)
-  for i in range(num_iterations):
-    print "### Run %d ###" % (i+1)
-    fprimes = FastPrimes(primes, num_funcs, num_bits, num_fp_funcs, num_fp_bits)
-    print 'Evaluating results'
-    (fps, in_both, min_fp) = fprimes.evaluate(primes)
-    print 'False positives %d, in both %d, min false pos %d' % (fps, in_both, min_fp)
-    print 'Counts=', fprimes.getCounts()
+  parser = argparse.ArgumentParser(description='Builds and evaluates a ' +
+    'pair of bloom filters for checking if a number is prime')
+  parser.add_argument('num_primes', type=int, nargs='?', default=10000)
+  parser.add_argument('num_funcs', type=int, nargs='?', default=2)
+  parser.add_argument('log_bits', type=int, nargs='?', default=16, help='64K')
+  parser.add_argument('num_fp_funcs', type=int, nargs='?', default=5)
+  parser.add_argument('log_fp_bits', type=int, nargs='?', default=10)
+  parser.add_argument('num_iterations', type=int, nargs='?', default=10)
+  parser.add_argument('table_file', nargs='?', help='A prime table from ' +
+    'primelist.py to read the primes from')
+  parser.add_argument('--stream', type=int, help='Instead of the first ' +
+    'num_primes primes, sieve every integer in [2, STREAM) in segments')
+  args = parser.parse_args()
+  num_bits = 1 << args.log_bits
+  num_fp_bits = 1 << args.log_fp_bits
+
+  primes = None
+  if args.stream is None:
+    primes = n_primes(args.num_primes, args.table_file)
+  for i in range(args.num_iterations):
+    print("### Run %d ###" % (i+1))
+    if primes is None:
+      fprimes = FastPrimes.fromRange(2, args.stream, args.num_funcs, num_bits,
+        args.num_fp_funcs, num_fp_bits)
+    else:
+      fprimes = FastPrimes(primes, args.num_funcs, num_bits, args.num_fp_funcs,
+        num_fp_bits)
+    print('Evaluating results')
+    if primes is None:
+      (fps, in_both, min_fp) = fprimes.evaluateRange(2, args.stream)
+    else:
+      (fps, in_both, min_fp) = fprimes.evaluate(primes)
+    print('False positives %d, in both %d, min false pos %d' % (fps, in_both, min_fp))
+    print('Counts=', fprimes.getCounts())
@@ -1,11 +1,194 @@
 # primelist.py
 # Wed Jan 28 13:17:02 PST 2015
 
-def build():
-  pass
+"""A compact, on disk table of primes. The file is a bitmap of the odd
+numbers below some limit, plus an index of how many primes come before each
+block of the bitmap. Reading it is just an mmap, so answering is_prime(n),
+pi(n) and nth_prime(k) doesn't require generating any primes.
 
-def parsefile():
-  pass
+Layout, all little endian:
+  header       magic, version, block_odds, limit, num_blocks, total_primes
+  block index  num_blocks + 1 uint64s, the number of primes less than the
+               first odd of each block (so index[0] == 1 for the prime 2)
+  bitmap       bit i (np.packbits order='little') is set if 2 * i + 1 is prime
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'PRIMETBL'
+VERSION = 1
+# magic, version, block_odds, limit, num_blocks, total_primes
+HEADER = struct.Struct('<8sIIQQQ')
+# Each block covers 2 ** 15 odd numbers, or 4KB of bitmap
+DEFAULT_BLOCK_ODDS = 1 << 15
+
+# The number of set bits in each possible byte
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def base_primes(n):
+  'Returns the odd primes less than or equal to n, using a simple sieve'
+  is_prime = np.ones(n // 2 + 1, dtype=np.bool_) # index i is 2 * i + 1
+  is_prime[0] = False
+  i = 1
+  while (2 * i + 1) ** 2 <= n:
+    if is_prime[i]:
+      p = 2 * i + 1
+      is_prime[(p * p) // 2::p] = False
+    i += 1
+  odds = 2 * np.flatnonzero(is_prime).astype(np.int64) + 1
+  return odds[odds <= n]
+
+def sieve_block(lo, n_odds, odd_primes):
+  """Returns a boolean array for the odds lo, lo + 2, ... where lo is odd.
+  odd_primes must include every odd prime up to sqrt(lo + 2 * n_odds)."""
+  is_prime = np.ones(n_odds, dtype=np.bool_)
+  if lo == 1:
+    is_prime[0] = False
+  hi = lo + 2 * n_odds
+  for p in odd_primes.tolist():
+    if p * p >= hi:
+      break
+    start = max(p * p, ((lo + p - 1) // p) * p)
+    if start % 2 == 0:
+      start += p
+    is_prime[(start - lo) // 2::p] = False
+  return is_prime
+
+def build(out_file, limit, block_odds=DEFAULT_BLOCK_ODDS):
+  """Writes a table of every prime less than limit to out_file. Memory use is
+  bounded by one block and the primes up to sqrt(limit)."""
+  assert limit > 2, 'A table without any odd primes isnt interesting'
+  assert block_odds % 8 == 0, 'Blocks must be a whole number of bytes'
+  num_odds = limit // 2 # the odds 1, 3, ... less than limit
+  num_blocks = (num_odds + block_odds - 1) // block_odds
+  odd_primes = base_primes(int(limit ** 0.5) + 1)
+  index = np.zeros(num_blocks + 1, dtype='<u8')
+  index[0] = 1 # the prime 2 isn't in the bitmap
+  with open(out_file, 'wb') as f:
+    f.write(HEADER.pack(MAGIC, VERSION, block_odds, limit, num_blocks, 0))
+    index_offset = f.tell()
+    f.write(index.tobytes())
+    for b in range(num_blocks):
+      lo = 2 * b * block_odds + 1
+      n_odds = min(block_odds, num_odds - b * block_odds)
+      is_prime = sieve_block(lo, n_odds, odd_primes)
+      # Pad the last block so every block is the same number of bytes
+      bits = np.zeros(block_odds, dtype=np.bool_)
+      bits[:n_odds] = is_prime
+      f.write(np.packbits(bits, bitorder='little').tobytes())
+      index[b + 1] = index[b] + int(np.count_nonzero(is_prime))
+    # Now that the counts are known, go back and fill them in
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, block_odds, limit, num_blocks, int(index[-1])))
+    f.seek(index_offset)
+    f.write(index.tobytes())
+  return out_file
+
+class PrimeTable(object):
+  """Read only view of a file written by build(). Nothing is copied out of
+  the mmap, so opening even a large table is nearly instant."""
+
+  def __init__(self, in_file):
+    self.file = open(in_file, 'rb')
+    self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    (magic, version, self.block_odds, self.limit, self.num_blocks,
+      self.total_primes) = HEADER.unpack_from(self.mm, 0)
+    if magic != MAGIC:
+      raise Exception("%s is not a prime table" % in_file)
+    if version != VERSION:
+      raise Exception("Unsupported prime table version %d" % version)
+    self.block_bytes = self.block_odds // 8
+    self.index = np.frombuffer(self.mm, dtype='<u8',
+      count=self.num_blocks + 1, offset=HEADER.size)
+    self.bitmap = np.frombuffer(self.mm, dtype=np.uint8,
+      count=self.num_blocks * self.block_bytes,
+      offset=HEADER.size + self.index.nbytes)
+
+  def close(self):
+    # The arrays hold references to the mmap, so drop them first
+    self.index = None
+    self.bitmap = None
+    self.mm.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def _check(self, n):
+    if n >= self.limit:
+      raise Exception("%d is beyond the table's limit %d" % (n, self.limit))
+
+  def is_prime(self, n):
+    self._check(n)
+    if n < 3:
+      return n == 2
+    if n % 2 == 0:
+      return False
+    i = n // 2
+    return bool((self.bitmap[i >> 3] >> (i & 7)) & 1)
+
+  def pi(self, n):
+    'Returns the number of primes less than or equal to n'
+    self._check(n)
+    if n < 2:
+      return 0
+    i = (n - 1) // 2 # the index of the largest odd <= n
+    block = i // self.block_odds
+    start = block * self.block_bytes
+    end = i >> 3
+    count = int(self.index[block])
+    count += int(_POPCOUNT[self.bitmap[start:end]].sum(dtype=np.int64))
+    count += int(_POPCOUNT[self.bitmap[end] & ((1 << ((i & 7) + 1)) - 1)])
+    return count
+
+  def nth_prime(self, k):
+    'Returns the kth prime, where the first prime is 2'
+    assert k > 0, 'The primes start from k=1'
+    if k > self.total_primes:
+      raise Exception("The table only has %d primes" % self.total_primes)
+    if k == 1:
+      return 2
+    # index[block] < k <= index[block + 1]
+    block = int(np.searchsorted(self.index, k, side='left')) - 1
+    offsets = self._block_offsets(block)
+    return 2 * (block * self.block_odds + int(offsets[k - int(self.index[block]) - 1])) + 1
+
+  def _block_offsets(self, block):
+    start = block * self.block_bytes
+    bits = np.unpackbits(self.bitmap[start:start + self.block_bytes],
+      bitorder='little')
+    return np.flatnonzero(bits)
+
+  def first_primes(self, n):
+    'Returns an int64 array of the first n primes'
+    assert n > 0, 'Ask for at least one prime'
+    if n > self.total_primes:
+      raise Exception("The table only has %d primes" % self.total_primes)
+    last_block = int(np.searchsorted(self.index, n, side='left')) - 1
+    bits = np.unpackbits(self.bitmap[:(last_block + 1) * self.block_bytes],
+      bitorder='little')
+    odds = 2 * np.flatnonzero(bits).astype(np.int64) + 1
+    return np.concatenate([np.array([2], dtype=np.int64), odds])[:n]
+
+def parsefile(in_file):
+  'Opens a table written by build()'
+  return PrimeTable(in_file)
 
 if __name__ == '__main__':
-  pass
+  if len(sys.argv) == 3:
+    out_file, limit = sys.argv[1], int(sys.argv[2])
+    build(out_file, limit)
+    with parsefile(out_file) as table:
+      print("Wrote %d primes less than %d to %s" % (table.total_primes, limit, out_file))
+  else:
+    print("Usage: python primelist.py out_file limit")
@@ -0,0 +1,111 @@
+# test_bloom_filter.py
+# Trevor Pottinger
+# Sun Oct 18 14:02:11 PDT 2026
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bloom_filter import HEADER, MAGIC, VERSION, BloomFilter
+
+# Bit indexes on either side of each word boundary in a 256 bit filter. n is
+# in here exactly when 255 - n is.
+BOUNDARY_BITS = [0, 1, 62, 63, 64, 65, 126, 127, 128, 129, 190, 191, 192, 193, 254, 255]
+
+
+class TestBloomFilter(unittest.TestCase):
+
+  def test_word_boundaries(self):
+    # type: () -> None
+    # a = 1 and c = 0 hash n < num_bits to bit n, and 255 = -1 mod 256 hashes
+    # it to bit 255 - n, so every bit is one that was picked
+    funcs = [(1, 0), (255, 255)]
+    scalar = BloomFilter(2, 256, False).setFuncs(funcs)
+    batch = BloomFilter(2, 256, False).setFuncs(funcs)
+    for n in BOUNDARY_BITS:
+      scalar.add(n)
+    batch.add_many(np.array(BOUNDARY_BITS, dtype=np.uint64))
+    np.testing.assert_array_equal(scalar.array, batch.array)
+    self.assertEqual(scalar.num_adds, batch.num_adds)
+    expected = 0
+    for n in BOUNDARY_BITS:
+      expected |= scalar.get_hash(n)
+      self.assertEqual(scalar.get_hash(n), (1 << n) | (1 << (255 - n)))
+    self.assertEqual(scalar.getArrayVal(), expected)
+    self.assertEqual(batch.getArrayVal(), expected)
+    ns = np.arange(256, dtype=np.uint64)
+    self.assertEqual(batch.contains_many(ns).tolist(), [scalar.contains(n) for n in range(256)])
+    self.assertEqual(np.flatnonzero(batch.contains_many(ns)).tolist(), BOUNDARY_BITS)
+
+  def test_add_many(self):
+    # type: () -> None
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    scalar = BloomFilter(4, 1 << 12)
+    batch = scalar.deep_copy()
+    # Including numbers with many base num_bits digits, up to 2 ** 64 - 1
+    ns = np.concatenate([
+      rng.integers(0, 1 << 12, 200, dtype=np.uint64),
+      rng.integers(0, np.iinfo(np.uint64).max, 200, dtype=np.uint64, endpoint=True),
+      np.array([0, (1 << 63) - 1, 1 << 63, (1 << 64) - 1], dtype=np.uint64),
+    ])
+    for n in ns.tolist():
+      scalar.add(n)
+    batch.add_many(ns)
+    np.testing.assert_array_equal(scalar.array, batch.array)
+    self.assertEqual(scalar.num_adds, batch.num_adds)
+    self.assertTrue(batch.contains_many(ns).all())
+
+    queries = rng.integers(0, np.iinfo(np.uint64).max, 2000, dtype=np.uint64, endpoint=True)
+    queries = np.concatenate([queries, np.arange(1 << 12, dtype=np.uint64)])
+    self.assertEqual(batch.contains_many(queries).tolist(),
+      [scalar.contains(n) for n in queries.tolist()])
+
+  def test_save_load(self):
+    # type: () -> None
+    random.seed(1)
+    rng = np.random.default_rng(1)
+    bf = BloomFilter(3, 1 << 12).add_many(rng.integers(0, 1 << 40, 300, dtype=np.uint64))
+    queries = rng.integers(0, 1 << 40, 3000, dtype=np.uint64)
+    expected = bf.contains_many(queries)
+    tmp = tempfile.mkdtemp()
+    try:
+      out_file = bf.save(os.path.join(tmp, 'filter.bf'))
+      for mode in ['r', 'c', 'r+']:
+        loaded = BloomFilter.load(out_file, mode)
+        self.assertIsInstance(loaded.array, np.memmap)
+        self.assertEqual(loaded.num_adds, 300)
+        self.assertEqual(loaded.funcs, bf.funcs)
+        np.testing.assert_array_equal(loaded.array, bf.array)
+        np.testing.assert_array_equal(loaded.contains_many(queries), expected)
+        del loaded
+
+      # The string form doesn't keep num_adds, only the bits
+      from_repr = BloomFilter.loadRepr(bf.getFunctionRepr(), bf.getArrayRepr())
+      self.assertEqual(from_repr.num_bits, bf.num_bits)
+      np.testing.assert_array_equal(from_repr.array, bf.array)
+      np.testing.assert_array_equal(from_repr.contains_many(queries), expected)
+
+      with open(out_file, 'rb') as f:
+        saved = f.read()
+      magic, version, num_funcs, num_bits, num_adds = HEADER.unpack(saved[:HEADER.size])
+      self.assertEqual((magic, version), (MAGIC, VERSION))
+      bad_magic = os.path.join(tmp, 'bad_magic.bf')
+      with open(bad_magic, 'wb') as f:
+        f.write(b'NOTBLOOM' + saved[len(MAGIC):])
+      self.assertRaises(Exception, lambda: BloomFilter.load(bad_magic))
+      bad_version = os.path.join(tmp, 'bad_version.bf')
+      with open(bad_version, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION + 1, num_funcs, num_bits, num_adds))
+        f.write(saved[HEADER.size:])
+      self.assertRaises(Exception, lambda: BloomFilter.load(bad_version))
+    finally:
+      shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+  unittest.main()
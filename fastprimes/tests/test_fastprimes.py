@@ -0,0 +1,38 @@
+# test_fastprimes.py
+# Trevor Pottinger
+# Sun Oct 18 14:21:37 PDT 2026
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from fastprimes import FastPrimes
+
+
+class TestFastPrimes(unittest.TestCase):
+
+  def test_save_load(self):
+    # type: () -> None
+    random.seed(2)
+    fprimes = FastPrimes.fromRange(2, 20000, 3, 1 << 14, 3, 1 << 10)
+    ns = np.arange(2, 20000)
+    expected = fprimes.isPrimeMany(ns)
+    tmp = tempfile.mkdtemp()
+    try:
+      files = fprimes.save(os.path.join(tmp, 'primes.bf'), os.path.join(tmp, 'fps.bf'))
+      loaded = FastPrimes.load(*files)
+      self.assertEqual(loaded.getCounts(), fprimes.getCounts())
+      np.testing.assert_array_equal(loaded.isPrimeMany(ns), expected)
+      self.assertEqual(loaded.evaluateRange(2, 20000), fprimes.evaluateRange(2, 20000))
+      self.assertEqual([loaded.isPrime(n) for n in range(2, 200)], expected[:198].tolist())
+      del loaded
+    finally:
+      shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+  unittest.main()
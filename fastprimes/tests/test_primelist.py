@@ -0,0 +1,72 @@
+# test_primelist.py
+# Trevor Pottinger
+# Sun Oct 18 14:37:52 PDT 2026
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from primelist import build, parsefile
+
+# The segmented sieve in primes/ is the source of truth
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'primes'))
+from sieve import sievePrimes
+
+
+class TestPrimeList(unittest.TestCase):
+
+  def setUp(self):
+    # type: () -> None
+    self.tmp = tempfile.mkdtemp()
+
+  def tearDown(self):
+    # type: () -> None
+    shutil.rmtree(self.tmp)
+
+  def test_prime_table(self):
+    # type: () -> None
+    # Small blocks so that tables span several blocks, and limits that end
+    # right on, just after, and part way through a block
+    for limit, block_odds in [(3, 8), (4, 8), (32, 8), (33, 8), (100, 8), (1000, 16), (5000, 1 << 15)]:
+      primes = sievePrimes(limit - 1)
+      table_file = build(os.path.join(self.tmp, '%d.tbl' % limit), limit, block_odds)
+      with parsefile(table_file) as table:
+        self.assertEqual(table.limit, limit)
+        self.assertEqual(table.total_primes, len(primes))
+        prime_set = set(primes)
+        self.assertEqual([table.is_prime(n) for n in range(limit)],
+          [n in prime_set for n in range(limit)])
+        pi = 0
+        for n in range(limit):
+          pi += 1 if n in prime_set else 0
+          self.assertEqual(table.pi(n), pi, (limit, n))
+        self.assertEqual([table.nth_prime(k) for k in range(1, len(primes) + 1)], primes)
+        for n in range(1, len(primes) + 1):
+          self.assertEqual(table.first_primes(n).tolist(), primes[:n])
+        # Nothing past the table is answered
+        self.assertRaises(Exception, lambda: table.is_prime(limit))
+        self.assertRaises(Exception, lambda: table.pi(limit))
+        self.assertRaises(Exception, lambda: table.nth_prime(len(primes) + 1))
+        self.assertRaises(Exception, lambda: table.first_primes(len(primes) + 1))
+
+  def test_edges(self):
+    # type: () -> None
+    table_file = build(os.path.join(self.tmp, 'edges.tbl'), 1 << 12, 8)
+    with parsefile(table_file) as table:
+      self.assertEqual([table.is_prime(n) for n in [0, 1, 2, 3, 4]], [False, False, True, True, False])
+      self.assertEqual([table.pi(n) for n in [0, 1, 2, 3, 4]], [0, 0, 1, 2, 2])
+      self.assertEqual(table.nth_prime(1), 2)
+      self.assertEqual(table.first_primes(1).tolist(), [2])
+      # 4093 is the largest prime below 2 ** 12, and there are 564 of them
+      self.assertEqual(table.nth_prime(table.total_primes), 4093)
+      self.assertEqual(table.pi((1 << 12) - 1), 564)
+      self.assertFalse(table.is_prime((1 << 12) - 1))
+    with open(os.path.join(self.tmp, 'bad.tbl'), 'wb') as f:
+      f.write(b'\x00' * 64)
+    self.assertRaises(Exception, lambda: parsefile(os.path.join(self.tmp, 'bad.tbl')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,475 @@
+# batch_factor.py
+# Trevor Pottinger
+# Sun Oct 18 21:03:17 PDT 2026
+
+"""Factors lots of integers below 2 ** 64, read one per line from stdin or
+from a column of a TSV, and prints one JSON object per line in the same
+order. Numbers are read in chunks, and everything about a chunk is done on
+whole numpy arrays:
+
+1. Trial division by the odd primes below BATCH_TRIAL_LIMIT. Dividing by an
+   odd p is multiplying by its inverse mod 2 ** 64, and n is divisible
+   exactly when that product is at most (2 ** 64 - 1) // p.
+2. Strong probable prime tests to the bases in WITNESSES, which are enough to
+   prove primality below 2 ** 64.
+3. Brent's rho, with every composite stepping in lockstep and a vectorized
+   gcd once per RHO_BATCH steps. Factors found go back to step 2.
+
+Products mod n go through Montgomery multiplication with 32 bit halves, since
+numpy has no 128 bit integers. The few composites still left once the arrays
+get small are stragglers, and go to factor.factor one at a time. Chunks are
+spread over a pool of processes, each with the same table of primes."""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import collections
+import multiprocessing
+import sys
+
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd  # type: ignore
+
+import numpy as np
+
+from factor import factor
+from relations import modInverse
+from sieve import basePrimes
+
+if sys.version_info >= (3, 3):
+    from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+    positive = int
+    prime = int
+
+
+# The number of integers per chunk. Bigger chunks amortize the per call
+# overhead of numpy over more numbers, especially for the few hard ones.
+BATCH_CHUNK = 1 << 18
+
+# Trial division goes up to here, and rho finds anything bigger
+BATCH_TRIAL_LIMIT = 1 << 12
+
+# Deterministic for every n below 2 ** 64, see
+# https://miller-rabin.appspot.com/
+WITNESSES = [2, 325, 9375, 28178, 450775, 9780504, 1795265022]
+
+# Rho steps between gcds, and the fewest composites still worth stepping as
+# an array. Below that, numpy's per call overhead costs more than stepping
+# each one in python.
+RHO_BATCH = 64
+RHO_MIN_ACTIVE = 64
+# A composite gets this many values of c in x -> x ** 2 + c before it's left
+# to factor.factor
+RHO_TRIES = 3
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_SHIFT32 = np.uint64(32)
+_ONE = np.uint64(1)
+_TWO = np.uint64(2)
+
+_trial_table = []  # type: List[Tuple[prime, np.uint64, np.uint64]]
+
+
+def trialTable():
+    # type: () -> List[Tuple[prime, np.uint64, np.uint64]]
+    """Returns (p, p ** -1 mod 2 ** 64, (2 ** 64 - 1) // p) for the odd primes
+    below BATCH_TRIAL_LIMIT, computing them on the first call"""
+    if len(_trial_table) == 0:
+        for p in basePrimes(BATCH_TRIAL_LIMIT - 1).tolist()[1:]:
+            _trial_table.append((p, np.uint64(modInverse(p, 1 << 64)), np.uint64(((1 << 64) - 1) // p)))
+    return _trial_table
+
+
+def inverse64(n):
+    # type: (np.ndarray) -> np.ndarray
+    """Returns n ** -1 mod 2 ** 64 for odd n. Each Newton step doubles the
+    number of correct low bits, and n is its own inverse mod 8."""
+    x = n.copy()
+    for _ in range(5):
+        x *= _TWO - n * x
+    return x
+
+
+class Montgomery(object):
+    """Multiplication mod each n[i], for an array of odd n below 2 ** 64.
+    mul returns a * b / 2 ** 64 mod n, so numbers are kept as x * 2 ** 64 mod
+    n. Every method writes into `out`, which may be one of the inputs, and
+    the scratch arrays are kept between calls. A product is ~40 numpy calls,
+    and allocating a new array for each of them costs about as much as the
+    arithmetic."""
+
+    def __init__(self, n):
+        # type: (np.ndarray) -> None
+        self.n = n
+        self.n_inv = inverse64(n)
+        self.n_lo = n & _MASK32
+        self.n_hi = n >> _SHIFT32
+        self._scratch = [np.empty(len(n), dtype=np.uint64) for _ in range(10)]
+        self._mask = np.empty(len(n), dtype=np.bool_)
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.n)
+
+    def one(self):
+        # type: () -> np.ndarray
+        """Returns 2 ** 64 mod n, which is 1 in Montgomery form"""
+        return (np.uint64(0) - self.n) % self.n
+
+    def fromInt(self, a):
+        # type: (np.ndarray) -> np.ndarray
+        """Returns a * 2 ** 64 mod n, by doubling a mod n 64 times"""
+        out = a % self.n
+        for _ in range(64):
+            self.add(out, out, out)
+        return out
+
+    def _mulHigh(self, a_lo, a_hi, b_lo, b_hi, out):
+        # type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> None
+        """Writes the top 64 bits of the 128 bit products to out, from the
+        32 bit halves of each side"""
+        cross_a, cross_b, mid, tmp = self._scratch[6:10]
+        np.multiply(a_lo, b_lo, out=mid)
+        np.right_shift(mid, _SHIFT32, out=mid)
+        np.multiply(a_lo, b_hi, out=cross_a)
+        np.multiply(a_hi, b_lo, out=cross_b)
+        np.multiply(a_hi, b_hi, out=out)
+        for cross in (cross_a, cross_b):
+            np.right_shift(cross, _SHIFT32, out=tmp)
+            np.add(out, tmp, out=out)
+            np.bitwise_and(cross, _MASK32, out=cross)
+            np.add(mid, cross, out=mid)
+        np.right_shift(mid, _SHIFT32, out=mid)
+        np.add(out, mid, out=out)
+
+    def mul(self, a, b, out):
+        # type: (np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+        """Writes a * b / 2 ** 64 mod n to out, for a and b below n"""
+        a_lo, a_hi, b_lo, b_hi, hi, m = self._scratch[:6]
+        # m * n has the same low 64 bits as a * b, so (a * b - m * n) /
+        # 2 ** 64 is just the difference of the high halves
+        np.multiply(a, b, out=m)
+        np.multiply(m, self.n_inv, out=m)
+        np.bitwise_and(a, _MASK32, out=a_lo)
+        np.right_shift(a, _SHIFT32, out=a_hi)
+        if b is a:
+            self._mulHigh(a_lo, a_hi, a_lo, a_hi, hi)
+        else:
+            np.bitwise_and(b, _MASK32, out=b_lo)
+            np.right_shift(b, _SHIFT32, out=b_hi)
+            self._mulHigh(a_lo, a_hi, b_lo, b_hi, hi)
+        np.bitwise_and(m, _MASK32, out=a_lo)
+        np.right_shift(m, _SHIFT32, out=a_hi)
+        self._mulHigh(a_lo, a_hi, self.n_lo, self.n_hi, b_lo)
+        np.less(hi, b_lo, out=self._mask)
+        np.subtract(hi, b_lo, out=out)
+        np.add(out, self.n, out=out, where=self._mask)
+        return out
+
+    def add(self, a, b, out):
+        # type: (np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+        """Writes a + b mod n to out, for a and b below n"""
+        tmp = self._scratch[9]
+        np.add(a, b, out=tmp)
+        # Either the sum wrapped past 2 ** 64, or it's at least n
+        np.less(tmp, b, out=self._mask)
+        np.logical_or(self._mask, tmp >= self.n, out=self._mask)
+        np.subtract(tmp, self.n, out=tmp, where=self._mask)
+        np.copyto(out, tmp)
+        return out
+
+
+def gcd64(a, b):
+    # type: (np.ndarray, np.ndarray) -> np.ndarray
+    """Euclid's algorithm on arrays, returning gcd(a[i], b[i])"""
+    a = a.copy()
+    b = b.copy()
+    while True:
+        nonzero = np.flatnonzero(b)
+        if len(nonzero) == 0:
+            return a
+        rem = a[nonzero] % b[nonzero]
+        a[nonzero] = b[nonzero]
+        b[nonzero] = rem
+
+
+def trialDivide(values):
+    # type: (np.ndarray) -> Tuple[np.ndarray, List[Tuple[np.ndarray, prime]]]
+    """Divides the primes below BATCH_TRIAL_LIMIT out of values, which must
+    all be positive. Returns (rest, found), where found has (indexes, p) for
+    each time p divided the values at those indexes."""
+    rest = values.copy()
+    found = []  # type: List[Tuple[np.ndarray, prime]]
+    even = np.flatnonzero((rest & _ONE) == 0)
+    while len(even) > 0:
+        found.append((even, 2))
+        rest[even] >>= _ONE
+        even = even[(rest[even] & _ONE) == 0]
+    for p, p_inv, limit in trialTable():
+        quotient = rest * p_inv
+        hits = np.flatnonzero(quotient <= limit)
+        while len(hits) > 0:
+            found.append((hits, p))
+            rest[hits] = quotient[hits]
+            quotient[hits] = rest[hits] * p_inv
+            hits = hits[quotient[hits] <= limit]
+    return (rest, found)
+
+
+def isPrime64(n):
+    # type: (np.ndarray) -> np.ndarray
+    """Returns which of the odd n, all at least BATCH_TRIAL_LIMIT ** 2, are
+    prime. Each witness is only tried on the n that passed the ones before
+    it, so composites mostly cost one test and primes cost all of them."""
+    # n - 1 == d * 2 ** s with d odd
+    d = n - _ONE
+    s = np.zeros(len(n), dtype=np.uint64)
+    while True:
+        even = (d & _ONE) == 0
+        if not even.any():
+            break
+        d[even] >>= _ONE
+        s[even] += _ONE
+
+    result = np.ones(len(n), dtype=np.bool_)
+    candidates = np.arange(len(n))
+    for a in WITNESSES:
+        m, m_d, m_s = n[candidates], d[candidates], s[candidates]
+        mont = Montgomery(m)
+        one = mont.one()
+        minus_one = m - one
+        skip = np.full(len(m), a, dtype=np.uint64) % m == 0
+        base = mont.fromInt(np.full(len(m), a, dtype=np.uint64))
+        x = one.copy()
+        product = np.empty_like(x)
+        for bit in range(int(m_d.max()).bit_length() - 1, -1, -1):
+            mont.mul(x, x, x)
+            mont.mul(x, base, product)
+            np.copyto(x, product, where=(m_d >> np.uint64(bit)) & _ONE == _ONE)
+        passed = skip | (x == one) | (x == minus_one)
+        for r in range(1, int(m_s.max())):
+            mont.mul(x, x, x)
+            passed |= (x == minus_one) & (np.uint64(r) < m_s)
+        result[candidates[~passed]] = False
+        candidates = candidates[passed]
+        if len(candidates) == 0:
+            break
+    return result
+
+
+def rho64(n, c):
+    # type: (np.ndarray, np.ndarray) -> np.ndarray
+    """Runs Brent's rho with x -> x ** 2 / 2 ** 64 + c on every odd composite
+    in n at once, with c[i] for n[i]. The extra 2 ** -64 from Montgomery
+    multiplication just makes it a different pseudorandom map. Returns the
+    factor found for each n. That's n itself where the map cycled without
+    finding one, and 0 where fewer than RHO_MIN_ACTIVE composites were left
+    before finding one."""
+    result = np.zeros(len(n), dtype=np.uint64)
+    index = np.arange(len(n))
+    mont = Montgomery(n)
+    c = c.astype(np.uint64) % n
+    y = np.full(len(n), 2, dtype=np.uint64) % n
+    q = np.ones(len(n), dtype=np.uint64)
+    diff = np.empty_like(q)
+    r = 1
+    while len(index) >= RHO_MIN_ACTIVE:
+        x = y.copy()
+        for _ in range(r):
+            mont.add(mont.mul(y, y, y), c, y)
+        k = 0
+        while k < r and len(index) >= RHO_MIN_ACTIVE:
+            ys = y.copy()
+            for _ in range(min(RHO_BATCH, r - k)):
+                mont.add(mont.mul(y, y, y), c, y)
+                np.subtract(x, y, out=diff)
+                np.negative(diff, out=diff, where=x < y)
+                mont.mul(q, diff, q)
+            k += RHO_BATCH
+            g = gcd64(q, mont.n)
+            done = g != _ONE
+            if not done.any():
+                continue
+            # Redo the batch one step at a time where the gcd was all of n
+            for i in np.flatnonzero(done & (g == mont.n)).tolist():
+                g[i] = _backtrack(int(mont.n[i]), int(x[i]), int(ys[i]), int(c[i]))
+            result[index[done]] = g[done]
+            keep = ~done
+            index, c, x, y, q = index[keep], c[keep], x[keep], y[keep], q[keep]
+            mont = Montgomery(mont.n[keep])
+            diff = np.empty_like(q)
+        r *= 2
+    return result
+
+
+def _backtrack(n, x, ys, c):
+    # type: (int, int, int, positive) -> int
+    """Steps from ys one at a time, checking the gcd after each"""
+    r_inv = modInverse(1 << 64, n)
+    g = 1
+    while g == 1:
+        ys = (ys * ys * r_inv + c) % n
+        g = gcd(abs(x - ys), n)
+    return g
+
+
+def factorChunk(numbers):
+    # type: (List[positive]) -> List[Dict[prime, positive]]
+    """Returns the factorization of each number, like factor.factor"""
+    results = [{} for _ in numbers]  # type: List[Dict[prime, positive]]
+    small = [i for i, n in enumerate(numbers) if n < (1 << 64)]
+    for i, n in enumerate(numbers):
+        if n >= (1 << 64):
+            results[i] = factor(n)
+    rows = np.array(small, dtype=np.int64)
+    rest, found = trialDivide(np.array([numbers[i] for i in small], dtype=np.uint64))
+    for indexes, p in found:
+        for i in rows[indexes].tolist():
+            results[i][p] = results[i].get(p, 0) + 1
+
+    def add(rows, values):
+        # type: (np.ndarray, np.ndarray) -> None
+        for i, p in zip(rows.tolist(), values.tolist()):
+            results[i][p] = results[i].get(p, 0) + 1
+
+    # Anything left below BATCH_TRIAL_LIMIT ** 2 is prime
+    left = rest > _ONE
+    rows, rest = rows[left], rest[left]
+    small_prime = rest < np.uint64(BATCH_TRIAL_LIMIT ** 2)
+    add(rows[small_prime], rest[small_prime])
+    rows, rest = rows[~small_prime], rest[~small_prime]
+    tries = np.zeros(len(rows), dtype=np.int64)
+    while len(rows) > 0:
+        is_prime = isPrime64(rest)
+        add(rows[is_prime], rest[is_prime])
+        rows, rest, tries = rows[~is_prime], rest[~is_prime], tries[~is_prime]
+        if len(rows) < RHO_MIN_ACTIVE:
+            break
+        found = rho64(rest, tries + 1)
+        split = (found != 0) & (found != rest)
+        cycled = found == rest
+        retry = cycled & (tries + 1 < RHO_TRIES)
+        stragglers = (found == 0) | (cycled & ~retry)
+        for i, n in zip(rows[stragglers].tolist(), rest[stragglers].tolist()):
+            for p, e in factor(n).items():
+                results[i][p] = results[i].get(p, 0) + e
+        pieces = found[split]
+        next_rows = [rows[split], rows[split], rows[retry]]
+        next_rest = [pieces, rest[split] // pieces, rest[retry]]
+        next_tries = [np.zeros(2 * len(pieces), dtype=np.int64), tries[retry] + 1]
+        rows, rest, tries = np.concatenate(next_rows), np.concatenate(next_rest), np.concatenate(next_tries)
+        # Every piece has no factors below BATCH_TRIAL_LIMIT
+        small_prime = rest < np.uint64(BATCH_TRIAL_LIMIT ** 2)
+        add(rows[small_prime], rest[small_prime])
+        rows, rest, tries = rows[~small_prime], rest[~small_prime], tries[~small_prime]
+    for i, n in zip(rows.tolist(), rest.tolist()):
+        for p, e in factor(n).items():
+            results[i][p] = results[i].get(p, 0) + e
+    return results
+
+
+def readNumbers(lines, column=None, header=False):
+    # type: (Iterable[str], Optional[int], bool) -> Iterator[positive]
+    """Yields the integer on each line, or in the given column of each line
+    of a TSV. Blank lines are skipped."""
+    for i, line in enumerate(lines):
+        if header and i == 0:
+            continue
+        line = line.rstrip("\n")
+        if column is not None:
+            line = line.split("\t")[column]
+        if line.strip() == "":
+            continue
+        n = int(line)
+        if n < 1:
+            raise Exception("Expected a positive integer on line %d, got %d" % (i + 1, n))
+        yield n
+
+
+def chunked(numbers, size):
+    # type: (Iterable[positive], positive) -> Iterator[List[positive]]
+    chunk = []  # type: List[positive]
+    for n in numbers:
+        chunk.append(n)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def batchFactor(numbers, workers=1, chunk_size=BATCH_CHUNK):
+    # type: (Iterable[positive], positive, positive) -> Iterator[Tuple[positive, Dict[prime, positive]]]
+    """Yields (n, factors) for each of the numbers, in order. With more than
+    one worker, chunks are factored in a pool of that many processes, with at
+    most two chunks per worker read ahead of the output."""
+    # Built before the pool so that forked workers already have it
+    trialTable()
+    if workers == 1:
+        for chunk in chunked(numbers, chunk_size):
+            for n, factors in zip(chunk, factorChunk(chunk)):
+                yield (n, factors)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = collections.deque()  # type: collections.deque
+        for chunk in chunked(numbers, chunk_size):
+            pending.append((chunk, pool.apply_async(factorChunk, (chunk,))))
+            while len(pending) >= 2 * workers:
+                done, result = pending.popleft()
+                for n, factors in zip(done, result.get()):
+                    yield (n, factors)
+        while len(pending) > 0:
+            done, result = pending.popleft()
+            for n, factors in zip(done, result.get()):
+                yield (n, factors)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def formatFactors(n, factors):
+    # type: (positive, Dict[prime, positive]) -> str
+    """The same JSON as factor.py --json, without going through json.dumps
+    for every number"""
+    return '{"n": %d, "factors": {%s}}' % (n, ", ".join(
+        '"%d": %d' % (p, factors[p]) for p in sorted(factors)
+    ))
+
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description="Factors integers, one per "
+        + "line, and prints their factors as JSON lines in the same order")
+    parser.add_argument("path", nargs="?", help="A file to read the integers "
+        + "from. Defaults to stdin")
+    parser.add_argument("-c", "--column", type=int, help="Read the integers "
+        + "from this column, starting at 0, of a TSV")
+    parser.add_argument("--header", action="store_true", help="Skip the "
+        + "first line")
+    parser.add_argument("--workers", type=int, help="The number of processes "
+        + "factoring chunks. Defaults to the number of CPUs")
+    parser.add_argument("--chunk", type=int, default=BATCH_CHUNK, help="The "
+        + "number of integers per chunk, defaults to %d" % BATCH_CHUNK)
+    args = parser.parse_args()
+
+    workers = args.workers if args.workers is not None else multiprocessing.cpu_count()
+    assert workers > 0, "expected workers > 0"
+    assert args.chunk > 0, "expected chunk > 0"
+
+    lines = sys.stdin if args.path is None else open(args.path)
+    try:
+        numbers = readNumbers(lines, args.column, args.header)
+        for n, factors in batchFactor(numbers, workers, args.chunk):
+            sys.stdout.write(formatFactors(n, factors) + "\n")
+    finally:
+        if args.path is not None:
+            lines.close()
+
+
+if __name__ == "__main__":
+    main()
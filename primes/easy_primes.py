@@ -16,13 +16,25 @@ import sys
 if sys.version_info.major >= 3:
     from typing import (Dict, List, Optional, Tuple)
 
+try:
+    from sieve import sievePrimes, wheelDeltas, wheelSievePrimes
+except ImportError:
+    # sieve.py depends on numpy, so fall back to trial division without it
+    sievePrimes = None
+    wheelDeltas = None
+    wheelSievePrimes = None
+
 
 # For more random facts and info about prime numbers, checkout
 # https://en.wikipedia.org/wiki/Prime_number and https://oeis.org/A000040
 
 def getPrimes(known_primes=None, max_num=2**12, plus_one=False):
     # type: (Optional[List[int]], int, bool) -> List[int]
-    """This is a really simple method for finding primes"""
+    """This is a really simple method for finding primes. When there are no
+    known_primes to build on, this dispatches to the segmented sieve in
+    sieve.py, which is much faster and returns the same list."""
+    if known_primes is None and sievePrimes is not None and max_num >= 2:
+        return sievePrimes(max_num, plus_one)
     if known_primes is None:
         known_primes = [2]
     assert known_primes[0] == 2, '2 should always be the first prime'
@@ -64,7 +76,11 @@ def getPrimesWithSkips(primes=None, max_num=2**12, plus_one=False):
     """This is builds up a sieve, then uses the distances between potential
     primes to skip more numbers than just two at a time. Its a lot like
     wheel factorization, but instead we're using the "wheel" to efficiently
-    generate prime candidates and then run through simple trial division."""
+    generate prime candidates and then run through simple trial division.
+    When there are no primes to build on, this dispatches to the wheel sieve
+    in sieve.py, which returns the same list."""
+    if primes is None and wheelSievePrimes is not None and max_num >= 2:
+        return wheelSievePrimes(max_num, plus_one)
     if primes is None:
         primes = [2, 3, 5]
     assert primes[0] == 2, '2 should always be the first prime'
@@ -76,26 +92,12 @@ def getPrimesWithSkips(primes=None, max_num=2**12, plus_one=False):
     # 9699690, 223092870 and 6469693230. Yup, the product of the first ten
     # primes is almost 6.5B. Holding the `skips` list in memory at that point
     # is quite intense. Checkout https://oeis.org/A002110 for more info
-    start_skipping = 1
-    for i in range(len(primes)):
-        start_skipping *= primes[i]
-    # For 2,3,5 this yields [1,7,11,13,17,19,23,29]
-    skip_steps = []
-    for i in range(start_skipping):
-        is_multiple = False
-        for p in primes:
-            if i % p == 0:
-                is_multiple = True
-                break
-        if not is_multiple:
-            skip_steps.append(i)
-
-    # For 2,3,5 this yields [6,4,2,4,2,4,6,2]
-    skips = []
-    for i in range(1, len(skip_steps)):
-        skips.append(skip_steps[i] - skip_steps[i-1])
-    # This is because -1 mod start_skipping is two away from 1 mod
-    skips.append(2)
+    if wheelDeltas is not None:
+        # Only builds the phi(start_skipping) numbers that are coprime, one
+        # prime at a time, instead of checking all start_skipping of them
+        skips = wheelDeltas(primes)[1].tolist()
+    else:
+        skips = skipsFromScratch(primes)
 
     i = skips[0] + 1
     skip_i = 1
@@ -113,8 +115,9 @@ def getPrimesWithSkips(primes=None, max_num=2**12, plus_one=False):
     if not plus_one:
         return primes
 
+    # i is already the first candidate past max_num, and skip_i is in step
+    # with it, so keep going from there
     found_one_more = False
-    i = max_num - (max_num % 2) + 1
     while not found_one_more:
         is_prime = True
         for p in primes:
@@ -130,6 +133,33 @@ def getPrimesWithSkips(primes=None, max_num=2**12, plus_one=False):
     return primes
 
 
+def skipsFromScratch(primes):
+    # type: (List[int]) -> List[int]
+    """The gaps between the numbers coprime to the product of primes, found
+    by checking every number up to the product"""
+    start_skipping = 1
+    for i in range(len(primes)):
+        start_skipping *= primes[i]
+    # For 2,3,5 this yields [1,7,11,13,17,19,23,29]
+    skip_steps = []
+    for i in range(start_skipping):
+        is_multiple = False
+        for p in primes:
+            if i % p == 0:
+                is_multiple = True
+                break
+        if not is_multiple:
+            skip_steps.append(i)
+
+    # For 2,3,5 this yields [6,4,2,4,2,4,6,2]
+    skips = []
+    for i in range(1, len(skip_steps)):
+        skips.append(skip_steps[i] - skip_steps[i-1])
+    # This is because -1 mod start_skipping is two away from 1 mod
+    skips.append(2)
+    return skips
+
+
 def getFactorization(primes, n, verbose):
     # type: (List[int], int, int) -> Tuple[bool, Dict[int, int]]
     assert n > 1, 'n must be greater than 1'
@@ -326,7 +356,7 @@ def main():
     if args.s:
         primes = getPrimesWithSkips([2, 3, 5], max_num, factoring)
     else:
-        primes = getPrimes([2], max_num, factoring)
+        primes = getPrimes(None, max_num, factoring)
 
     if args.list:
         for p in primes:
@@ -0,0 +1,473 @@
+# factor.py
+# Trevor Pottinger
+# Sun Oct 18 19:26:40 PDT 2026
+
+"""One entry point for factoring, which picks between the methods in this
+directory based on what's left to factor. In order:
+
+1. Trial division by the primes below TRIAL_LIMIT, from a table that's only
+   sieved once per process.
+2. Brent's variant of Pollard's rho, which takes a gcd once per batch of
+   steps instead of once per step. It finds factors below ~10 ** 10 quickly.
+3. Lenstra's elliptic curve method, on Montgomery curves so that only x and
+   z coordinates are needed. Curves are independent, so they're spread over
+   a pool of worker processes.
+4. The self-initializing quadratic sieve, with tuneParameters, for whatever
+   composites are left. Its running time only depends on the size of the
+   composite, not of its factors.
+
+Every factor found goes back through the same steps until it's prime, and
+each step after trial division gets a time budget per composite."""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd  # type: ignore
+
+from gen_big import isPrime
+from quadratic_sieve import quadraticSieve, tuneParameters
+from relations import modInverse
+from sieve import basePrimes
+
+if sys.version_info >= (3, 3):
+    from typing import Dict, List, Optional, Tuple
+
+    greater_than_one = int
+    nonnegative = int
+    positive = int
+    prime = int
+    # (x, z) on a Montgomery curve, standing for the point (x / z, ...)
+    point = Tuple[int, int]
+
+
+# Trial division covers the same primes as gen_big's sieve. Any cofactor left
+# below TRIAL_LIMIT ** 2 is then prime.
+TRIAL_LIMIT = 1 << 16
+
+# Brent's rho multiplies this many differences together before taking a gcd
+RHO_BATCH = 128
+# The default number of seconds rho gets per composite, which is usually
+# enough for any factor below 10 ** 10
+RHO_SECONDS = 0.5
+
+# Composites below this are always split by rho, without a time budget. Their
+# smallest factor is below 2 ** 32, so rho only needs ~2 ** 16 steps.
+RHO_ONLY_LIMIT = 1 << 64
+
+# (factor digits, B1, curves). Running the curves in a row gives a good chance
+# of finding any factor with that many digits, based on the GMP-ECM tables
+# scaled for a stage 2 bound of ECM_B2_MULT * B1.
+ECM_LEVELS = [
+    (15, 2000, 30),
+    (20, 11000, 110),
+    (25, 50000, 330),
+    (30, 250000, 800),
+]
+ECM_B2_MULT = 100
+# ECM only runs the levels looking for factors with at most this fraction of
+# the digits of the composite, since the quadratic sieve is faster past that
+ECM_DEPTH = 0.4
+# The giant step in stage 2. 2310 = 2 * 3 * 5 * 7 * 11 so few baby steps are
+# coprime to it.
+ECM_STAGE2_D = 2310
+
+_small_primes = []  # type: List[prime]
+
+
+def smallPrimes():
+    # type: () -> List[prime]
+    """Returns the primes below TRIAL_LIMIT, sieving them on the first call"""
+    if len(_small_primes) == 0:
+        _small_primes.extend(basePrimes(TRIAL_LIMIT - 1).tolist())
+    return _small_primes
+
+
+def trialDivision(n, factors=None):
+    # type: (positive, Optional[Dict[prime, positive]]) -> Tuple[Dict[prime, positive], positive]
+    """Divides out the primes below TRIAL_LIMIT. Returns (factors, rest),
+    where factors has the primes found and their exponents, and rest is what's
+    left of n. rest is 1 or has no factors below TRIAL_LIMIT."""
+    assert n > 0, "type violation, expected n > 0"
+    if factors is None:
+        factors = {}
+    for p in smallPrimes():
+        if p * p > n:
+            break
+        if n % p != 0:
+            continue
+        count = 0
+        while n % p == 0:
+            n //= p
+            count += 1
+        factors[p] = factors.get(p, 0) + count
+    if 1 < n < TRIAL_LIMIT ** 2:
+        factors[n] = factors.get(n, 0) + 1
+        n = 1
+    return (factors, n)
+
+
+def intRoot(n, k):
+    # type: (nonnegative, positive) -> nonnegative
+    """Returns the kth root of n, rounded down, via Newton's method"""
+    assert n >= 0, "type violation, expected n >= 0"
+    assert k > 0, "type violation, expected k > 0"
+    if n < 2 or k == 1:
+        return n
+    x = 1 << ((n.bit_length() + k - 1) // k)
+    while True:
+        y = ((k - 1) * x + n // x ** (k - 1)) // k
+        if y >= x:
+            return x
+        x = y
+
+
+def perfectPower(n):
+    # type: (greater_than_one) -> Optional[Tuple[greater_than_one, greater_than_one]]
+    """Returns (root, k) with root ** k == n for the largest such k, or None
+    if n isn't a perfect power. Rho and the quadratic sieve can't split
+    these, so they're checked first."""
+    assert n > 1, "type violation, expected n > 1"
+    for k in range(n.bit_length(), 1, -1):
+        root = intRoot(n, k)
+        if root > 1 and root ** k == n:
+            return (root, k)
+    return None
+
+
+def brentRho(n, c=1, seconds=None, batch=RHO_BATCH):
+    # type: (greater_than_one, positive, Optional[float], positive) -> Optional[greater_than_one]
+    """Returns a non trivial factor of the composite n, or None if the
+    iteration x -> x ** 2 + c cycles without finding one, or seconds run out.
+    See Brent, "An improved Monte Carlo factorization algorithm", 1980.
+
+    Instead of a gcd per step, the differences are multiplied together mod n
+    and there's one gcd per batch. If that gcd jumps straight to n, the batch
+    is redone one step at a time."""
+    assert n > 1, "type violation, expected n > 1"
+    deadline = None if seconds is None else time.time() + seconds
+    y = 2
+    r = 1
+    q = 1
+    g = 1
+    x = ys = y
+    while g == 1:
+        x = y
+        for _ in range(r):
+            y = (y * y + c) % n
+        k = 0
+        while k < r and g == 1:
+            ys = y
+            for _ in range(min(batch, r - k)):
+                y = (y * y + c) % n
+                q = (q * abs(x - y)) % n
+            g = gcd(q, n)
+            k += batch
+            if g == 1 and deadline is not None and time.time() > deadline:
+                return None
+        r *= 2
+    if g == n:
+        # Redo the last batch one step at a time
+        g = 1
+        while g == 1:
+            ys = (ys * ys + c) % n
+            g = gcd(abs(x - ys), n)
+    if g == n:
+        return None
+    return g
+
+
+def _xDouble(pt, n, a24):
+    # type: (point, greater_than_one, int) -> point
+    """Returns 2 * pt on the curve with a24 = (A + 2) / 4"""
+    x, z = pt
+    s = (x + z) * (x + z) % n
+    d = (x - z) * (x - z) % n
+    t = s - d
+    return (s * d % n, t * (d + a24 * t) % n)
+
+
+def _xAdd(p, q, diff, n):
+    # type: (point, point, point, greater_than_one) -> point
+    """Returns p + q, given diff = p - q"""
+    u = (p[0] - p[1]) * (q[0] + q[1]) % n
+    v = (p[0] + p[1]) * (q[0] - q[1]) % n
+    return (diff[1] * (u + v) * (u + v) % n, diff[0] * (u - v) * (u - v) % n)
+
+
+def montgomeryLadder(k, pt, n, a24):
+    # type: (positive, point, greater_than_one, int) -> point
+    """Returns k * pt, keeping r1 - r0 == pt the whole way"""
+    assert k > 0, "type violation, expected k > 0"
+    r0 = pt
+    r1 = _xDouble(pt, n, a24)
+    for bit in bin(k)[3:]:
+        if bit == "1":
+            r0 = _xAdd(r1, r0, pt, n)
+            r1 = _xDouble(r1, n, a24)
+        else:
+            r1 = _xAdd(r1, r0, pt, n)
+            r0 = _xDouble(r0, n, a24)
+    return r0
+
+
+def suyamaCurve(n, sigma):
+    # type: (greater_than_one, int) -> Tuple[Optional[point], int, nonnegative]
+    """Returns (pt, a24, g) for Suyama's parametrization, which gives curves
+    with a group order divisible by 12. If the curve can't be built because
+    something isn't invertible mod n, pt is None and g is the gcd found."""
+    u = (sigma * sigma - 5) % n
+    v = (4 * sigma) % n
+    x = pow(u, 3, n)
+    z = pow(v, 3, n)
+    denominator = (16 * x * v) % n
+    g = gcd(denominator, n)
+    if g != 1:
+        return (None, 0, g)
+    a24 = pow(v - u, 3, n) * (3 * u + v) * modInverse(denominator, n) % n
+    return ((x, z), a24, 1)
+
+
+_stage1_cache = {}  # type: Dict[positive, int]
+_stage2_cache = {}  # type: Dict[Tuple[positive, positive], Tuple[int, List[int], List[List[int]]]]
+
+
+def _stage1Multiplier(b1):
+    # type: (positive) -> int
+    """The product of the largest power of each prime that's at most b1"""
+    if b1 not in _stage1_cache:
+        k = 1
+        for p in basePrimes(b1).tolist():
+            q = p
+            while q * p <= b1:
+                q *= p
+            k *= q
+        _stage1_cache[b1] = k
+    return _stage1_cache[b1]
+
+
+def _stage2Plan(b1, b2):
+    # type: (positive, positive) -> Tuple[int, List[int], List[List[int]]]
+    """Returns (m0, baby, steps) for the primes in (b1, b2]. Each of those is
+    m * D +- j for a baby step j in baby, and steps[m - m0] lists the indexes
+    into baby that cover a prime for that giant step m."""
+    key = (b1, b2)
+    if key not in _stage2_cache:
+        d = ECM_STAGE2_D
+        baby = [j for j in range(1, d // 2, 2) if gcd(j, d) == 1]
+        is_prime = set(basePrimes(b2 + d).tolist())
+        m0 = max(1, b1 // d)
+        steps = []
+        for m in range(m0, b2 // d + 2):
+            steps.append([
+                i for i, j in enumerate(baby)
+                if (b1 < m * d - j <= b2 and m * d - j in is_prime)
+                or (b1 < m * d + j <= b2 and m * d + j in is_prime)
+            ])
+        _stage2_cache[key] = (m0, baby, steps)
+    return _stage2_cache[key]
+
+
+def ecmCurve(tup):
+    # type: (Tuple[greater_than_one, positive, positive, int]) -> Optional[greater_than_one]
+    """Runs both stages of ECM on one curve. The argument is a tuple of (n,
+    b1, b2, sigma) so that it can be mapped over a pool. Returns a non
+    trivial factor of n or None.
+
+    Stage 1 multiplies the starting point by every prime power up to b1. If
+    the curve's order mod some p | n is b1 smooth, that's the identity mod p,
+    and gcd(z, n) finds p. Stage 2 catches orders with one more prime q in
+    (b1, b2]: q = m * D +- j, and q * pt is the identity exactly when m * D *
+    pt and j * pt have the same x / z mod p."""
+    n, b1, b2, sigma = tup
+    pt, a24, g = suyamaCurve(n, sigma)
+    if pt is None:
+        return g if g != n else None
+    q = montgomeryLadder(_stage1Multiplier(b1), pt, n, a24)
+    g = gcd(q[1], n)
+    if g != 1:
+        return g if g != n else None
+
+    m0, baby, steps = _stage2Plan(b1, b2)
+    d = ECM_STAGE2_D
+    # baby_x[i] is x / z of baby[i] * q, so that each prime costs 2 mulmods
+    q2 = _xDouble(q, n, a24)
+    points = [q, _xAdd(q2, q, q, n)]
+    while len(points) < d // 4:
+        points.append(_xAdd(points[-1], q2, points[-2], n))
+    baby_x = []
+    for j in baby:
+        x, z = points[j // 2]
+        g = gcd(z, n)
+        if g != 1:
+            return g if g != n else None
+        baby_x.append(x * modInverse(z, n) % n)
+
+    giant = montgomeryLadder(d, q, n, a24)
+    r = montgomeryLadder(m0 * d, q, n, a24)
+    # 0 * giant is the identity, which _xAdd can't take as a difference
+    prev = montgomeryLadder((m0 - 1) * d, q, n, a24) if m0 > 1 else None
+    acc = 1
+    for indexes in steps:
+        rx, rz = r
+        for i in indexes:
+            acc = acc * (rx - baby_x[i] * rz) % n
+        following = _xDouble(r, n, a24) if prev is None else _xAdd(r, giant, prev, n)
+        r, prev = following, r
+    g = gcd(acc, n)
+    if g == 1 or g == n:
+        return None
+    return g
+
+
+def ecm(n, seconds=None, workers=1, max_digits=None, seed=0):
+    # type: (greater_than_one, Optional[float], positive, Optional[positive], int) -> Optional[greater_than_one]
+    """Runs the ECM_LEVELS looking for factors with at most max_digits, or
+    until seconds run out. Returns a non trivial factor of n, or None. With
+    more than one worker, the curves run in a pool of that many processes."""
+    assert n > 1, "type violation, expected n > 1"
+    assert workers > 0, "type violation, expected workers > 0"
+    if max_digits is None:
+        max_digits = int(ECM_DEPTH * len(str(n)))
+    deadline = None if seconds is None else time.time() + seconds
+    rng = random.Random("%d/%d" % (n, seed))
+    tasks = [
+        (n, b1, ECM_B2_MULT * b1, rng.randrange(6, 1 << 32))
+        for digits, b1, curves in ECM_LEVELS
+        if digits <= max_digits
+        for _ in range(curves)
+    ]
+    if len(tasks) == 0:
+        return None
+    if workers == 1:
+        for task in tasks:
+            g = ecmCurve(task)
+            if g is not None:
+                return g
+            if deadline is not None and time.time() > deadline:
+                return None
+        return None
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.imap_unordered(ecmCurve, tasks)
+        for _ in range(len(tasks)):
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                g = results.next(timeout)
+            except multiprocessing.TimeoutError:
+                return None
+            if g is not None:
+                return g
+        return None
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def split(n, rho_seconds=RHO_SECONDS, ecm_seconds=None, qs_seconds=None, workers=1, verbosity=0):
+    # type: (greater_than_one, Optional[float], Optional[float], Optional[float], positive, nonnegative) -> Optional[greater_than_one]
+    """Returns a non trivial factor of the composite n, trying rho, then ECM,
+    then the quadratic sieve, each for at most its number of seconds. None
+    means no budget. Returns None if every method runs out of time."""
+    if n < RHO_ONLY_LIMIT:
+        for c in range(1, n):
+            g = brentRho(n, c)
+            if g is not None:
+                return g
+    start = time.time()
+    g = brentRho(n, 1, rho_seconds)
+    if verbosity > 0:
+        print("rho %s %d after %.2fs" % ("split" if g else "didn't split", n, time.time() - start))
+    if g is not None:
+        return g
+
+    start = time.time()
+    g = ecm(n, ecm_seconds, workers)
+    if verbosity > 0:
+        print("ecm %s %d after %.2fs" % ("split" if g else "didn't split", n, time.time() - start))
+    if g is not None:
+        return g
+
+    start = time.time()
+    deadline = None if qs_seconds is None else start + qs_seconds
+    factors = quadraticSieve(n, num_cores=workers, deadline=deadline, **tuneParameters(n))
+    if verbosity > 0:
+        print("qs %s %d after %.2fs" % ("split" if factors else "didn't split", n, time.time() - start))
+    for d in factors:
+        if 1 < d < n:
+            return d
+    return None
+
+
+def factor(n, rho_seconds=RHO_SECONDS, ecm_seconds=None, qs_seconds=None, workers=1, verbosity=0):
+    # type: (positive, Optional[float], Optional[float], Optional[float], positive, nonnegative) -> Dict[int, positive]
+    """Returns the prime factorization of n as {prime: exponent}. The time
+    budgets are per composite, see split. If a composite can't be split
+    within them, it's left in the result as if it were prime, so check with
+    gen_big.isPrime when using budgets."""
+    assert n > 0, "type violation, expected n > 0"
+    factors, rest = trialDivision(n)
+    # (composite, exponent) pairs that are left to split
+    pending = [(rest, 1)] if rest > 1 else []  # type: List[Tuple[int, positive]]
+    while len(pending) > 0:
+        m, e = pending.pop()
+        if isPrime(m):
+            factors[m] = factors.get(m, 0) + e
+            continue
+        power = perfectPower(m)
+        if power is not None:
+            pending.append((power[0], e * power[1]))
+            continue
+        d = split(m, rho_seconds, ecm_seconds, qs_seconds, workers, verbosity)
+        if d is None:
+            factors[m] = factors.get(m, 0) + e
+            continue
+        # A prime dividing both halves gets counted once from each of them
+        pending.append((d, e))
+        pending.append((m // d, e))
+    return factors
+
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description="Factors numbers with "
+        + "trial division, Brent's rho, ECM and the quadratic sieve")
+    parser.add_argument("n", type=int, nargs="*", help="The numbers to "
+        + "factor. Read from stdin, one per line, if none are given")
+    parser.add_argument("--rho_seconds", type=float, default=RHO_SECONDS)
+    parser.add_argument("--ecm_seconds", type=float, help="Defaults to "
+        + "running the ECM_LEVELS for factors up to %.1f of the digits" % ECM_DEPTH)
+    parser.add_argument("--qs_seconds", type=float, help="Defaults to no limit")
+    parser.add_argument("--workers", type=int, default=1, help="The number "
+        + "of processes for ECM curves and the quadratic sieve")
+    parser.add_argument("-j", "--json", action="store_true", help="Print "
+        + "one JSON object per line instead of n: factors")
+    parser.add_argument("-v", "--verbose", default=0, action="count")
+    args = parser.parse_args()
+
+    numbers = args.n if len(args.n) > 0 else (int(line) for line in sys.stdin if line.strip())
+    for n in numbers:
+        assert n > 0, "expected n > 0"
+        factors = factor(n, args.rho_seconds, args.ecm_seconds, args.qs_seconds,
+            args.workers, args.verbose)
+        if args.json:
+            print(json.dumps({"n": n, "factors": {str(p): factors[p] for p in sorted(factors)}}))
+        else:
+            print("%d: %s" % (n, " ".join(
+                str(p) if factors[p] == 1 else "%d^%d" % (p, factors[p]) for p in sorted(factors)
+            )))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
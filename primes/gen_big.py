@@ -8,29 +8,184 @@ from __future__ import print_function
 import argparse
 import json
 import math
+import multiprocessing
 import random
 import sys
+import threading
 import time
 
 if sys.version_info >= (3, 3):
+    from typing import Any, Dict, Iterator, List, Optional, Tuple
+
     uint = int
     greater_than_one = int
+    positive = int
+
+
+def smallPrimes(n):
+    # type: (greater_than_one) -> List[int]
+    """Returns all primes less than or equal to n, via a simple sieve"""
+    assert n > 1, 'type violation, expected n > 1'
+    is_prime = [True] * (n + 1)
+    is_prime[0] = is_prime[1] = False
+    for i in range(2, int(math.sqrt(n)) + 1):
+        if is_prime[i]:
+            for j in range(i * i, n + 1, i):
+                is_prime[j] = False
+    return [i for i in range(n + 1) if is_prime[i]]
+
+
+# Trial dividing by these is much cheaper than a single modular
+# exponentiation on a big n, and it rules out ~85% of random odd numbers
+SMALL_PRIMES = smallPrimes(1000)
+
+# Checking these bases is enough to prove any n below the bound is prime.
+# See https://oeis.org/A014233 and https://arxiv.org/abs/1509.00864
+DETERMINISTIC_WITNESSES = [
+    (2047, [2]),
+    (1373653, [2, 3]),
+    (25326001, [2, 3, 5]),
+    (3215031751, [2, 3, 5, 7]),
+    (2152302898747, [2, 3, 5, 7, 11]),
+    (3474749660383, [2, 3, 5, 7, 11, 13]),
+    (341550071728321, [2, 3, 5, 7, 11, 13, 17]),
+    (3825123056546413051, [2, 3, 5, 7, 11, 13, 17, 19, 23]),
+    (318665857834031151167461, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]),
+    (3317044064679887385961981, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]),
+]  # type: List[Tuple[int, List[int]]]
+
+
+def strongProbablePrime(n, a):
+    # type: (greater_than_one, greater_than_one) -> bool
+    """Checks if odd n is a strong probable prime to base a. That is, with
+    n - 1 = d * 2 ** s for odd d, either a ** d == 1 mod n or
+    a ** (d * 2 ** r) == -1 mod n for some 0 <= r < s."""
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    x = pow(a, d, n)
+    if x == 1 or x == n - 1:
+        return True
+    for _ in range(s - 1):
+        x = pow(x, 2, n)
+        if x == n - 1:
+            return True
+        if x == 1:
+            # 1 has a non-trivial square root mod n, so n is composite
+            return False
+    return False
 
 
 def millerRabin(k, n):
     # type: (greater_than_one, greater_than_one) -> bool
     """Run k tests to check if n is a prime. Each test picks a random int from
-    the range [2, n), and checks if `a ** (n - 1) % n == 1`. Note that
-    Carmichael numbers are composite numbers that will pass all their tests."""
+    the range [2, n - 1), and checks if n is a strong probable prime to that
+    base. A composite passes each test with probability at most 1/4, and
+    unlike the plain Fermat test, Carmichael numbers aren't special."""
     assert k > 1, 'type violation, expected k > 1'
     assert n > 1, 'type violation, expected n > 1'
+    if n < 4:
+        return True
+    if n % 2 == 0:
+        return False
     for _ in range(k):
-        a = random.randrange(2, n)
-        if pow(a, n - 1, n) != 1:
+        a = random.randrange(2, n - 1)
+        if not strongProbablePrime(n, a):
             return False
     return True
 
 
+def jacobi(a, n):
+    # type: (int, greater_than_one) -> int
+    """The Jacobi symbol (a/n) for odd n, which is one of -1, 0 or 1"""
+    assert n > 0 and n % 2 == 1, 'type violation, expected odd n > 0'
+    a %= n
+    result = 1
+    while a != 0:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    if n == 1:
+        return result
+    return 0
+
+
+def strongLucasProbablePrime(n):
+    # type: (greater_than_one) -> bool
+    """The strong Lucas test with Selfridge's parameters, for odd n that is
+    not a perfect square. Together with strongProbablePrime(n, 2) this is the
+    Baillie-PSW test, which has no known counterexamples. Based on
+    https://en.wikipedia.org/wiki/Lucas_pseudoprime#Strong_Lucas_pseudoprimes"""
+    # Find the first D in 5, -7, 9, -11, ... with (D/n) == -1
+    D = 5
+    while True:
+        j = jacobi(D, n)
+        if j == -1:
+            break
+        if j == 0 and abs(D) != n:
+            return False
+        D = -D - 2 if D > 0 else -D + 2
+    P = 1
+    Q = (1 - D) // 4
+
+    d = n + 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    def half(x):
+        # type: (int) -> int
+        # Division by 2 mod n, which works because n is odd
+        if x % 2 == 1:
+            x += n
+        return (x // 2) % n
+
+    # Walk the bits of d from the top, doubling the index each step and
+    # adding one when the bit is set
+    U = 1
+    V = P
+    Qk = Q % n
+    for bit in bin(d)[3:]:
+        U = (U * V) % n
+        V = (V * V - 2 * Qk) % n
+        Qk = (Qk * Qk) % n
+        if bit == '1':
+            U, V = half(P * U + V), half(D * U + P * V)
+            Qk = (Qk * Q) % n
+    if U == 0 or V == 0:
+        return True
+    for _ in range(s - 1):
+        V = (V * V - 2 * Qk) % n
+        if V == 0:
+            return True
+        Qk = (Qk * Qk) % n
+    return False
+
+
+def isSquare(n):
+    # type: (int) -> bool
+    if n < 0:
+        return False
+    if n < 2:
+        return True
+    # Newton's method from above, since floats can't hold big n
+    root = 1 << ((n.bit_length() + 1) // 2)
+    while True:
+        next_root = (root + n // root) // 2
+        if next_root >= root:
+            break
+        root = next_root
+    return root * root == n
+
+
 def isPowerOfTwo(n):
     # type: (greater_than_one) -> bool
     return (n & (n - 1)) == 0
@@ -41,58 +196,252 @@ def lucasLehmer(n):
     """Based on https://en.wikipedia.org/wiki/Lucas%E2%80%93Lehmer_primality_test"""
     assert n > 3, 'lucasLehmer only valid for n > 3'
     assert isPowerOfTwo(n + 1), 'lucasLehmer only valid for 2 ** p - 1'
-    p = int(math.floor(math.log(n + 1, 2)))
+    # n is p ones in binary, so p is exact even when n is too big for floats
+    return isMersennePrime(n.bit_length())
+
+
+def isMersennePrime(p):
+    # type: (greater_than_one) -> bool
+    """Runs Lucas-Lehmer on 2 ** p - 1. Since 2 ** p == 1 mod 2 ** p - 1, the
+    bits of s * s past the first p can be shifted down and added back, so each
+    step is a square, a shift, a mask and an add, with no division."""
+    assert p > 1, 'type violation, expected p > 1'
+    if p == 2:
+        return True
+    n = (1 << p) - 1
     s = 4
     for _ in range(p - 2):
-        s = pow(s, 2, n) - 2
+        s = s * s
+        s = (s & n) + (s >> p)
+        while s >= n:
+            s -= n
+        s -= 2
+        if s < 0:
+            s += n
     return s == 0
 
 
+def mersenneTask(p):
+    # type: (greater_than_one) -> Dict[str, Any]
+    """Tests 2 ** p - 1, and reports how fast the squarings went"""
+    start = time.time()
+    # 2 ** p - 1 is divisible by 2 ** q - 1 for every q dividing p, so only
+    # prime exponents are worth the squarings
+    iterations = p - 2 if p > 2 and isPrime(p) else 0
+    prime = p == 2 or (iterations > 0 and isMersennePrime(p))
+    seconds = time.time() - start
+    return {
+        'p': p,
+        'prime': prime,
+        'seconds': round(seconds, 6),
+        'iterations_per_second': round(iterations / seconds, 1) if iterations > 0 and seconds > 0 else None,
+    }
+
+
+def mersenneScan(p_start, p_end, workers=1):
+    # type: (greater_than_one, greater_than_one, positive) -> Iterator[Dict[str, Any]]
+    """Yields mersenneTask for each p in [p_start, p_end], in order. With
+    workers > 1, exponents are tested in parallel on a process pool."""
+    assert p_start > 1, 'type violation, expected p_start > 1'
+    assert workers > 0, 'type violation, expected workers > 0'
+    exponents = range(p_start, p_end + 1)
+    if workers == 1:
+        for p in exponents:
+            yield mersenneTask(p)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        # Bigger exponents take roughly p ** 2.6 time, so one per task keeps
+        # the workers balanced
+        for result in pool.imap(mersenneTask, exponents, chunksize=1):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 def isPrime(n):
     # type: (greater_than_one) -> bool
+    """Trial divides by SMALL_PRIMES, then runs a deterministic set of strong
+    probable prime tests for n below 3.3 * 10 ** 24. Above that, runs the
+    Baillie-PSW test, and Lucas-Lehmer for Mersenne numbers."""
     assert n > 1, 'type violation, expected n > 1'
-    if n == 2:
-        return True
-    elif n in set([3, 5, 7, 11, 13, 17, 19, 23, 29]):
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n < SMALL_PRIMES[-1] ** 2:
         return True
 
-    # TODO pick the number of iterations to run miller-rabin
-    elif millerRabin(200, n):
-        if not isPowerOfTwo(n + 1) and n > 3:
-            # Lucas-Lehmer only works on `n` of the form `2 ** p - 1`,
-            # for `p` > 2
-            return True
+    for bound, witnesses in DETERMINISTIC_WITNESSES:
+        if n < bound:
+            return all(strongProbablePrime(n, a) for a in witnesses)
+
+    if not strongProbablePrime(n, 2):
+        return False
+    if isPowerOfTwo(n + 1):
+        # Lucas-Lehmer only works on `n` of the form `2 ** p - 1`, but it
+        # is deterministic when it applies
         return lucasLehmer(n)
+    if isSquare(n):
+        return False
+    return strongLucasProbablePrime(n)
 
-    # TODO try an AKS test, else we may incorrectly return False
-    return False
+
+# Candidates are sieved by every prime below this before any modular
+# exponentiation. That's the first ~6500 primes, and leaves about 1 in 10 odds.
+SIEVE_LIMIT = 1 << 16
+SIEVE_PRIMES = smallPrimes(SIEVE_LIMIT)[1:]  # odd primes only
+
+# The number of odd numbers sieved per random start. A 2048 bit window this
+# size has ~11 primes in it, and ~850 candidates survive the sieve.
+WINDOW = 1 << 13
+
+# The primes may be used as keys, so starts come from os.urandom rather than
+# the Mersenne Twister that random.getrandbits shares with everything else
+SYSTEM_RANDOM = random.SystemRandom()
+
+
+def sieveWindow(start, window, primes=None):
+    # type: (uint, greater_than_one, Optional[List[int]]) -> List[uint]
+    """Returns the candidates `start + 2 * i` for i in [0, window) that
+    aren't divisible by any of the primes. start must be odd. This only takes
+    one big-int modulus per prime, `start % p`, to find where that prime's
+    multiples start in the window."""
+    assert start % 2 == 1, 'type violation, expected odd start'
+    if primes is None:
+        primes = SIEVE_PRIMES
+    survivors = bytearray(b'\x01') * window
+    for p in primes:
+        # start + 2 * i == 0 mod p when i == -start * inverse(2) mod p, and
+        # the inverse of 2 mod p is (p + 1) / 2
+        r = start % p
+        i = ((p - r) * ((p + 1) // 2)) % p
+        if start + 2 * i == p:
+            # Don't sieve out the prime itself, just its other multiples
+            i += p
+        if i < window:
+            survivors[i::p] = bytes(len(range(i, window, p)))
+    return [start + 2 * i for i in range(window) if survivors[i]]
+
+
+def randomStart(n_bits):
+    # type: (greater_than_one) -> uint
+    """A random odd number with exactly n_bits bits"""
+    return SYSTEM_RANDOM.getrandbits(n_bits) | (1 << (n_bits - 1)) | 1
+
+
+def firstPrimeInWindow(tup):
+    # type: (Tuple[greater_than_one, uint, greater_than_one]) -> Optional[uint]
+    """Sieves the window and returns the first survivor that passes isPrime,
+    as long as it still has n_bits bits. None when there isn't one."""
+    n_bits, start, window = tup
+    limit = 1 << n_bits
+    for n in sieveWindow(start, window):
+        if n >= limit:
+            break
+        if isPrime(n):
+            return n
+    return None
+
+
+def bigPrimes(n_bits, workers=1, window=WINDOW):
+    # type: (greater_than_one, positive, greater_than_one) -> Iterator[uint]
+    """Yields an endless stream of n_bits primes. Each random start is the
+    beginning of a sieved window, and only the first prime in it is yielded,
+    so no two primes come from nearby starts. With workers > 1, windows are
+    tested in parallel on a process pool."""
+    assert n_bits > 1, 'type violation, expected n_bits > 1'
+    assert workers > 0, 'type violation, expected workers > 0'
+    # Small n_bits don't have enough odd numbers to fill a window
+    window = max(1, min(window, 1 << (n_bits - 2)))
+    if workers == 1:
+        while True:
+            n = firstPrimeInWindow((n_bits, randomStart(n_bits), window))
+            if n is not None:
+                yield n
+    # Pool.imap_unordered reads its tasks from another thread, and would read
+    # an endless iterator all at once. So each task waits for a slot, and a
+    # slot is freed as each result comes back, which keeps 2 * workers
+    # windows queued without waiting on the slowest one.
+    slots = threading.Semaphore(2 * workers)
+    stopped = []  # type: List[bool]
+
+    def tasks():
+        # type: () -> Iterator[Tuple[greater_than_one, uint, greater_than_one]]
+        while True:
+            slots.acquire()
+            if len(stopped) > 0:
+                return
+            yield (n_bits, randomStart(n_bits), window)
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for n in pool.imap_unordered(firstPrimeInWindow, tasks()):
+            slots.release()
+            if n is not None:
+                yield n
+    finally:
+        # Lets the task thread finish so that the pool can shut down
+        stopped.append(True)
+        slots.release()
+        pool.terminate()
+        pool.join()
 
 
 def main():
     # type: () -> None
     parser = argparse.ArgumentParser(description='Generates a continuous ' +
         'stream of big primes')
-    parser.add_argument('n_bits', type=int, help='The number of bits the ' +
-        'primes should be')
+    parser.add_argument('n_bits', type=int, nargs='?', help='The number of ' +
+        'bits the primes should be')
+    parser.add_argument('--mersenne', type=int, nargs=2, metavar=('P_START',
+        'P_END'), help='Instead, run Lucas-Lehmer on 2 ** p - 1 for each p ' +
+        'in [P_START, P_END], and print the result and iterations per second')
     parser.add_argument('--sleep', type=int, default=500, help='The number ' +
         'of milliseconds to sleep between each number. Defaults to 500')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='The ' +
+        'number of processes testing candidates. Defaults to 1')
+    parser.add_argument('--rate', action='store_true', help='Instead of ' +
+        'printing primes, print how many primes per second are generated')
     args = parser.parse_args()
 
+    if args.mersenne is not None:
+        p_start, p_end = args.mersenne
+        assert p_start > 1, 'P_START must be at least 2'
+        for result in mersenneScan(p_start, p_end, args.workers):
+            print(json.dumps(result))
+            sys.stdout.flush()
+        return
+
+    assert args.n_bits is not None, 'Either n_bits or --mersenne is required'
     assert args.n_bits > 1, 'Must have at least two bits'
     assert args.sleep >= 0, '--sleep must be non-negative'
+    assert args.workers > 0, '--workers must be positive'
 
-    running = True
-    while running:
-        is_prime = False
-        while not is_prime:
-            n = random.getrandbits(args.n_bits)  # type: uint
-            if n <= 1 or not isPrime(n):
+    if args.rate:
+        start = time.time()
+        last_report = start
+        count = 0
+        for n in bigPrimes(args.n_bits, args.workers):
+            count += 1
+            now = time.time()
+            if now - last_report < 1.0:
                 continue
-            is_prime = True
+            last_report = now
             print(json.dumps({
-                'n': n,
-                'log2': math.log(n, 2),
+                'primes': count,
+                'seconds': round(now - start, 3),
+                'primes_per_second': round(count / (now - start), 3),
             }))
+            sys.stdout.flush()
+        return
+
+    for n in bigPrimes(args.n_bits, args.workers):  # type: uint
+        print(json.dumps({
+            'n': n,
+            'log2': math.log(n, 2),
+        }))
+        sys.stdout.flush()
         time.sleep(args.sleep / 1000)
 
 
@@ -0,0 +1,262 @@
+# prime_benchmark.py
+# Trevor Pottinger
+# Mon Oct 19 00:31:52 PDT 2026
+
+"""Times every prime generator and primality test in primes/ and fastprimes/
+over a matrix of sizes, and prints one JSON object (or TSV row) per case.
+Generators list the primes up to size, and tests check every integer in
+[size, size + window). Each case runs in a fresh process so that its peak RSS
+is its own. Given a --baseline from an earlier run, it exits non-zero when a
+case got more than --max_slowdown percent slower."""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from itertools import takewhile
+
+import rosetta
+from easy_primes import fermatPrimeTest, getPrimes, getPrimesWithSkips, lucasPrimeTest
+from gen_big import isPrime, millerRabin
+from prime_pi import prime_pi
+from quadratic_sieve import slowPrimes
+from sieve import intSqrt, sievePrimes
+
+# fastprimes/ isn't a package, it's a directory of scripts next to this one
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fastprimes"))
+try:
+    from fastprimes import FastPrimes, n_primes
+except ImportError:
+    FastPrimes = None
+    n_primes = None
+
+if sys.version_info >= (3, 3):
+    from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+    positive = int
+
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+# The number of integers each primality test checks, starting at size
+DEFAULT_WINDOW = 2000
+# Rounds for the probabilistic tests
+TEST_ROUNDS = 20
+# Baseline cases faster than this are mostly noise, so they aren't compared
+MIN_COMPARE_SECONDS = 0.01
+
+# The columns of the TSV report, and the keys of each JSON object
+FIELDS = ["kind", "name", "size", "seconds", "peak_rss_kb", "primes", "primes_per_second"]
+
+
+def fastPrimesFilter(size, window):
+    # type: (positive, positive) -> Any
+    """Builds the two bloom filters over the test window. Sized like the
+    fastprimes README, which has no false positives at this scale."""
+    return FastPrimes.fromRange(size, size + window, 5, 1 << 17, 10, 1 << 17)
+
+
+# name -> (primes up to size, the largest size it's run on). The trial
+# division ones divide by every prime found so far, so they're quadratic.
+GENERATORS = {
+    "getPrimes": (lambda n: getPrimes(max_num=n), None),
+    "getPrimes_trial": (lambda n: getPrimes([2], n), 10 ** 5),
+    "getPrimesWithSkips": (lambda n: getPrimesWithSkips(max_num=n), 10 ** 5),
+    "croft": (lambda n: list(takewhile(lambda p: p <= n, rosetta.croft())), None),
+    "rosetta.primes": (lambda n: list(takewhile(lambda p: p <= n, rosetta.primes())), None),
+    "slowPrimes": (slowPrimes, 10 ** 5),
+    "sievePrimes": (sievePrimes, None),
+    "n_primes": (lambda n: n_primes(prime_pi(n)), 10 ** 5),
+}  # type: Dict[str, Tuple[Callable[[int], List[int]], Optional[int]]]
+
+# name -> (setup from (size, window), test from (setup, m)). Setup isn't timed.
+TESTS = {
+    "isPrime": (lambda size, window: None, lambda _, m: isPrime(m)),
+    "millerRabin": (lambda size, window: None, lambda _, m: millerRabin(TEST_ROUNDS, m)),
+    "fermatPrimeTest": (lambda size, window: None,
+        lambda _, m: fermatPrimeTest(m, TEST_ROUNDS)[0]),
+    "lucasPrimeTest": (lambda size, window: getPrimes(max_num=intSqrt(size + window) + 1),
+        lambda primes, m: lucasPrimeTest(m, TEST_ROUNDS, primes)[0]),
+    "FastPrimes.isPrime": (fastPrimesFilter, lambda fprimes, m: fprimes.isPrime(m)),
+}  # type: Dict[str, Tuple[Callable[[int, int], Any], Callable[[Any, int], bool]]]
+
+# Only available when fastprimes/ imported
+NEEDS_FASTPRIMES = ["n_primes", "FastPrimes.isPrime"]
+
+
+def peakRssKb():
+    # type: () -> int
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, and macOS reports bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def runCase(tup):
+    # type: (Tuple[str, str, positive, positive, positive]) -> Dict[str, Any]
+    """Runs one case repeat times and keeps the fastest. Anything the case
+    prints is dropped so it doesn't end up in the report."""
+    kind, name, size, window, repeat = tup
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        if kind == "generator":
+            generate = GENERATORS[name][0]
+            run = lambda: len(generate(size))  # type: Callable[[], int]
+        else:
+            setup, test = TESTS[name]
+            state = setup(size, window)
+            numbers = range(size, size + window)
+            run = lambda: len([m for m in numbers if test(state, m)])
+        best = None  # type: Optional[float]
+        for _ in range(repeat):
+            start = time.time()
+            primes = run()
+            seconds = time.time() - start
+            best = seconds if best is None else min(best, seconds)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return {
+        "kind": kind,
+        "name": name,
+        "size": size,
+        "seconds": round(best, 6),
+        "peak_rss_kb": peakRssKb(),
+        "primes": primes,
+        "primes_per_second": round(primes / best, 1) if best > 0 else None,
+    }
+
+
+def benchmarkCases(sizes, names=None, window=DEFAULT_WINDOW, repeat=1):
+    # type: (List[positive], Optional[List[str]], positive, positive) -> List[Tuple[str, str, positive, positive, positive]]
+    """Returns the (kind, name, size, window, repeat) matrix, skipping sizes
+    past a generator's limit and anything not in names"""
+    cases = []
+    for kind, table in [("generator", GENERATORS), ("test", TESTS)]:
+        for name in sorted(table):
+            if names is not None and name not in names:
+                continue
+            if FastPrimes is None and name in NEEDS_FASTPRIMES:
+                continue
+            for size in sizes:
+                max_size = table[name][1] if kind == "generator" else None
+                if max_size is not None and size > max_size:
+                    continue
+                cases.append((kind, name, size, window, repeat))
+    return cases
+
+
+def benchmark(cases, isolate=True):
+    # type: (List[Tuple[str, str, positive, positive, positive]], bool) -> Iterator[Dict[str, Any]]
+    """Yields runCase for each case, in order. When isolate is set, each case
+    gets a freshly spawned process so the peak RSS isn't left over from an
+    earlier case."""
+    if not isolate:
+        for case in cases:
+            yield runCase(case)
+        return
+    pool = multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1)
+    try:
+        for result in pool.imap(runCase, cases, chunksize=1):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def loadReport(path):
+    # type: (str) -> Dict[Tuple[str, str, int], Dict[str, Any]]
+    """Reads a report in either format, keyed by (kind, name, size)"""
+    report = {}
+    with open(path) as f:
+        lines = [line for line in f if line.strip() != ""]
+    if len(lines) > 0 and not lines[0].startswith("{"):
+        header = lines[0].rstrip("\n").split("\t")
+        rows = [dict(zip(header, line.rstrip("\n").split("\t"))) for line in lines[1:]]
+    else:
+        rows = [json.loads(line) for line in lines]
+    for row in rows:
+        report[(row["kind"], row["name"], int(row["size"]))] = row
+    return report
+
+
+def regressions(results, baseline, max_slowdown, min_seconds=MIN_COMPARE_SECONDS):
+    # type: (List[Dict[str, Any]], Dict[Tuple[str, str, int], Dict[str, Any]], float, float) -> List[str]
+    """Returns a message for each result more than max_slowdown percent
+    slower than the same case in baseline. Cases missing from the baseline,
+    or that took less than min_seconds in it, are skipped."""
+    found = []
+    for result in results:
+        key = (result["kind"], result["name"], result["size"])
+        if key not in baseline:
+            continue
+        before = float(baseline[key]["seconds"])
+        if before < min_seconds:
+            continue
+        slowdown = 100 * (result["seconds"] - before) / before
+        if slowdown > max_slowdown:
+            found.append("%s %s size=%d took %.3fs, %.1f%% slower than %.3fs" % (
+                result["kind"], result["name"], result["size"], result["seconds"],
+                slowdown, before))
+    return found
+
+
+def formatRow(result, tsv):
+    # type: (Dict[str, Any], bool) -> str
+    if tsv:
+        return "\t".join("" if result[field] is None else str(result[field]) for field in FIELDS)
+    return json.dumps(result, sort_keys=True)
+
+
+def main():
+    # type: () -> int
+    parser = argparse.ArgumentParser(description="Times the prime " +
+        "generators and primality tests over a matrix of sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+        help="Defaults to %s" % " ".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--only", nargs="+", choices=sorted(GENERATORS) + sorted(TESTS),
+        help="Only run these generators and tests")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="The " +
+        "number of integers each test checks. Defaults to %d" % DEFAULT_WINDOW)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs each " +
+        "case this many times and reports the fastest. Defaults to 1")
+    parser.add_argument("--tsv", action="store_true", help="Print a TSV " +
+        "with a header instead of JSON lines")
+    parser.add_argument("--in_process", action="store_true", help="Run " +
+        "every case in this process. Faster, but peak RSS only ever grows")
+    parser.add_argument("--baseline", help="A report from an earlier run. " +
+        "Exits with 1 if any case got slower than --max_slowdown")
+    parser.add_argument("--max_slowdown", type=float, default=20.0,
+        help="The percent slower than the baseline that fails. Defaults to 20")
+    args = parser.parse_args()
+
+    assert all(size > 1 for size in args.sizes), "--sizes must be greater than 1"
+    assert args.window > 0, "--window must be positive"
+    assert args.repeat > 0, "--repeat must be positive"
+
+    baseline = loadReport(args.baseline) if args.baseline is not None else None
+    cases = benchmarkCases(args.sizes, args.only, args.window, args.repeat)
+    if args.tsv:
+        print("\t".join(FIELDS))
+    results = []
+    for result in benchmark(cases, not args.in_process):
+        results.append(result)
+        print(formatRow(result, args.tsv))
+        sys.stdout.flush()
+
+    if baseline is None:
+        return 0
+    found = regressions(results, baseline, args.max_slowdown)
+    for message in found:
+        print(message, file=sys.stderr)
+    return 1 if len(found) > 0 else 0
+
+
+if __name__ == "__main__":
+    ret = main()
+    sys.exit(ret)
@@ -0,0 +1,210 @@
+# prime_pi.py
+# Trevor Pottinger
+# Sun Oct 18 23:41:27 PDT 2026
+
+"""Counts the primes up to x without listing them. The default is
+Lucy_Hedgehog's method, which takes O(x ** (3 / 4)) time and keeps three
+arrays of sqrt(x) entries. Meissel-Lehmer is slower in pure Python, but its
+memory stays around a fixed size table, so it takes over past LUCY_MAX."""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from factor import intRoot
+from sieve import basePrimes, countPrimes, intSqrt, sieveSegment
+
+if sys.version_info >= (3, 3):
+    from typing import Dict, List, Optional, Tuple
+
+    nonnegative = int
+    positive = int
+
+
+# Lucy's tables are about 20 * sqrt(x) bytes, which is ~630MB at 10 ** 15.
+# Its indexes are also computed with float64 division, which is only exact
+# while x // i fits in 52 bits.
+LUCY_MAX = 10 ** 15
+
+# Meissel-Lehmer looks up pi(v) for v up to this many in a table of int32
+# counts over the odd numbers, so it's 2 bytes per number covered
+LEHMER_TABLE = 1 << 24
+# phi(v, a) for a this small is read off a wheel. The first 6 primes make the
+# wheel 30030 long.
+WHEEL_PRIMES = 6
+
+METHODS = ["lucy", "lehmer"]
+
+
+def lucyHedgehog(x):
+    # type: (nonnegative) -> Tuple[np.ndarray, np.ndarray]
+    """Returns (small, large) where small[v] is pi(v) for v <= sqrt(x), and
+    large[i] is pi(x // i) for 1 <= i <= sqrt(x).
+
+    Starts with S(v) = v - 1 for every v = x // i, then for each prime p up to
+    sqrt(x) removes the numbers whose smallest prime factor is p, via
+    S(v) -= S(v // p) - S(p - 1). Each prime is one vectorized update, in an
+    order where every S(v // p) on the right hand side is the old value."""
+    assert x <= LUCY_MAX, "type violation, expected x <= %d" % LUCY_MAX
+    r = intSqrt(x)
+    # pi(sqrt(x)) fits in 32 bits, and the smaller table is gathered from at
+    # random, so it helps to keep it compact
+    small = np.arange(-1, r, dtype=np.int32)
+    small[0] = 0
+    x_div = np.zeros(r + 1, dtype=np.float64)
+    x_div[1:] = x // np.arange(1, r + 1, dtype=np.int64)
+    large = x_div.astype(np.int64) - 1
+    large[0] = 0
+    for p in basePrimes(r).tolist():
+        sp = int(small[p - 1])
+        p2 = p * p
+        # large[i] for every i with x // i >= p ** 2. Up to r // p, x // i // p
+        # is x // (i * p) which is in large, and past that it's in small.
+        k = min(r, x // p2)
+        kp = min(k, r // p)
+        large[1:kp + 1] -= large[p:kp * p + 1:p] - sp
+        if k > kp:
+            large[kp + 1:k + 1] -= small[(x_div[kp + 1:k + 1] / p).astype(np.int64)] - sp
+        # small[v] for p ** 2 <= v <= r, where v // p repeats each value p times
+        if p2 <= r:
+            small[p2:] -= np.repeat(small[p:r // p + 1], p)[:r + 1 - p2] - sp
+    return (small, large)
+
+
+class MeisselLehmer(object):
+    """Lehmer's formula,
+
+        pi(x) = phi(x, a) + (b + a - 2) * (b - a + 1) / 2
+            - sum(pi(x / p_i) for a < i <= b)
+            - sum(pi(x / (p_i * p_j)) - (j - 1) for a < i <= c, i <= j <= b_i)
+
+    where a = pi(x ** (1 / 4)), b = pi(x ** (1 / 2)), c = pi(x ** (1 / 3)) and
+    b_i = pi((x / p_i) ** (1 / 2)). pi(v) comes from a table for v up to
+    table_limit, and from this formula, memoized, past that. phi(v, a) counts
+    the numbers up to v with no prime factor among the first a primes."""
+
+    def __init__(self, x, table_limit=LEHMER_TABLE):
+        # type: (nonnegative, positive) -> None
+        # Past the table, a = pi(v ** (1 / 4)) has to reach the wheel, and the
+        # 6th prime is 13
+        self.limit = max(table_limit, intSqrt(x) + 1, 13 ** 4)
+        n_odds = self.limit // 2 + 1
+        is_prime = sieveSegment(1, n_odds, basePrimes(intSqrt(2 * n_odds)))
+        # counts[i] is the number of odd primes up to 2 * i + 1
+        self.counts = np.cumsum(is_prime, dtype=np.int32)
+        self.primes = np.concatenate([[2], 2 * np.flatnonzero(is_prime) + 1])
+        self.prime_list = self.primes.tolist()  # type: List[int]
+        wheel = 1
+        for p in self.prime_list[:WHEEL_PRIMES]:
+            wheel *= p
+        coprime = np.ones(wheel, dtype=np.int64)
+        for p in self.prime_list[:WHEEL_PRIMES]:
+            coprime[::p] = 0
+        # wheel_counts[r] is phi(r, WHEEL_PRIMES) for 0 <= r < wheel
+        self.wheel = wheel
+        self.wheel_counts = np.cumsum(coprime)
+        self.wheel_total = int(self.wheel_counts[-1])
+        self.pi_cache = {}  # type: Dict[int, int]
+        self.phi_cache = {}  # type: Dict[Tuple[int, int], int]
+
+    def pi(self, v):
+        # type: (nonnegative) -> nonnegative
+        if v <= self.limit:
+            return int(self.counts[(v - 1) // 2]) + 1 if v >= 2 else 0
+        if v in self.pi_cache:
+            return self.pi_cache[v]
+        a = self.pi(intRoot(v, 4))
+        b = self.pi(intSqrt(v))
+        c = self.pi(intRoot(v, 3))
+        total = self.phi(v, a) + (b + a - 2) * (b - a + 1) // 2
+        for i in range(a + 1, b + 1):
+            w = v // self.prime_list[i - 1]
+            total -= self.pi(w)
+            if i <= c:
+                # w // p_j <= sqrt(v), so these are all table lookups
+                b_i = self.pi(intSqrt(w))
+                quotients = w // self.primes[i - 1:b_i]
+                total -= int(self.counts[(quotients - 1) // 2].sum()) + len(quotients)
+                total += (i - 1 + b_i - 1) * (b_i - i + 1) // 2
+        self.pi_cache[v] = total
+        return total
+
+    def phi(self, v, a):
+        # type: (nonnegative, nonnegative) -> nonnegative
+        if a <= WHEEL_PRIMES:
+            assert a == WHEEL_PRIMES, "phi is only called with a >= WHEEL_PRIMES"
+            return (v // self.wheel) * self.wheel_total + int(self.wheel_counts[v % self.wheel])
+        if v < self.prime_list[a - 1]:
+            return 1 if v >= 1 else 0
+        # Every number left is 1 or a prime when v < p_(a + 1) ** 2
+        if v <= self.limit and v < self.prime_list[a] ** 2:
+            return self.pi(v) - a + 1
+        key = (v, a)
+        if key in self.phi_cache:
+            return self.phi_cache[key]
+        # Unrolls phi(v, a) = phi(v, a - 1) - phi(v // p_a, a - 1) down to
+        # the wheel, so the recursion depth doesn't grow with a
+        total = self.phi(v, WHEEL_PRIMES)
+        for b in range(WHEEL_PRIMES + 1, a + 1):
+            p = self.prime_list[b - 1]
+            if p > v:
+                break
+            total -= self.phi(v // p, b - 1)
+        self.phi_cache[key] = total
+        return total
+
+
+def meisselLehmer(x, table_limit=LEHMER_TABLE):
+    # type: (int, positive) -> nonnegative
+    if x < 2:
+        return 0
+    return MeisselLehmer(x, table_limit).pi(x)
+
+
+def prime_pi(x, method=None):
+    # type: (int, Optional[str]) -> nonnegative
+    """Returns the number of primes <= x. method is one of METHODS, and
+    defaults to lucy up to LUCY_MAX and lehmer past that."""
+    if x < 2:
+        return 0
+    if method is None:
+        method = "lucy" if x <= LUCY_MAX else "lehmer"
+    assert method in METHODS, "type violation, expected method in %s" % METHODS
+    if method == "lucy":
+        return int(lucyHedgehog(x)[1][1])
+    return meisselLehmer(x)
+
+
+def main():
+    # type: () -> int
+    parser = argparse.ArgumentParser(description="Counts the primes <= x")
+    parser.add_argument("x", type=int, nargs="+")
+    parser.add_argument("--method", choices=METHODS, help="Defaults to lucy "
+        + "up to %d and lehmer past that" % LUCY_MAX)
+    parser.add_argument("--check", action="store_true", help="Also count "
+        + "with the segmented sieve, and fail if they differ")
+    parser.add_argument("-v", "--verbose", action="store_true",
+        help="Print how long each count took to stderr")
+    args = parser.parse_args()
+
+    ret = 0
+    for x in args.x:
+        start = time.time()
+        count = prime_pi(x, args.method)
+        print(count)
+        if args.verbose:
+            print("pi(%d) took %.3fs" % (x, time.time() - start), file=sys.stderr)
+        if args.check and count != countPrimes(0, x + 1):
+            print("pi(%d) doesn't match the sieve" % x, file=sys.stderr)
+            ret = 1
+    return ret
+
+
+if __name__ == "__main__":
+    ret = main()
+    sys.exit(ret)
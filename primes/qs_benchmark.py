@@ -0,0 +1,94 @@
+# qs_benchmark.py
+# Trevor Pottinger
+# Sun Oct 18 18:41:09 PDT 2026
+
+"""Times each phase of quadraticSieve over a ladder of semiprimes, using the
+parameters from tuneParameters, and prints one JSON object per line. Keeping
+the output around makes it easy to spot regressions, and comparing runs with
+different --b_scale values is how TUNE_B_SCALE was picked."""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from gen_big import isPrime
+from quadratic_sieve import TUNE_B_SCALE, quadraticSieve, tuneParameters
+
+if sys.version_info >= (3, 3):
+    from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+    greater_than_one = int
+    positive = int
+
+
+def randomPrime(digits, rng):
+    # type: (positive, random.Random) -> greater_than_one
+    while True:
+        p = rng.randrange(10 ** (digits - 1), 10 ** digits) | 1
+        if isPrime(p):
+            return p
+
+
+def semiprime(digits, seed):
+    # type: (positive, int) -> Tuple[greater_than_one, greater_than_one]
+    """Returns (n, p) where n has exactly `digits` digits and is the product
+    of p and another prime of about the same size"""
+    rng = random.Random("%d/%d" % (digits, seed))
+    while True:
+        p = randomPrime(digits // 2, rng)
+        q = randomPrime(digits - digits // 2, rng)
+        if len(str(p * q)) == digits:
+            return (p * q, min(p, q))
+
+
+def benchmark(ladder, seed=0, num_cores=None, b_scale=TUNE_B_SCALE):
+    # type: (List[positive], int, Optional[positive], float) -> Iterator[Dict[str, Any]]
+    for digits in ladder:
+        n, p = semiprime(digits, seed)
+        params = tuneParameters(n, b_scale)
+        stats = {}  # type: Dict[str, Any]
+        start = time.time()
+        factors = quadraticSieve(n, num_cores=num_cores, stats=stats, **params)
+        result = {
+            "digits": digits,
+            "n": n,
+            "factored": p in factors,
+            "seconds": round(time.time() - start, 3),
+        }
+        result.update(params)
+        for key in stats:
+            result[key] = round(stats[key], 3) if isinstance(stats[key], float) else stats[key]
+        yield result
+
+
+def main():
+    # type: () -> None
+    parser = argparse.ArgumentParser(description="Times each phase of the "
+        + "quadratic sieve for semiprimes of increasing size")
+    parser.add_argument("--min_digits", type=int, default=20)
+    parser.add_argument("--max_digits", type=int, default=60)
+    parser.add_argument("--step", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0, help="Picks which "
+        + "semiprimes get factored. The same seed gives the same ladder")
+    parser.add_argument("--cores", type=int, default=1, help="The number of "
+        + "processes for sieving. Defaults to 1, so timings are comparable")
+    parser.add_argument("--b_scale", type=float, default=TUNE_B_SCALE,
+        help="Multiplies L(n) ** (1 / 2) to get B, defaults to %.2f" % TUNE_B_SCALE)
+    args = parser.parse_args()
+
+    assert args.min_digits >= 4, "expected min_digits >= 4"
+    assert args.step > 0, "expected step > 0"
+
+    ladder = list(range(args.min_digits, args.max_digits + 1, args.step))
+    for result in benchmark(ladder, args.seed, args.cores, args.b_scale):
+        print(json.dumps(result, sort_keys=True))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,16 @@ from __future__ import print_function
 import argparse
 import math
 import multiprocessing
+import random
 import sys
+import time
+
+import numpy as np
+
+from relations import RelationStore
 
 if sys.version_info >= (3, 3):
-    from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+    from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 
     greater_than_one = int
     greater_than_zero = int
@@ -133,6 +139,19 @@ def slowFactors(n, primes=None):
     return (False, ret)
 
 
+def signedFactors(i, primes):
+    # type: (int, List[prime]) -> Tuple[bool, Dict[prime, greater_than_zero]]
+    """Like slowFactors, but allows negative i, in which case -1 is included
+    as a factor. SIQS relations can be negative, and -1 then acts like one
+    more prime in the exponent vectors."""
+    if i > 0:
+        return slowFactors(i, primes) if i > 1 else (True, {})
+    assert i < 0, "type violation, expected i != 0"
+    factored, factors = slowFactors(-i, primes) if i < -1 else (True, {})
+    factors[-1] = 1
+    return (factored, factors)
+
+
 def vectorize(rows, default=None):
     # type: (List[Dict[K, V]], Optional[V]) -> List[List[V]]
     """Given a list of dicts, returns a list of vectors. Where each vector is
@@ -240,40 +259,356 @@ def identity(nrows, ncols=None):
     return ret
 
 
-def findSquareProduct(primes, ints):
-    # type: (Optional[List[prime]], List[nonnegative]) -> Tuple[List[List[nonnegative]], List[nonnegative]]
+def gf2Words(ncols):
+    # type: (nonnegative) -> positive
+    """The number of uint64 words in a packed row with ncols columns"""
+    return max(1, (ncols + 63) // 64)
+
+
+def gf2Pack(bits):
+    # type: (np.ndarray) -> np.ndarray
+    """Packs a 2d array of 0s and 1s into rows of uint64 words, where column
+    j is bit j % 64 of word j // 64."""
+    bits = np.asarray(bits, dtype=np.uint8)
+    nrows, ncols = bits.shape
+    padded = np.zeros((nrows, 64 * gf2Words(ncols)), dtype=np.uint8)
+    padded[:, :ncols] = bits
+    packed = np.packbits(padded, axis=1, bitorder="little")
+    return packed.view("<u8").astype(np.uint64)
+
+
+def gf2Unpack(packed, ncols):
+    # type: (np.ndarray, nonnegative) -> np.ndarray
+    """The inverse of gf2Pack"""
+    as_bytes = np.ascontiguousarray(packed, dtype="<u8").view(np.uint8)
+    return np.unpackbits(as_bytes, axis=1, bitorder="little")[:, :ncols]
+
+
+def gf2RowReduction(packed, ncols):
+    # type: (np.ndarray, nonnegative) -> List[nonnegative]
+    """The same as modularRowReduction with mod 2, but for a matrix from
+    gf2Pack. Each row operation is a single XOR over the words of every row
+    that needs it. Reduces packed in place and returns the pivot columns."""
+    nrows = packed.shape[0]
+    pivots = []  # type: List[nonnegative]
+    for col in range(ncols):
+        i = len(pivots)
+        if i == nrows:
+            break
+        word = col >> 6
+        bit = np.uint64(1) << np.uint64(col & 63)
+        # find the first row, j >= i, where `col` is non-zero
+        nonzero = np.flatnonzero(packed[i:, word] & bit)
+        if len(nonzero) == 0:
+            continue
+        j = i + int(nonzero[0])
+        if j != i:
+            packed[[i, j]] = packed[[j, i]]
+        # Row i is zero left of `col`, so the earlier words can be skipped
+        others = (packed[:, word] & bit) != 0
+        others[i] = False
+        packed[others, word:] ^= packed[i, word:]
+        pivots.append(col)
+    return pivots
+
+
+# Block Lanczos works on blocks of 64 vectors at a time, stored as one uint64
+# per row. Below this many relations dense elimination is just as quick.
+LANCZOS_MIN_RELATIONS = 2000
+
+# A block Lanczos run usually finds a few dozen null vectors, so it's only
+# used when at most this many are needed
+LANCZOS_MAX_VECTORS = 32
+
+# The number of times to restart block Lanczos with a new random block before
+# falling back to dense elimination
+LANCZOS_ATTEMPTS = 3
+
+# _BYTE_BITS[bit][byte] is whether `bit` is set in `byte`
+_BYTE_BITS = [(np.arange(256) >> bit) & 1 == 1 for bit in range(8)]
+
+def gf2BlockMul(block, mat):
+    # type: (np.ndarray, np.ndarray) -> np.ndarray
+    """Multiplies a block, a uint64 per row so 64 columns, by a 64 x 64 matrix
+    stored as 64 uint64 rows. Uses a table of the 256 sums of each 8 rows of
+    mat, so it's 8 lookups per row of block instead of 64."""
+    ret = np.zeros(block.shape, dtype=np.uint64)
+    for b in range(8):
+        table = np.zeros(256, dtype=np.uint64)
+        for bit in range(8):
+            table[1 << bit:2 << bit] = table[:1 << bit] ^ mat[8 * b + bit]
+        ret ^= table[((block >> np.uint64(8 * b)) & np.uint64(255)).astype(np.intp)]
+    return ret
+
+
+def gf2BlockInner(block_a, block_b):
+    # type: (np.ndarray, np.ndarray) -> np.ndarray
+    """Returns the 64 x 64 matrix block_a transposed times block_b. Rows of
+    block_b are first summed by each byte of block_a, so each of the 64 rows
+    of the result is a sum of 128 of those sums."""
+    ret = np.zeros(64, dtype=np.uint64)
+    for b in range(8):
+        sums = np.zeros(256, dtype=np.uint64)
+        byte = ((block_a >> np.uint64(8 * b)) & np.uint64(255)).astype(np.intp)
+        np.bitwise_xor.at(sums, byte, block_b)
+        for bit in range(8):
+            ret[8 * b + bit] = np.bitwise_xor.reduce(sums[_BYTE_BITS[bit]])
+    return ret
+
+
+def _xorGroups(values, starts, counts):
+    # type: (np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+    ret = np.zeros(len(starts), dtype=np.uint64)
+    nonempty = counts > 0
+    if nonempty.any():
+        ret[nonempty] = np.bitwise_xor.reduceat(values, starts[nonempty])
+    return ret
+
+
+def _lanczosChoose(vav, last_chosen):
+    # type: (np.ndarray, int) -> Tuple[np.ndarray, int]
+    """Picks the columns S of V such that S^T V^T A V S is invertible, and
+    returns its inverse (padded with zeros outside S) and S as a bitmask.
+    The columns not chosen last time go first, so every column of V gets
+    used eventually. See Montgomery, "A Block Lanczos Algorithm for Finding
+    Dependencies over GF(2)", 1995."""
+    order = [c for c in range(64) if not (last_chosen >> c) & 1]
+    order += [c for c in range(64) if (last_chosen >> c) & 1]
+    # Rows of [V^T A V | I] as python ints, with the identity in the high bits
+    rows = [int(vav[c]) | (1 << (64 + c)) for c in range(64)]
+    chosen = 0
+    for j, c in enumerate(order):
+        for col in (c, 64 + c):
+            k = next((k for k in order[j:] if (rows[k] >> col) & 1), None)
+            if k is not None:
+                break
+        assert k is not None, "V^T A V | I always has full rank"
+        rows[c], rows[k] = rows[k], rows[c]
+        for other in order:
+            if other != c and (rows[other] >> col) & 1:
+                rows[other] ^= rows[c]
+        if col == c:
+            chosen |= 1 << c
+        else:
+            rows[c] = 0
+    mask = (1 << 64) - 1
+    winv = np.array([(row >> 64) & mask for row in rows], dtype=np.uint64)
+    return (winv, chosen)
+
+
+def blockLanczos(rows, cols, n_rows, n_cols, seed=0):
+    # type: (np.ndarray, np.ndarray, nonnegative, positive, int) -> np.ndarray
+    """Finds vectors x with B x == 0, where B is the sparse n_rows x n_cols
+    GF(2) matrix with a 1 at each (rows[k], cols[k]). Works on A = B^T B,
+    which is symmetric, so each iteration is just two sparse products with
+    B. Returns a block with a null vector in each column, some of which may
+    be zero or repeats."""
+    by_row = np.argsort(rows, kind="stable")
+    row_counts = np.bincount(rows, minlength=n_rows)
+    row_starts = np.concatenate([[0], np.cumsum(row_counts)[:-1]])
+    by_col = np.argsort(cols, kind="stable")
+    col_counts = np.bincount(cols, minlength=n_cols)
+    col_starts = np.concatenate([[0], np.cumsum(col_counts)[:-1]])
+    rows_by_col, cols_by_row = rows[by_col], cols[by_row]
+
+    def mulB(block):
+        # type: (np.ndarray) -> np.ndarray
+        return _xorGroups(block[cols_by_row], row_starts, row_counts)
+
+    def mulA(block):
+        # type: (np.ndarray) -> np.ndarray
+        return _xorGroups(mulB(block)[rows_by_col], col_starts, col_counts)
+
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 1 << 63, n_cols, dtype=np.uint64) << np.uint64(1)
+    y ^= rng.integers(0, 2, n_cols, dtype=np.uint64)
+    v0 = mulA(y)
+    ident = np.uint64(1) << np.arange(64, dtype=np.uint64)
+    zero_block = np.zeros(n_cols, dtype=np.uint64)
+    zero_mat = np.zeros(64, dtype=np.uint64)
+    x = zero_block
+    v, v_1, v_2 = v0, zero_block, zero_block
+    winv_1, winv_2 = zero_mat, zero_mat
+    vav_1, vaav_1 = zero_mat, zero_mat
+    chosen_1 = (1 << 64) - 1
+    # Each iteration uses up about 63 dimensions
+    for _ in range(n_cols // 60 + 100):
+        av = mulA(v)
+        vav = gf2BlockInner(v, av)
+        if not vav.any():
+            break
+        vaav = gf2BlockInner(av, av)
+        winv, chosen = _lanczosChoose(vav, chosen_1)
+        s = np.uint64(chosen)
+        s_1 = np.uint64(chosen_1)
+        x = x ^ gf2BlockMul(v, gf2BlockMul(winv, gf2BlockInner(v, v0)))
+        d = ident ^ gf2BlockMul(winv, (vaav & s) ^ vav)
+        e = gf2BlockMul(winv_1, vav & s)
+        f = gf2BlockMul(
+            gf2BlockMul(winv_2, ident ^ gf2BlockMul(vav_1, winv_1)),
+            ((vaav_1 & s_1) ^ vav_1) & s,
+        )
+        v_next = (av & s) ^ gf2BlockMul(v, d) ^ gf2BlockMul(v_1, e) ^ gf2BlockMul(v_2, f)
+        v, v_1, v_2 = v_next, v, v_1
+        winv_1, winv_2 = winv, winv_1
+        vav_1, vaav_1, chosen_1 = vav, vaav, chosen
+
+    # x - y and v are nearly in the null space of A, so find the sums of
+    # their 128 columns that are in the null space of B
+    z = [x ^ y, v]
+    bz = [mulB(z_part) for z_part in z]
+    shifts = np.arange(64, dtype=np.uint64)
+    bits = np.zeros((128, n_rows + 128), dtype=np.uint8)
+    for half in range(2):
+        bits[64 * half:64 * half + 64, :n_rows] = (bz[half][None, :] >> shifts[:, None]) & np.uint64(1)
+    bits[:, n_rows:] = np.eye(128, dtype=np.uint8)
+    packed = gf2Pack(bits)
+    pivots = gf2RowReduction(packed, n_rows)
+    combos = gf2Unpack(packed[len(pivots):], n_rows + 128)[:, n_rows:]
+    mats = np.zeros((2, 64), dtype=np.uint64)
+    for k, combo in enumerate(combos[:64]):
+        for half in range(2):
+            mats[half] |= combo[64 * half:64 * half + 64].astype(np.uint64) << np.uint64(k)
+    return gf2BlockMul(z[0], mats[0]) ^ gf2BlockMul(z[1], mats[1])
+
+
+def filterRelations(ints, odd_factors):
+    # type: (List[int], List[Set[int]]) -> List[nonnegative]
+    """Returns the indices of the relations that can be part of a square
+    product, in order. odd_factors[i] is the set of primes with an odd
+    exponent in ints[i]. Repeats of an int are dropped, and so is any
+    relation with a prime that no other relation has. Dropping a relation
+    can leave another prime with one relation, so this repeats until there
+    are no such singletons left."""
+    alive = set()  # type: Set[nonnegative]
+    seen = set()  # type: Set[int]
+    relations_of = {}  # type: Dict[int, List[nonnegative]]
+    for i, n in enumerate(ints):
+        if n in seen:
+            continue
+        seen.add(n)
+        alive.add(i)
+        for p in odd_factors[i]:
+            relations_of.setdefault(p, []).append(i)
+    counts = {p: len(relations_of[p]) for p in relations_of}
+    singletons = [p for p in counts if counts[p] == 1]
+    while len(singletons) > 0:
+        p = singletons.pop()
+        if counts[p] != 1:
+            continue
+        for i in relations_of[p]:
+            if i not in alive:
+                continue
+            alive.remove(i)
+            for q in odd_factors[i]:
+                counts[q] -= 1
+                if counts[q] == 1:
+                    singletons.append(q)
+    return sorted(alive)
+
+
+def gf2NullSpace(odd_factors, max_vectors=None):
+    # type: (List[Set[int]], Optional[positive]) -> np.ndarray
+    """Returns a basis of the subsets of relations whose exponent vectors sum
+    to zero mod 2, as packed rows with one column per relation. Without
+    max_vectors it's the whole basis in reduced row echelon form, which is
+    the same basis modularRowReduction finds. With a few max_vectors and
+    enough relations, block Lanczos finds them without ever building the
+    dense matrix."""
+    n_relations = len(odd_factors)
+    col_of = {}  # type: Dict[int, nonnegative]
+    rows = []  # type: List[nonnegative]
+    cols = []  # type: List[nonnegative]
+    for j, factors in enumerate(odd_factors):
+        for p in factors:
+            if p not in col_of:
+                col_of[p] = len(col_of)
+            rows.append(col_of[p])
+            cols.append(j)
+    rows_arr = np.array(rows, dtype=np.int64)
+    cols_arr = np.array(cols, dtype=np.int64)
+
+    if (max_vectors is not None and max_vectors <= LANCZOS_MAX_VECTORS and len(col_of) > 0
+            and n_relations >= LANCZOS_MIN_RELATIONS):
+        found = np.zeros((0, gf2Words(n_relations)), dtype=np.uint64)
+        for attempt in range(LANCZOS_ATTEMPTS):
+            block = blockLanczos(rows_arr, cols_arr, len(col_of), n_relations, attempt)
+            shifts = np.arange(64, dtype=np.uint64)
+            packed = gf2Pack((block[None, :] >> shifts[:, None]) & np.uint64(1))
+            # Reducing drops the zero and repeated vectors
+            packed = packed[:len(gf2RowReduction(packed, n_relations))]
+            if len(packed) > len(found):
+                found = packed
+            if len(found) >= max_vectors:
+                break
+        if len(found) > 0:
+            return found[:max_vectors]
+
+    # The transpose has one row per prime, so the pivot free columns are the
+    # relations that are a sum of earlier ones
+    transpose = np.zeros((len(col_of), gf2Words(n_relations)), dtype=np.uint64)
+    np.bitwise_or.at(
+        transpose,
+        (rows_arr, cols_arr >> 6),
+        np.uint64(1) << (cols_arr & 63).astype(np.uint64),
+    )
+    pivots = gf2RowReduction(transpose, n_relations)
+    is_pivot = np.zeros(n_relations, dtype=np.bool_)
+    is_pivot[pivots] = True
+    free = np.flatnonzero(~is_pivot)
+    if max_vectors is not None:
+        free = free[:max_vectors]
+    # Relation f plus every pivot relation with a 1 in column f
+    null_space = np.zeros((len(free), n_relations), dtype=np.uint8)
+    null_space[np.arange(len(free)), free] = 1
+    if len(pivots) > 0:
+        rank = len(pivots)
+        free_words = (free >> 6).astype(np.int64)
+        free_bits = (free & 63).astype(np.uint64)
+        in_pivot = (transpose[:rank, free_words] >> free_bits) & np.uint64(1)
+        null_space[:, pivots] = in_pivot.T.astype(np.uint8)
+    packed = gf2Pack(null_space)
+    if max_vectors is None:
+        gf2RowReduction(packed, n_relations)
+    return packed
+
+
+def findSquareProduct(primes, ints, max_solutions=None):
+    # type: (Optional[List[prime]], List[int], Optional[positive]) -> Tuple[List[List[nonnegative]], List[int]]
     """Given a list of distinct integers, finds products of a subset of them
-    that is a square and returns those products."""
+    that is a square and returns those products. indices[k][j] is 1 if the
+    jth int that factors over primes is in the kth product. Returns at most
+    max_solutions products, otherwise it returns a basis of them."""
     if primes is None:
-        primes = slowPrimes(max(ints))
-    rows = []
+        primes = slowPrimes(max(map(abs, ints)))
+    factored_ints = []  # type: List[int]
+    odd_factors = []  # type: List[Set[int]]
     for i in ints:
-        factored, factors = slowFactors(i, primes)
+        factored, factors = signedFactors(i, primes)
         if not factored:
             continue
-        rows.append(factors)
-    exponents = vectorize(rows, default=0)
-    even_exponents = []
-    for vector in exponents:
-        even_exponents.append([e % 2 for e in vector])
+        factored_ints.append(i)
+        odd_factors.append(set(p for p in factors if factors[p] % 2 == 1))
 
     # We might use less than all `primes`, as well as less than all ints
-    n_primes = len(even_exponents[0])
-    n_ints = len(even_exponents)
-    res = modularRowReduction(matExtend(even_exponents, identity(n_ints)), 2)
-    zero_row = [0 for _ in range(n_primes)]
+    n_ints = len(factored_ints)
+    kept = filterRelations(factored_ints, odd_factors)
+    if len(kept) == 0:
+        return ([], [])
+    null_space = gf2NullSpace([odd_factors[j] for j in kept], max_solutions)
+    # kept is sorted, so the rows are still in reduced row echelon form
+    # after mapping them back to the unfiltered ints
+    bits = gf2Unpack(null_space, len(kept))
 
     indices = []
     solutions = []
-    for i in range(n_ints):
-        if res[i][:n_primes] != zero_row:
-            continue
+    for row in bits:
+        index = [0 for _ in range(n_ints)]
         solution = 1
-        for j, bit in enumerate(res[i][n_primes:]):
-            if bit == 0:
-                continue
-            solution *= ints[j]
-        indices.append(res[i][n_primes:])
+        for k in np.flatnonzero(row).tolist():
+            index[kept[k]] = 1
+            solution *= factored_ints[kept[k]]
+        indices.append(index)
         solutions.append(solution)
 
     return (indices, solutions)
@@ -406,16 +741,393 @@ def isQuadraticResidue(p, n):
     return success
 
 
-def quadraticSieve(n, interval_mult=2, max_prime=229, verbosity=0):
-    # type: (greater_than_one, nonnegative, greater_than_one, nonnegative) -> Dict[maybe_prime, greater_than_zero]
+# The number of x values sieved at a time. One byte each for the log
+# accumulator, so this stays in L2 cache.
+SIEVE_BLOCK = 1 << 16
+
+# How far below log2(x ** 2 - n) the accumulated logs may be and still get
+# trial divided, in multiples of log2 of the largest prime. This makes up for
+# rounding the logs, and for not sieving with prime powers.
+SIEVE_SLACK = 1.5
+
+
+def factorBaseRoots(primes, n):
+    # type: (List[prime], greater_than_one) -> List[Tuple[prime, List[nonnegative], nonnegative]]
+    """For each prime p in the factor base, returns (p, roots, log) where
+    roots are the solutions of x ** 2 == n mod p, and log is log2(p) rounded.
+    These only depend on n, so compute them once and reuse them per block."""
+    fb = []
+    for p in primes:
+        success, root = tonelli(n % p, p)
+        assert success, "%d is not a quadratic residue mod %d" % (n, p)
+        roots = [root] if root == p - root or p == 2 else [root, p - root]
+        fb.append((p, roots, int(round(math.log(p, 2)))))
+    return fb
+
+
+def sieveBlock(fb, n, n_root, start, length, slack):
+    # type: (List[Tuple[prime, List[nonnegative], nonnegative]], greater_than_one, nonnegative, nonnegative, positive, float) -> np.ndarray
+    """Sieves x in [start, start + length) and returns the offsets of the x
+    whose x ** 2 - n is likely B-smooth. Every prime adds its log to each x
+    that is a root mod p, so x where the logs add up to about log2(x ** 2 -
+    n) are likely to factor completely over the factor base."""
+    logs = np.zeros(length, dtype=np.uint8)
+    for p, roots, log_p in fb:
+        for root in roots:
+            logs[(root - start) % p::p] += log_p
+    # With x = n_root + k, x ** 2 - n = (n_root ** 2 - n) + 2 * n_root * k + k ** 2
+    # and each term is non-negative, so floats are accurate enough for a log
+    k = np.arange(start - n_root, start - n_root + length, dtype=np.float64)
+    sizes = np.log2(np.maximum(float(n_root * n_root - n) + 2.0 * float(n_root) * k + k * k, 1.0))
+    return np.flatnonzero(logs >= sizes - slack)
+
+
+def bSmoothSieve(primes, n, count, slack=None):
+    # type: (List[prime], greater_than_one, greater_than_one, Optional[float]) -> Tuple[List[greater_than_one], List[greater_than_one]]
+    """A real sieve, unlike bSmoothList. Given an int, n, finds the x in
+    [ceil(sqrt(n)), ceil(sqrt(n)) + count] where x ** 2 - n is B-smooth, by
+    accumulating logs of the factor base over the interval, and only trial
+    dividing the x where the logs nearly add up. Returns the x and x ** 2 - n
+    values just like bSmoothList."""
+    n_root = intSqrt(n)
+    # This ensures we take the ceiling of the sqrt
+    if n_root * n_root < n:
+        n_root += 1
+    if slack is None:
+        slack = SIEVE_SLACK * math.log(primes[-1], 2)
+    fb = factorBaseRoots(primes, n)
+
+    ints = []
+    squares = []
+    end = n_root + count + 1
+    for start in range(n_root, end, SIEVE_BLOCK):
+        length = min(SIEVE_BLOCK, end - start)
+        for offset in sieveBlock(fb, n, n_root, start, length, slack).tolist():
+            x = start + offset
+            square_mod_n = x * x - n
+            if square_mod_n < 1 or not isBSmooth(primes, square_mod_n):
+                continue
+            ints.append(x)
+            squares.append(square_mod_n)
+    return (ints, squares)
+
+
+# The number of `a` coefficients each SIQS pool task works through. Each `a`
+# gives 2 ** (s - 1) polynomials, where s is the number of primes in `a`.
+SIQS_A_PER_TASK = 4
+
+# The number of relations to collect beyond the size of the factor base
+SIQS_EXTRA_RELATIONS = 10
+
+# siqsChooseA picks `a` from at least this many combinations of primes when
+# the factor base is big enough
+SIQS_MIN_A_CHOICES = 1000
+
+# Large primes can be up to this many times the biggest prime in the factor
+# base. Values with a large prime have to get past the sieve threshold, so it
+# gets lowered by log2 of the largest allowed cofactor times this factor.
+LARGE_PRIME_MULT = 64
+LARGE_PRIME_SLACK = 0.15
+
+
+def largeFactors(rest, max_prime, large_limit, double_large):
+    # type: (positive, prime, nonnegative, bool) -> Optional[Tuple[prime, ...]]
+    """Given what's left of a value after dividing out the factor base,
+    returns the large primes it's made of. That's () if nothing is left, (p,)
+    for a single prime p <= large_limit, and (p, q) if double_large and it's
+    the product of two of them. Returns None when it's none of those."""
+    if rest == 1:
+        return ()
+    if rest <= large_limit:
+        # Nothing <= max_prime divides rest, and large_limit < max_prime ** 2
+        return (rest,)
+    if not double_large or rest > large_limit * large_limit:
+        return None
+    # A prime this big is no use, and rho only splits composites
+    if pow(2, rest - 1, rest) == 1:
+        return None
+    p = pollardsRho(rest, None)
+    if p is None:
+        return None
+    q = rest // p
+    if max(p, q) > large_limit:
+        return None
+    return (min(p, q), max(p, q))
+
+
+def siqsChooseA(primes, target, rng):
+    # type: (List[prime], float, random.Random) -> List[nonnegative]
+    """Picks indices into primes whose product is close to target. The
+    primes come from the middle of the factor base: small primes would make
+    the sieve worse, and big ones would need fewer of them, and so fewer
+    polynomials per `a`."""
+    lo = len(primes) // 3
+    hi = max(lo + 2, 2 * len(primes) // 3)
+    while True:
+        pool = list(range(max(lo, 1), min(hi, len(primes))))
+        assert len(pool) >= 2, "factor base is too small for SIQS"
+        typical = math.log(primes[pool[len(pool) // 2]])
+        s = max(1, min(len(pool) - 1, int(round(math.log(target) / typical))))
+        # Each `a` always gives the same relations, so small factor bases
+        # need smaller primes in `a`, and more of them, to have enough
+        choices = 1
+        for i in range(s - 1):
+            choices = choices * (len(pool) - i) // (i + 1)
+        if choices >= SIQS_MIN_A_CHOICES or lo <= 1:
+            break
+        lo //= 2
+    best = None  # type: Optional[Tuple[float, List[nonnegative]]]
+    for _ in range(30):
+        chosen = rng.sample(pool, s - 1) if s > 1 else []
+        product = 1
+        for i in chosen:
+            product *= primes[i]
+        # Pick the last prime so that the product lands near the target
+        remaining = target / product
+        last = min(
+            (i for i in pool if i not in chosen),
+            key=lambda i: abs(math.log(primes[i]) - math.log(remaining))
+        )
+        error = abs(math.log(product * primes[last]) - math.log(target))
+        if best is None or error < best[0]:
+            best = (error, sorted(chosen + [last]))
+    assert best is not None
+    return best[1]
+
+
+def siqsChunk(tup):
+    # type: (Tuple[greater_than_one, List[prime], List[nonnegative], positive, float, positive, nonnegative, nonnegative, bool]) -> Tuple[List[int], List[int], List[Tuple[prime, ...]], nonnegative]
+    """Sieves every polynomial for `num_a` random choices of `a`, and returns
+    (ints, squares, large primes, number of polynomials) where ints[i] ** 2 -
+    n == squares[i] and squares[i] is smooth over primes, possibly negative,
+    except for the large primes found by largeFactors.
+
+    For a == q_1 * .. * q_s, b ** 2 == n mod a and c == (b ** 2 - n) / a, the
+    polynomial (a * x + b) ** 2 - n == a * (a * x ** 2 + 2 * b * x + c) is
+    sieved for x in [-M, M). The right hand side is about M * sqrt(n / 2),
+    much smaller than x ** 2 - n gets when x only counts up from sqrt(n). There
+    are 2 ** (s - 1) choices of b for each a, and switching between them only
+    takes an addition per prime, rather than recomputing the roots."""
+    n, primes, roots, half_width, slack, num_a, seed, large_limit, double_large = tup
+    rng = random.Random(seed)
+    p_arr = np.array(primes, dtype=np.int64)
+    logs = np.array([int(round(math.log(p, 2))) for p in primes], dtype=np.uint8)
+    target = math.sqrt(2 * n) / half_width
+    threshold = max(0, int(math.log(half_width * math.sqrt(n / 2), 2) - slack))
+
+    ints = []  # type: List[int]
+    squares = []  # type: List[int]
+    larges = []  # type: List[Tuple[prime, ...]]
+    num_polys = 0
+    for _ in range(num_a):
+        a_indices = siqsChooseA(primes, target, rng)
+        a = 1
+        for i in a_indices:
+            a *= primes[i]
+        # B[j] is 0 mod every q but q_j, and its square is n mod q_j, so any
+        # sum of +/- B[j] is a square root of n mod a
+        B = []
+        for i in a_indices:
+            q = primes[i]
+            a_q = a // q
+            gamma = roots[i] * pow(a_q, q - 2, q) % q
+            if gamma > q // 2:
+                gamma = q - gamma
+            B.append(a_q * gamma)
+        b = sum(B)
+
+        in_a = np.zeros(len(primes), dtype=np.bool_)
+        in_a[a_indices] = True
+        # Roots of the polynomial mod p are x == (+/-t - b) / a
+        a_inv = np.array([
+            0 if in_a[i] else pow(a % p, p - 2, p) for i, p in enumerate(primes)
+        ], dtype=np.int64)
+        t_arr = np.array(roots, dtype=np.int64)
+        b_mod = np.array([b % p for p in primes], dtype=np.int64)
+        soln1 = a_inv * ((t_arr - b_mod) % p_arr) % p_arr
+        soln2 = a_inv * ((-t_arr - b_mod) % p_arr) % p_arr
+        B_ainv2 = [
+            2 * np.array([B_j % p for p in primes], dtype=np.int64) * a_inv % p_arr
+            for B_j in B
+        ]
+        sieve_primes = [
+            i for i in range(len(primes)) if not in_a[i]
+        ]
+
+        for poly in range(2 ** (len(B) - 1)):
+            if poly > 0:
+                # Gray code order, so only one B changes sign each time
+                v = (poly & -poly).bit_length() - 1
+                sign = -1 if ((poly >> v) + 1) // 2 % 2 == 1 else 1
+                b += 2 * sign * B[v]
+                soln1 = (soln1 - sign * B_ainv2[v]) % p_arr
+                soln2 = (soln2 - sign * B_ainv2[v]) % p_arr
+            num_polys += 1
+
+            sieve = np.zeros(2 * half_width, dtype=np.uint8)
+            starts1 = ((soln1 + half_width) % p_arr).tolist()
+            starts2 = ((soln2 + half_width) % p_arr).tolist()
+            for i in sieve_primes:
+                p = primes[i]
+                sieve[starts1[i]::p] += logs[i]
+                if starts2[i] != starts1[i]:
+                    sieve[starts2[i]::p] += logs[i]
+
+            for j in np.flatnonzero(sieve >= threshold).tolist():
+                x = j - half_width
+                u = a * x + b
+                value = (u * u - n) // a
+                if value == 0:
+                    continue
+                # Only the primes whose roots line up with x can divide it
+                divides = ((x - soln1) % p_arr == 0) | ((x - soln2) % p_arr == 0) | in_a
+                rest = abs(value)
+                for p in p_arr[divides].tolist():
+                    while rest % p == 0:
+                        rest //= p
+                large = largeFactors(rest, primes[-1], large_limit, double_large)
+                if large is None:
+                    continue
+                ints.append(u)
+                squares.append(u * u - n)
+                larges.append(large)
+    return (ints, squares, larges, num_polys)
+
+
+def siqsRelations(primes, n, half_width, num_cores=None, verbosity=0, large_primes=0, relation_file=None, sieve_slack=SIEVE_SLACK, deadline=None):
+    # type: (List[prime], greater_than_one, positive, Optional[positive], nonnegative, nonnegative, Optional[str], float, Optional[float]) -> Tuple[List[int], List[int]]
+    """Collects relations with the self-initializing quadratic sieve until
+    there are more than there are primes (plus -1) in the factor base.
+    Returns (ints, squares) like bSmoothList, except squares can be negative.
+
+    With large_primes 1 or 2, relations with that many large primes are kept
+    too, and combined into full relations by a RelationStore. Then squares[i]
+    is only ints[i] ** 2 mod n. If relation_file is given, relations are
+    saved there as they're found, and loaded from it to resume a run.
+    sieve_slack is in multiples of log2 of the largest prime, like
+    SIEVE_SLACK. If time.time() passes deadline, this stops early and
+    returns however many relations it has."""
+    assert large_primes in (0, 1, 2), "type violation, expected 0, 1 or 2 large primes"
+    if num_cores is None:
+        num_cores = multiprocessing.cpu_count()
+    roots = [fb_roots[0] for _p, fb_roots, _log in factorBaseRoots(primes, n)]
+    slack = sieve_slack * math.log(primes[-1], 2)
+    large_limit = 0
+    if large_primes > 0:
+        # Any cofactor below primes[-1] ** 2 has to be prime
+        large_limit = min(LARGE_PRIME_MULT * primes[-1], primes[-1] ** 2 - 1)
+        slack += LARGE_PRIME_SLACK * large_primes * math.log(large_limit, 2)
+    needed = len(primes) + 1 + SIQS_EXTRA_RELATIONS
+    store = RelationStore(n, relation_file)
+    # A resumed run shouldn't repeat the polynomials it already sieved
+    seeds = random.Random("%d/%d" % (n, len(store.seen)))
+    if verbosity > 0 and len(store.seen) > 0:
+        print("Loaded %d relations, %d full" % (len(store.seen), len(store)))
+
+    num_polys = 0
+    pool = multiprocessing.Pool(num_cores) if num_cores > 1 else None
+    try:
+        while len(store) < needed:
+            if deadline is not None and time.time() > deadline:
+                break
+            tasks = [
+                (n, primes, roots, half_width, slack, SIQS_A_PER_TASK,
+                 seeds.getrandbits(32), large_limit, large_primes == 2)
+                for _ in range(num_cores)
+            ]
+            results = pool.map(siqsChunk, tasks) if pool is not None else map(siqsChunk, tasks)
+            for chunk_ints, chunk_squares, chunk_larges, chunk_polys in results:
+                num_polys += chunk_polys
+                # The same relation can come from more than one polynomial,
+                # which the store ignores
+                for u, square, large in zip(chunk_ints, chunk_squares, chunk_larges):
+                    store.add(u, square, large)
+            if verbosity > 0:
+                print("Found %d of %d relations after %d polynomials (%d from %d partials)" % (
+                    len(store), needed, num_polys, len(store.combined), store.numPartials()))
+    finally:
+        store.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    ints, squares = store.relations()
+    return (ints[:needed], squares[:needed])
+
+
+# B is this times L(n) ** (1 / 2), where L(n) = exp(sqrt(ln n * ln ln n)). The
+# usual analysis says B should grow like L(n) ** (1 / 2), and the constant
+# comes from running qs_benchmark.py with a few different values.
+TUNE_B_SCALE = 1.0
+TUNE_MIN_B = 300
+
+# The sieve interval for each polynomial is 2 * half_width, where half_width
+# is about B / 2 but kept within these bounds
+TUNE_MIN_HALF_WIDTH = 1 << 12
+TUNE_MAX_HALF_WIDTH = 1 << 16
+
+# Numbers with at least this many digits use single large primes
+TUNE_LARGE_PRIME_DIGITS = 40
+
+
+def lComplexity(n, c=1.0):
+    # type: (greater_than_one, float) -> float
+    """Returns L(n) ** c, where L(n) = exp(sqrt(ln n * ln ln n))"""
+    ln_n = math.log(n)
+    return math.exp(c * math.sqrt(ln_n * math.log(ln_n)))
+
+
+def tuneParameters(n, b_scale=TUNE_B_SCALE):
+    # type: (greater_than_one, float) -> Dict[str, Any]
+    """Picks the smoothness bound, sieve interval and thresholds for
+    factoring n, based only on its size. Returns keyword arguments for
+    quadraticSieve."""
+    assert n > 1, "type violation, expected n > 1"
+    B = max(TUNE_MIN_B, int(b_scale * lComplexity(n, 0.5)))
+    # About half the primes up to B are quadratic residues
+    fb_size = max(1.0, B / math.log(B) / 2)
+    half_width = min(TUNE_MAX_HALF_WIDTH, max(TUNE_MIN_HALF_WIDTH, B // 2))
+    return {
+        "interval_mult": max(1, int(round(2 * half_width / fb_size))),
+        "max_prime": B,
+        "mode": "siqs",
+        "large_primes": 1 if len(str(n)) >= TUNE_LARGE_PRIME_DIGITS else 0,
+        "sieve_slack": SIEVE_SLACK,
+    }
+
+
+# Each square product has about a one in two chance of splitting n, so there's
+# no need to build every one of them when there are many more ints than primes
+MAX_SOLUTIONS = 32
+
+
+def quadraticSieve(n, interval_mult=2, max_prime=229, verbosity=0, mode="qs", num_cores=None, large_primes=0, relation_file=None, sieve_slack=SIEVE_SLACK, stats=None, deadline=None):
+    # type: (greater_than_one, nonnegative, greater_than_one, nonnegative, str, Optional[positive], nonnegative, Optional[str], float, Optional[Dict[str, Any]], Optional[float]) -> Dict[maybe_prime, greater_than_zero]
+    """Factors n into two divisors. With mode "qs", sieves x ** 2 - n for the
+    interval_mult * len(primes) values of x above sqrt(n). With mode "siqs",
+    sieves many polynomials, each over interval_mult * len(primes) values of
+    x, until there are enough relations. large_primes, relation_file and
+    deadline only apply to siqs, see siqsRelations. Returns {} if the
+    deadline passes before there are enough relations. tuneParameters picks
+    the arguments from the size of n.
+
+    If stats is a dict, the seconds spent in each phase and the sizes of
+    things along the way are written to it."""
+    if stats is None:
+        stats = {}
     assert n > 1, "type violation, expected n > 1"
     assert interval_mult > 0, "type violation, expected interval_mult > 0"
-    # 1. choose smoothness bound B
-    # TODO how do we pick B?
+    assert mode in ("qs", "siqs"), "mode must be qs or siqs"
+    assert mode == "siqs" or (large_primes == 0 and relation_file is None and deadline is None), \
+        "large primes, relation files and deadlines need siqs"
+    # 1. choose smoothness bound B, see tuneParameters
     B = max_prime
     # `primes` here is commonly referred to as a "factor_base" in other
     # implementations of the quadratic sieve
+    start = time.time()
     primes = [p for p in slowPrimes(B) if isQuadraticResidue(p, n)]
+    stats["factor_base_seconds"] = time.time() - start
+    stats["factor_base_size"] = len(primes)
     if verbosity > 0:
         print(
             "Found %d primes that are quadratic residues and less than or equal to %d, max"
@@ -425,8 +1137,23 @@ def quadraticSieve(n, interval_mult=2, max_prime=229, verbosity=0):
         print("Primes: %s" % (str(primes)))
 
     # 2. find numbers that are B smooth
-    # TODO how do we pick the threshold for bSmoothSieve?
-    ints, squares = bSmoothList(primes, n, interval_mult * len(primes))
+    start = time.time()
+    if mode == "siqs":
+        # n mod 2 is always 1 for odd n, so -1 is the only sign that matters
+        half_width = max(1, interval_mult * len(primes) // 2)
+        ints, squares = siqsRelations(
+            primes, n, half_width, num_cores, verbosity, large_primes,
+            relation_file, sieve_slack, deadline
+        )
+        if len(squares) < len(primes) + 1 + SIQS_EXTRA_RELATIONS:
+            # Ran out of time
+            return {}
+    else:
+        ints, squares = bSmoothSieve(
+            primes, n, interval_mult * len(primes), sieve_slack * math.log(primes[-1], 2)
+        )
+    stats["sieve_seconds"] = time.time() - start
+    stats["relations"] = len(squares)
     if verbosity > 0:
         n_root = intSqrt(n)
         print(
@@ -438,33 +1165,48 @@ def quadraticSieve(n, interval_mult=2, max_prime=229, verbosity=0):
 
     # 3. factor numbers and generate exponent vectors
     # 4. apply some linear algebra
-    indices, products = findSquareProduct(primes, squares)
+    start = time.time()
+    indices, products = findSquareProduct(primes, squares, MAX_SOLUTIONS)
+    stats["linear_algebra_seconds"] = time.time() - start
+    stats["solutions"] = len(products)
     if verbosity > 0:
         print("Found %d solutions to the mod-2 matrix" % (len(products)))
 
+    start = time.time()
     for i, product in enumerate(products):
+        stats["solutions_tried"] = i + 1
         used_ints = None  # type: Optional[List[nonnegative]]
         if verbosity > 2:
             used_ints = []
             print("Checking gcd of %d" % (product))
         # TODO move this computation to findSquareProduct
         a = 1
+        exponents = {}  # type: Dict[int, nonnegative]
         for j, bit in enumerate(indices[i]):
             if bit == 0:
                 continue
-            a *= ints[j]
+            a = (a * ints[j]) % n
+            _factored, factors = signedFactors(squares[j], primes)
+            for p in factors:
+                exponents[p] = exponents.get(p, 0) + factors[p]
             if used_ints is not None:
                 used_ints.append(ints[j])
         if used_ints is not None:
             print("Used ints: %s" % (str(used_ints)))
-        product_root = intSqrt(product)
+        # Taking the square root of the product from its factors is much
+        # cheaper than intSqrt once there are hundreds of ints in a product
+        product_root = 1
+        for p in exponents:
+            if p == -1:
+                continue
+            product_root = (product_root * pow(p, exponents[p] // 2, n)) % n
         # 5. now we have a ** 2 mod n == b ** 2 mod n
-        # TODO should this be max(..) - min(..)?
-        divisor = gcd(a - product_root, n)
+        divisor = gcd((a - product_root) % n, n)
+        stats["square_root_seconds"] = time.time() - start
         if divisor == 1 or divisor == n:
             continue
         # equivalent to `other_divisor = n // divisor`
-        other_divisor = gcd(a + product_root, n)
+        other_divisor = gcd((a + product_root) % n, n)
         # 6. now we have (x - y) * (x + y) mod n == 0
         if verbosity > 2:
             x = (divisor + other_divisor) / 2
@@ -494,6 +1236,23 @@ def main():
         + "max prime number to use for deriving B-smoothness. 229 is the "
         + "50th prime, and 541 is the 100th.",
     )
+    parser.add_argument(
+        "--mode",
+        choices=["qs", "siqs"],
+        default="qs",
+        help="qs sieves the single polynomial x ** 2 - n, and siqs sieves"
+        + " many polynomials in parallel. Defaults to qs",
+    )
+    parser.add_argument("--cores", type=int, help="The number of processes "
+        + "for siqs. Defaults to the number of CPUs")
+    parser.add_argument("--large_primes", type=int, choices=[0, 1, 2], default=0,
+        help="Also keep siqs relations with up to this many primes bigger than"
+        + " max_prime, and combine them into full relations")
+    parser.add_argument("--relations", help="A file to save siqs relations "
+        + "to as they're found. If it exists, the relations in it are loaded "
+        + "first, so an interrupted run can be resumed")
+    parser.add_argument("--tune", action="store_true", help="Ignore mult, "
+        + "max_prime, mode and large_primes, and pick them from the size of n")
     parser.add_argument("-v", "--verbose", default=0, action="count")
     args = parser.parse_args()
 
@@ -501,7 +1260,19 @@ def main():
     assert args.mult >= 1, "expected mult >= 1"
     assert args.max_prime >= 2, "expected max_prime >= 2"
 
-    print(quadraticSieve(args.n, args.mult, args.max_prime, args.verbose))
+    if args.tune:
+        params = tuneParameters(args.n)
+        if args.verbose > 0:
+            print("Tuned parameters: %s" % (str(params)))
+        print(quadraticSieve(
+            args.n, verbosity=args.verbose, num_cores=args.cores,
+            relation_file=args.relations, **params
+        ))
+        return
+    print(quadraticSieve(
+        args.n, args.mult, args.max_prime, args.verbose, args.mode, args.cores,
+        args.large_primes, args.relations
+    ))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+# relations.py
+# Trevor Pottinger
+# Sun Oct 18 16:20:11 PDT 2026
+
+"""Keeps the relations a quadratic sieve finds, u ** 2 == value mod n, where
+value factors over the factor base, except for up to two large primes.
+
+Partial relations, the ones with large primes, are edges in a graph whose
+vertices are the large primes, plus 1 for relations with a single large
+prime. Any cycle in the graph is a set of relations where each large prime
+shows up an even number of times, so their product is a full relation. A
+union-find over the vertices says when a new edge closes a cycle, and the
+cycle itself comes from a walk through a spanning forest of the edges.
+
+Every relation is appended to a file as it's added, so a run that gets
+interrupted can load the file and carry on where it left off. Only the raw
+relations are saved; the cycles get found again while loading."""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+
+if sys.version_info >= (3, 3):
+    from typing import Dict, List, Optional, Set, Tuple
+
+    greater_than_one = int
+    nonnegative = int
+    prime = int
+    # (u, value, large primes) where u ** 2 == value mod n
+    relation = Tuple[int, int, Tuple[prime, ...]]
+
+
+def modInverse(a, n):
+    # type: (int, greater_than_one) -> nonnegative
+    """Returns x such that a * x == 1 mod n, via the extended Euclidean
+    algorithm. a and n must be coprime."""
+    old_r, r = a % n, n
+    old_s, s = 1, 0
+    while r != 0:
+        q = old_r // r
+        old_r, r = r, old_r - q * r
+        old_s, s = s, old_s - q * s
+    assert old_r == 1, "%d has no inverse mod %d" % (a, n)
+    return old_s % n
+
+
+def combineRelations(n, cycle):
+    # type: (greater_than_one, List[relation]) -> Tuple[int, int]
+    """Multiplies the relations in a cycle together. Each large prime shows
+    up an even number of times, so its square comes out of the value, and
+    it's divided out of u too. Returns (u, value) with u ** 2 == value mod n
+    and value smooth over the factor base."""
+    u = 1
+    value = 1
+    counts = {}  # type: Dict[prime, nonnegative]
+    for u_i, value_i, large in cycle:
+        u = (u * u_i) % n
+        value *= value_i
+        for q in large:
+            counts[q] = counts.get(q, 0) + 1
+    root = 1
+    for q in counts:
+        assert counts[q] % 2 == 0, "%d is in the cycle an odd number of times" % q
+        root *= q ** (counts[q] // 2)
+    assert value % (root * root) == 0, "the large primes must divide the value"
+    return ((u * modInverse(root, n)) % n, value // (root * root))
+
+
+def formatRelation(rel):
+    # type: (relation) -> str
+    u, value, large = rel
+    large_str = ",".join(map(str, large)) if len(large) > 0 else "1"
+    return "%s\t%d\t%d\n" % (large_str, u, value)
+
+
+def parseRelation(line):
+    # type: (str) -> Optional[relation]
+    """The inverse of formatRelation. Returns None for a line that didn't
+    get written completely, like when a run is killed mid write."""
+    if not line.endswith("\n"):
+        return None
+    cols = line.rstrip("\n").split("\t")
+    if len(cols) != 3:
+        return None
+    large = () if cols[0] == "1" else tuple(int(q) for q in cols[0].split(","))
+    return (int(cols[1]), int(cols[2]), large)
+
+
+class RelationStore(object):
+    """The full and partial relations found so far for factoring n. If path
+    is given, relations already in it are loaded, and new ones are appended
+    to it as they are added."""
+
+    def __init__(self, n, path=None):
+        # type: (greater_than_one, Optional[str]) -> None
+        self.n = n
+        self.full = []  # type: List[Tuple[int, int]]
+        self.combined = []  # type: List[Tuple[int, int]]
+        # Partial relations, keyed by their large primes
+        self.partials = {}  # type: Dict[Tuple[prime, ...], List[relation]]
+        self.seen = set()  # type: Set[int]
+        # Union-find and spanning forest over the large prime graph
+        self.parent = {}  # type: Dict[prime, prime]
+        self.forest = {}  # type: Dict[prime, List[Tuple[prime, relation]]]
+        self.out = None
+        if path is None:
+            return
+        if os.path.exists(path):
+            self.load(path)
+        else:
+            with open(path, "w") as f:
+                f.write("n\t%d\n" % n)
+        self.out = open(path, "a")
+
+    def load(self, path):
+        # type: (str) -> None
+        """Adds the relations from a file written by a previous store, and
+        truncates anything after the last complete line so that appending
+        to it starts on a new line"""
+        with open(path) as f:
+            header = f.readline()
+            if header != "n\t%d\n" % self.n:
+                raise Exception("%s doesn't have relations for %d" % (path, self.n))
+            complete = len(header)
+            for line in f:
+                rel = parseRelation(line)
+                if rel is None:
+                    break
+                complete += len(line)
+                if abs(rel[0]) in self.seen:
+                    continue
+                self.seen.add(abs(rel[0]))
+                self._add(rel)
+        if os.path.getsize(path) > complete:
+            with open(path, "r+") as f:
+                f.truncate(complete)
+
+    def close(self):
+        # type: () -> None
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    def __len__(self):
+        # type: () -> nonnegative
+        """The number of full relations, including the ones from cycles"""
+        return len(self.full) + len(self.combined)
+
+    def numPartials(self):
+        # type: () -> nonnegative
+        return sum(len(rels) for rels in self.partials.values())
+
+    def add(self, u, value, large=()):
+        # type: (int, int, Tuple[prime, ...]) -> nonnegative
+        """Adds the relation u ** 2 == value mod n, where large are the
+        primes in value that aren't in the factor base. Returns the number
+        of full relations this added, which is 0 or 1."""
+        if abs(u) in self.seen:
+            return 0
+        self.seen.add(abs(u))
+        rel = (u, value, tuple(sorted(large)))
+        if self.out is not None:
+            self.out.write(formatRelation(rel))
+            self.out.flush()
+        return self._add(rel)
+
+    def _add(self, rel):
+        # type: (relation) -> nonnegative
+        u, value, large = rel
+        if len(large) == 0:
+            self.full.append((u, value))
+            return 1
+        self.partials.setdefault(large, []).append(rel)
+        a, b = (1, large[0]) if len(large) == 1 else large
+        root_a = self._find(a)
+        root_b = self._find(b)
+        if root_a != root_b:
+            self.parent[root_a] = root_b
+            self.forest.setdefault(a, []).append((b, rel))
+            self.forest.setdefault(b, []).append((a, rel))
+            return 0
+        self.combined.append(combineRelations(self.n, self._path(a, b) + [rel]))
+        return 1
+
+    def _find(self, vertex):
+        # type: (prime) -> prime
+        root = vertex
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        # Path compression, so later finds are quicker
+        while vertex != root:
+            self.parent[vertex], vertex = root, self.parent[vertex]
+        return root
+
+    def _path(self, a, b):
+        # type: (prime, prime) -> List[relation]
+        """Returns the relations on the path from a to b in the forest"""
+        prev = {a: None}  # type: Dict[prime, Optional[Tuple[prime, relation]]]
+        frontier = [a]
+        while b not in prev:
+            vertex = frontier.pop()
+            for other, rel in self.forest.get(vertex, []):
+                if other not in prev:
+                    prev[other] = (vertex, rel)
+                    frontier.append(other)
+        path = []  # type: List[relation]
+        step = prev[b]
+        while step is not None:
+            vertex, rel = step
+            path.append(rel)
+            step = prev[vertex]
+        return path
+
+    def relations(self):
+        # type: () -> Tuple[List[int], List[int]]
+        """Returns (ints, squares) like siqsRelations, where ints[i] ** 2 ==
+        squares[i] mod n. The full relations come first, by abs(u)."""
+        rels = sorted(self.full, key=lambda rel: abs(rel[0])) + self.combined
+        return ([u for u, _value in rels], [value for _u, value in rels])
@@ -3,6 +3,7 @@
 from __future__ import print_function
  
 import sys
+from collections import OrderedDict
 from itertools import islice, cycle, count
  
 try:
@@ -11,17 +12,102 @@ except ImportError:
     def compress(data, selectors):
         """compress('ABCDEF', [1,0,1,0,1,1]) --> A C E F"""
         return (d for d, s in zip(data, selectors) if s)
+
+# gen_big.py doesn't need numpy
+from gen_big import isMersennePrime
+
+try:
+    import numpy as np
+    from factor import factor
+    from gen_big import isPrime
+    from sieve import basePrimes, intSqrt, sieveSegment
+except ImportError:
+    # factor.py and sieve.py need numpy, so fall back to trial division by
+    # croft(), and to croft() for every prime
+    factor = None
+    isPrime = None
+    sieveSegment = None
+
+# primes() switches from croft() to the segmented sieve here. croft() keeps a
+# dict entry for every prime it has yielded, about 80K entries by 2 ** 20.
+CROFT_LIMIT = 1 << 20
+# The number of odd numbers per segment, for primes() and IsPrimeCached. The
+# packed bitmap for one is 4KB.
+SEGMENT_ODDS = 1 << 15
+
+# IsPrimeCached keeps this many answers, and this many segment bitmaps for the
+# numbers below CACHE_SIEVE_LIMIT
+CACHE_SIZE = 1 << 16
+CACHE_SEGMENTS = 64
+CACHE_SIEVE_LIMIT = 1 << 40
  
  
 def is_prime(n):
+    if isPrime is not None:
+        return n > 1 and isPrime(n)
     return list(zip((True, False), decompose(n)))[-1][0]
- 
-class IsPrimeCached(dict):
-    def __missing__(self, n):
-        r = is_prime(n)
-        self[n] = r
-        return r
- 
+
+
+_base_primes = []
+
+
+def base_primes(n):
+    """Returns an array with at least the primes up to n. It's kept between
+    calls and grows by doubling, so it's only ever about sqrt of the biggest
+    number sieved."""
+    if len(_base_primes) == 0 or _base_primes[0][0] < n:
+        limit = max(n, 2 * _base_primes[0][0] if _base_primes else 1024)
+        _base_primes[:] = [(limit, basePrimes(limit))]
+    return _base_primes[0][1]
+
+
+class IsPrimeCached(object):
+    """is_prime with bounded memory. Numbers below CACHE_SIEVE_LIMIT are
+    answered from the packed bitmap of the segment they're in, sieving it
+    first if it isn't one of the last max_segments used. Other numbers go
+    through is_prime, and the last maxsize answers are kept."""
+
+    def __init__(self, maxsize=CACHE_SIZE, max_segments=CACHE_SEGMENTS):
+        self.maxsize = maxsize
+        self.max_segments = max_segments
+        self.answers = OrderedDict()
+        self.segments = OrderedDict()
+
+    def __len__(self):
+        return len(self.answers) + len(self.segments)
+
+    def __getitem__(self, n):
+        if n < 3 or n % 2 == 0:
+            return n == 2
+        if sieveSegment is not None and n < CACHE_SIEVE_LIMIT:
+            i = n // 2
+            bits = self._segment(i // SEGMENT_ODDS)
+            i %= SEGMENT_ODDS
+            return bool((bits[i >> 3] >> (i & 7)) & 1)
+        return self._lookup(self.answers, n, self.maxsize, is_prime)
+
+    def _segment(self, k):
+        def sieve(k):
+            lo = 2 * k * SEGMENT_ODDS + 1
+            hi = lo + 2 * SEGMENT_ODDS
+            sieved = sieveSegment(lo, SEGMENT_ODDS, base_primes(intSqrt(hi)))
+            return np.packbits(sieved, bitorder='little')
+        return self._lookup(self.segments, k, self.max_segments, sieve)
+
+    @staticmethod
+    def _lookup(cache, key, maxsize, compute):
+        """Least recently used lookup, popping and reinserting so that the
+        most recent keys are always at the end"""
+        if key in cache:
+            value = cache.pop(key)
+        else:
+            value = compute(key)
+            if len(cache) >= maxsize:
+                cache.popitem(last=False)
+        cache[key] = value
+        return value
+
+
 is_prime_cached = IsPrimeCached()
  
 def croft():
@@ -60,9 +146,35 @@ def croft():
         else:
             roots[q*q] = q
             yield q
-primes = croft
+
+
+def primes(threshold=CROFT_LIMIT):
+    """Yields every prime, like croft(), but only takes them from croft()
+    below threshold. After that they come from the segmented sieve, one
+    segment at a time, which only needs the primes up to the square root of
+    the segment. So memory grows like sqrt(n) instead of n / log(n)."""
+    threshold = max(threshold, 3)
+    for p in croft():
+        if sieveSegment is not None and p >= threshold:
+            break
+        yield p
+    lo = threshold | 1
+    while True:
+        hi = lo + 2 * SEGMENT_ODDS
+        sieved = sieveSegment(lo, SEGMENT_ODDS, base_primes(intSqrt(hi)))
+        for p in (lo + 2 * np.flatnonzero(sieved)).tolist():
+            yield p
+        lo = hi
  
 def decompose(n):
+    if factor is not None:
+        # Shares the sieved trial division table between calls, and goes on
+        # to rho, ECM and the quadratic sieve for big factors
+        factors = factor(n)
+        for p in sorted(factors):
+            for _ in range(factors[p]):
+                yield p
+        return
     for p in primes():
         if p*p > n: break
         while n % p == 0:
@@ -81,9 +193,13 @@ def main():
         p = 2 ** m - 1
         print( "2**{0:d}-1 = {1:d}, with factors:".format(m, p) )
         start = time.time()
-        for factor in decompose(p):
-            print(factor, end=' ')
-            sys.stdout.flush()
+        if isMersennePrime(m):
+            # Lucas-Lehmer proves it without trying to factor it
+            print(p, end=' ')
+        else:
+            for factor in decompose(p):
+                print(factor, end=' ')
+                sys.stdout.flush()
  
         print( "=> {0:.2f}s".format( time.time()-start ) )
         if m >= 59:
@@ -0,0 +1,430 @@
+# sieve.py
+# Trevor Pottinger
+# Sun Oct 18 10:12:31 PDT 2026
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import math
+import multiprocessing
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+if sys.version_info >= (3, 3):
+    from typing import Iterator, List, Optional, Tuple
+
+    nonnegative = int
+    positive = int
+    prime = int
+
+
+# The number of odd numbers covered by one segment. One byte per odd while
+# sieving, so 2 ** 18 is 256KB which fits comfortably in most L2 caches. The
+# packed representation is an eighth of that.
+SEGMENT_ODDS = 1 << 18
+
+# The number of segments each pool task sieves. Bigger tasks mean less
+# pickling overhead between processes, smaller tasks balance better.
+SEGMENTS_PER_TASK = 16
+
+# Offsets are stored in int64, so keep some headroom for `p * p` and friends
+MAX_SIEVE = 1 << 62
+
+# The default wheel for the wheel sieve. Only 5760 of every 30030 numbers are
+# coprime to it, so it stores 19% of the numbers where the odds are 50%.
+WHEEL_PRIMES = [2, 3, 5, 7, 11, 13]
+
+# The number of wheel candidates per segment, 4MB of bools. Crossing off is a
+# numpy scatter per prime, so the segments are bigger than SEGMENT_ODDS to
+# spread out the per call overhead.
+WHEEL_SEGMENT_CANDIDATES = 1 << 22
+
+# 2 through 23 has ~37M residues. Through 29 it'd be ~1B, which is 8GB.
+MAX_WHEEL_RESIDUES = 1 << 26
+
+
+def intSqrt(n):
+    # type: (nonnegative) -> nonnegative
+    """Returns the square root of n, rounded down"""
+    assert n >= 0, "type violation, expected n >= 0"
+    if n == 0:
+        return 0
+    root = int(math.sqrt(n))
+    # Floats lose precision past 2 ** 52, so nudge the estimate into place
+    while root * root > n:
+        root -= 1
+    while (root + 1) * (root + 1) <= n:
+        root += 1
+    return root
+
+
+def basePrimes(n):
+    # type: (nonnegative) -> np.ndarray
+    """Returns all primes less than or equal to n as an int64 array. This is a
+    plain, non-segmented sieve over the odd numbers, so only use it for n up
+    to ~10 ** 9. It's meant for the primes up to sqrt(hi) that the segmented
+    sieve then crosses off with."""
+    if n < 2:
+        return np.zeros(0, dtype=np.int64)
+    # index i represents the odd number 2 * i + 1
+    is_odd_prime = np.ones((n + 1) // 2, dtype=np.bool_)
+    is_odd_prime[0] = False  # 1 is not prime
+    for i in range(1, (intSqrt(n) + 1) // 2):
+        if not is_odd_prime[i]:
+            continue
+        p = 2 * i + 1
+        is_odd_prime[(p * p) // 2::p] = False
+    odds = 2 * np.flatnonzero(is_odd_prime).astype(np.int64) + 1
+    return np.concatenate([np.array([2], dtype=np.int64), odds])
+
+
+def sieveSegment(lo, n_odds, base_primes):
+    # type: (nonnegative, positive, np.ndarray) -> np.ndarray
+    """Returns a boolean array where index i says whether `lo + 2 * i` is
+    prime. `lo` must be odd, and `base_primes` must include every prime up to
+    the square root of the last number in the segment. 2 is never included
+    since it isn't odd."""
+    assert lo % 2 == 1, "type violation, expected lo to be odd"
+    assert n_odds > 0, "type violation, expected n_odds > 0"
+    hi = lo + 2 * n_odds
+    assert hi <= MAX_SIEVE, "segment is beyond what int64 offsets can handle"
+    is_prime = np.ones(n_odds, dtype=np.bool_)
+    if lo == 1:
+        is_prime[0] = False
+
+    odd_primes = base_primes[1:] if len(base_primes) > 0 and base_primes[0] == 2 else base_primes
+    # Only primes whose square lands before hi can cross anything off
+    odd_primes = odd_primes[:np.searchsorted(odd_primes, intSqrt(hi - 1), side="right")]
+    if len(odd_primes) == 0:
+        return is_prime
+
+    # Vectorize finding each prime's first odd multiple in the segment, that
+    # is also at least p ** 2 so that we don't cross off the prime itself.
+    starts = np.maximum(odd_primes * odd_primes, ((lo + odd_primes - 1) // odd_primes) * odd_primes)
+    starts += (starts % 2 == 0) * odd_primes
+    offsets = (starts - lo) // 2
+    for p, offset in zip(odd_primes.tolist(), offsets.tolist()):
+        if offset < n_odds:
+            is_prime[offset::p] = False
+    return is_prime
+
+
+def segmentBounds(lo, hi, segment_odds=SEGMENT_ODDS):
+    # type: (nonnegative, nonnegative, positive) -> Iterator[Tuple[nonnegative, positive]]
+    """Yields (odd start, number of odds) pairs that cover the odd numbers in
+    [lo, hi), in increasing order"""
+    assert segment_odds > 0, "type violation, expected segment_odds > 0"
+    start = lo | 1
+    while start < hi:
+        n_odds = min(segment_odds, (hi - start + 1) // 2)
+        yield (start, n_odds)
+        start += 2 * n_odds
+
+
+def packedSegments(lo, hi, segment_odds=SEGMENT_ODDS, base_primes=None):
+    # type: (nonnegative, nonnegative, positive, Optional[np.ndarray]) -> Iterator[Tuple[nonnegative, positive, np.ndarray]]
+    """Yields (odd start, number of odds, bit array) for each segment in
+    [lo, hi). Bit i (little endian, within np.packbits) is set when
+    `start + 2 * i` is prime. Memory is bounded by the segment size and the
+    base primes, which are about sqrt(hi) / log(sqrt(hi)) int64s."""
+    assert 0 <= lo, "type violation, expected lo >= 0"
+    assert hi <= MAX_SIEVE, "hi is beyond what int64 offsets can handle"
+    if base_primes is None:
+        base_primes = basePrimes(intSqrt(max(hi - 1, 0)))
+    for start, n_odds in segmentBounds(lo, hi, segment_odds):
+        is_prime = sieveSegment(start, n_odds, base_primes)
+        yield (start, n_odds, np.packbits(is_prime, bitorder="little"))
+
+
+def unpackSegment(start, n_odds, bits):
+    # type: (nonnegative, positive, np.ndarray) -> np.ndarray
+    """Converts one of the packedSegments back into an array of primes"""
+    is_prime = np.unpackbits(bits, count=n_odds, bitorder="little")
+    return start + 2 * np.flatnonzero(is_prime).astype(np.int64)
+
+
+def primeSegments(lo, hi, segment_odds=SEGMENT_ODDS, base_primes=None):
+    # type: (nonnegative, nonnegative, positive, Optional[np.ndarray]) -> Iterator[np.ndarray]
+    """Yields int64 arrays of the primes in [lo, hi), one per segment. The
+    arrays are in order, so concatenating them gives every prime in range."""
+    assert 0 <= lo, "type violation, expected lo >= 0"
+    assert hi <= MAX_SIEVE, "hi is beyond what int64 offsets can handle"
+    if lo <= 2 < hi:
+        yield np.array([2], dtype=np.int64)
+    if base_primes is None:
+        base_primes = basePrimes(intSqrt(max(hi - 1, 0)))
+    for start, n_odds in segmentBounds(lo, hi, segment_odds):
+        is_prime = sieveSegment(start, n_odds, base_primes)
+        yield start + 2 * np.flatnonzero(is_prime).astype(np.int64)
+
+
+def iterPrimes(lo, hi, segment_odds=SEGMENT_ODDS):
+    # type: (nonnegative, nonnegative, positive) -> Iterator[prime]
+    """Yields each prime in [lo, hi) as a python int"""
+    for chunk in primeSegments(lo, hi, segment_odds):
+        for p in chunk.tolist():
+            yield p
+
+
+def sievePrimes(max_num, plus_one=False):
+    # type: (nonnegative, bool) -> List[prime]
+    """Same contract as easy_primes.getPrimes: returns the primes less than or
+    equal to max_num, and optionally the next prime after that too."""
+    primes = []  # type: List[prime]
+    for chunk in primeSegments(0, max_num + 1):
+        primes.extend(chunk.tolist())
+    if plus_one:
+        primes.append(firstPrimeFrom(max_num + 1))
+    return primes
+
+
+def wheelResidues(wheel_primes):
+    # type: (List[prime]) -> Tuple[positive, np.ndarray]
+    """Returns (modulus, residues) where modulus is the product of
+    wheel_primes, and residues are the numbers in [0, modulus) coprime to it
+    as a sorted int64 array. They're built one prime at a time: the residues
+    mod M * p are r + k * M for each residue r mod M and 0 <= k < p, minus
+    the multiples of p. So only p * phi(M) numbers are ever looked at,
+    instead of all M * p of them."""
+    residues = np.zeros(1, dtype=np.int64)
+    modulus = 1
+    for p in wheel_primes:
+        assert len(residues) * (p - 1) <= MAX_WHEEL_RESIDUES, "wheel is too big"
+        # Row k is r + k * M, so flattening keeps them sorted
+        lifted = (np.arange(p, dtype=np.int64)[:, None] * modulus + residues).ravel()
+        residues = lifted[lifted % p != 0]
+        modulus *= p
+    return (modulus, residues)
+
+
+def wheelDeltas(wheel_primes):
+    # type: (List[prime]) -> Tuple[positive, np.ndarray]
+    """Returns (modulus, deltas) where deltas[i] is the gap from the ith
+    residue to the next as int32, and the last one wraps around from
+    modulus - 1 to modulus + 1. So starting at 1 and adding the deltas in a
+    cycle visits every number coprime to the wheel."""
+    modulus, residues = wheelResidues(wheel_primes)
+    deltas = np.diff(np.append(residues, modulus + residues[0])).astype(np.int32)
+    return (modulus, deltas)
+
+
+def wheelSieveSegment(lo_turn, turns, modulus, residues, rank, base_primes):
+    # type: (nonnegative, positive, positive, np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+    """Returns a boolean array where index t * len(residues) + i says whether
+    `(lo_turn + t) * modulus + residues[i]` is prime. rank maps each residue
+    back to its index. base_primes must have every prime up to the square
+    root of the end of the segment, except the ones in the wheel."""
+    phi = len(residues)
+    lo = lo_turn * modulus
+    hi = lo + turns * modulus
+    assert hi <= MAX_SIEVE, "segment is beyond what int64 offsets can handle"
+    is_prime = np.ones(turns * phi, dtype=np.bool_)
+    if lo_turn == 0:
+        # 1 is coprime to everything, but isn't prime
+        is_prime[0] = False
+    base_primes = base_primes[:np.searchsorted(base_primes, intSqrt(hi - 1), side="right")]
+    for p in base_primes.tolist():
+        # The multiples of p that are coprime to the wheel are p * q for q
+        # coprime to the wheel, and q starts at p so p itself is left alone
+        q_lo = max(p, (lo + p - 1) // p)
+        q_hi = (hi - 1) // p + 1
+        if q_lo >= q_hi:
+            continue
+        t_lo = q_lo // modulus
+        t_hi = (q_hi - 1) // modulus
+        if t_lo == t_hi:
+            base = t_lo * modulus
+            q = base + residues[np.searchsorted(residues, q_lo - base):np.searchsorted(residues, q_hi - base)]
+        else:
+            q = (np.arange(t_lo, t_hi + 1, dtype=np.int64)[:, None] * modulus + residues).ravel()
+            q = q[np.searchsorted(q, q_lo):np.searchsorted(q, q_hi)]
+        multiples = p * q
+        is_prime[(multiples // modulus - lo_turn) * phi + rank[multiples % modulus]] = False
+    return is_prime
+
+
+def wheelPrimeSegments(lo, hi, wheel_primes=None, segment_candidates=WHEEL_SEGMENT_CANDIDATES):
+    # type: (nonnegative, nonnegative, Optional[List[prime]], positive) -> Iterator[np.ndarray]
+    """Same as primeSegments, but each segment only stores the numbers
+    coprime to wheel_primes, which defaults to WHEEL_PRIMES"""
+    assert 0 <= lo, "type violation, expected lo >= 0"
+    assert hi <= MAX_SIEVE, "hi is beyond what int64 offsets can handle"
+    if wheel_primes is None:
+        wheel_primes = WHEEL_PRIMES
+    assert len(wheel_primes) > 0 and wheel_primes == basePrimes(wheel_primes[-1]).tolist(), \
+        "type violation, expected wheel_primes to be the first few primes"
+    in_range = [p for p in wheel_primes if lo <= p < hi]
+    if len(in_range) > 0:
+        yield np.array(in_range, dtype=np.int64)
+    if hi <= lo:
+        return
+    modulus, residues = wheelResidues(wheel_primes)
+    rank = np.zeros(modulus, dtype=np.int32)
+    rank[residues] = np.arange(len(residues), dtype=np.int32)
+    base_primes = basePrimes(intSqrt(hi - 1))
+    base_primes = base_primes[len(wheel_primes):]
+    turns = max(1, segment_candidates // len(residues))
+    for lo_turn in range(lo // modulus, (hi - 1) // modulus + 1, turns):
+        n_turns = min(turns, (hi - 1) // modulus + 1 - lo_turn)
+        is_prime = wheelSieveSegment(lo_turn, n_turns, modulus, residues, rank, base_primes)
+        found = np.flatnonzero(is_prime)
+        primes = (lo_turn + found // len(residues)) * modulus + residues[found % len(residues)]
+        yield primes[np.searchsorted(primes, lo):np.searchsorted(primes, hi)]
+
+
+def firstPrimeFrom(lo):
+    # type: (nonnegative) -> prime
+    """Returns the smallest prime >= lo"""
+    # By Bertrand's postulate there's always a prime in (n, 2n], but gaps are
+    # much smaller than that in practice so search in small windows.
+    window = 1024
+    while True:
+        for chunk in primeSegments(lo, lo + window):
+            if len(chunk) > 0:
+                return int(chunk[0])
+        lo += window
+        window *= 2
+
+
+def wheelSievePrimes(max_num, plus_one=False, wheel_primes=None):
+    # type: (nonnegative, bool, Optional[List[prime]]) -> List[prime]
+    """Same contract as sievePrimes, but using the wheel sieve"""
+    primes = []  # type: List[prime]
+    for chunk in wheelPrimeSegments(0, max_num + 1, wheel_primes):
+        primes.extend(chunk.tolist())
+    if plus_one:
+        primes.append(firstPrimeFrom(max_num + 1))
+    return primes
+
+
+def countPrimes(lo, hi, segment_odds=SEGMENT_ODDS):
+    # type: (nonnegative, nonnegative, positive) -> nonnegative
+    """Counts the primes in [lo, hi) without holding them all in memory"""
+    total = 0
+    for chunk in primeSegments(lo, hi, segment_odds):
+        total += len(chunk)
+    return total
+
+
+# Set by _attachBasePrimes in each pool worker. Holding onto the
+# SharedMemory object keeps the buffer behind the array mapped.
+_shared_base = None  # type: Optional[Tuple[shared_memory.SharedMemory, np.ndarray]]
+
+
+def _attachBasePrimes(shm_name, n_primes):
+    # type: (str, nonnegative) -> None
+    """Pool initializer that maps the base primes from shared memory, so
+    they're computed and copied once instead of pickled with every task"""
+    global _shared_base
+    shm = shared_memory.SharedMemory(name=shm_name)
+    base = np.ndarray((n_primes,), dtype=np.int64, buffer=shm.buf)
+    _shared_base = (shm, base)
+
+
+def _sieveTask(tup):
+    # type: (Tuple[nonnegative, nonnegative, positive]) -> np.ndarray
+    lo, hi, segment_odds = tup
+    assert _shared_base is not None, "worker wasn't initialized"
+    _shm, base = _shared_base
+    chunks = list(primeSegments(lo, hi, segment_odds, base))
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def parallelPrimeSegments(lo, hi, workers=None, segment_odds=SEGMENT_ODDS):
+    # type: (nonnegative, nonnegative, Optional[positive], positive) -> Iterator[np.ndarray]
+    """Like primeSegments, but the segments are sieved on a pool of worker
+    processes. Arrays are still yielded in increasing order."""
+    assert 0 <= lo, "type violation, expected lo >= 0"
+    assert hi <= MAX_SIEVE, "hi is beyond what int64 offsets can handle"
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    assert workers > 0, "type violation, expected workers > 0"
+    base = basePrimes(intSqrt(max(hi - 1, 0)))
+    if workers == 1:
+        for chunk in primeSegments(lo, hi, segment_odds, base):
+            yield chunk
+        return
+
+    task_span = 2 * segment_odds * SEGMENTS_PER_TASK
+    tasks = [
+        (start, min(start + task_span, hi), segment_odds)
+        for start in range(lo, hi, task_span)
+    ]
+    shm = shared_memory.SharedMemory(create=True, size=max(base.nbytes, 1))
+    try:
+        np.ndarray(base.shape, dtype=np.int64, buffer=shm.buf)[:] = base
+        pool = multiprocessing.Pool(
+            workers,
+            initializer=_attachBasePrimes,
+            initargs=(shm.name, len(base)),
+        )
+        try:
+            # imap keeps the results in task order while still letting the
+            # workers run ahead of the consumer
+            for chunk in pool.imap(_sieveTask, tasks):
+                yield chunk
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def primes_in_range(lo, hi, workers=None, segment_odds=SEGMENT_ODDS):
+    # type: (nonnegative, nonnegative, Optional[positive], positive) -> np.ndarray
+    """Returns an int64 array of every prime in [lo, hi), sieved in parallel
+    across `workers` processes. Unlike getPrimes, this doesn't need to sieve
+    from 2, so windows like [10 ** 12, 10 ** 12 + 10 ** 9) are cheap."""
+    chunks = list(parallelPrimeSegments(lo, hi, workers, segment_odds))
+    if len(chunks) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def main():
+    # type: () -> int
+    parser = argparse.ArgumentParser(
+        description="Streams primes from a segmented sieve of Eratosthenes"
+    )
+    parser.add_argument("hi", type=int, help="The exclusive upper bound")
+    parser.add_argument("--lo", type=int, default=0, help="The inclusive " +
+        "lower bound. Defaults to 0")
+    parser.add_argument("--count", action="store_true", help="Only print " +
+        "the number of primes in range")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="The " +
+        "number of processes to sieve with. Defaults to 1")
+    parser.add_argument("--wheel", action="store_true", help="Sieve only " +
+        "the numbers coprime to %s, in one process" % "*".join(map(str, WHEEL_PRIMES)))
+    parser.add_argument("--segment", type=int, default=SEGMENT_ODDS,
+        help="The number of odd numbers per segment. Defaults to %d" % (
+        SEGMENT_ODDS))
+    args = parser.parse_args()
+
+    assert args.lo >= 0, "--lo must be non-negative"
+    assert args.hi >= args.lo, "hi must be at least --lo"
+    assert args.segment > 0, "--segment must be positive"
+    assert args.workers > 0, "--workers must be positive"
+
+    if args.wheel:
+        chunks = wheelPrimeSegments(args.lo, args.hi)
+    else:
+        chunks = parallelPrimeSegments(args.lo, args.hi, args.workers, args.segment)
+    if args.count:
+        print(sum(len(chunk) for chunk in chunks))
+        return 0
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        sys.stdout.write("\n".join(map(str, chunk.tolist())) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    ret = main()
+    sys.exit(ret)
@@ -0,0 +1,120 @@
+# test_batch_factor.py
+# Trevor Pottinger
+# Sun Oct 18 22:31:05 PDT 2026
+
+import json
+import random
+import unittest
+from math import gcd
+
+import numpy as np
+
+from batch_factor import (
+    Montgomery,
+    batchFactor,
+    factorChunk,
+    formatFactors,
+    gcd64,
+    isPrime64,
+    readNumbers,
+    rho64,
+    trialDivide,
+)
+from factor import factor
+from gen_big import isPrime
+
+# Strong pseudoprimes to the first few prime bases, and primes near 2 ** 64
+TRICKY = [
+    3215031751,
+    2152302898747,
+    3474749660383,
+    341550071728321,
+    3825123056546413051,
+    4294967291 * 4294967279,
+    18446744073709551557,
+    18446744073709551533,
+]
+
+
+class TestBatchFactor(unittest.TestCase):
+
+    def test_montgomery(self):
+        # type: () -> None
+        rng = random.Random(0)
+        n = [rng.randrange(3, 1 << 64) | 1 for _ in range(100)] + [(1 << 64) - 1, 3]
+        a = [rng.randrange(0, m) for m in n]
+        b = [rng.randrange(0, m) for m in n]
+        mont = Montgomery(np.array(n, dtype=np.uint64))
+        out = np.empty(len(n), dtype=np.uint64)
+        mont.mul(np.array(a, dtype=np.uint64), np.array(b, dtype=np.uint64), out)
+        for n_i, a_i, b_i, out_i in zip(n, a, b, out.tolist()):
+            self.assertEqual((out_i << 64) % n_i, (a_i * b_i) % n_i)
+            self.assertLess(out_i, n_i)
+        mont.add(np.array(a, dtype=np.uint64), np.array(b, dtype=np.uint64), out)
+        self.assertEqual(out.tolist(), [(a_i + b_i) % n_i for n_i, a_i, b_i in zip(n, a, b)])
+        self.assertEqual(mont.one().tolist(), [(1 << 64) % n_i for n_i in n])
+        self.assertEqual(gcd64(np.array(a, dtype=np.uint64), mont.n).tolist(),
+            [gcd(a_i, n_i) for a_i, n_i in zip(a, n)])
+
+    def test_trialDivide(self):
+        # type: () -> None
+        values = np.array([1, 2 ** 63, 3 ** 40, 4093 * 4099, (1 << 64) - 1], dtype=np.uint64)
+        rest, found = trialDivide(values)
+        self.assertEqual(rest.tolist(), [1, 1, 1, 4099, 65537 * 6700417])
+        counts = {}  # type: dict
+        for indexes, p in found:
+            for i in indexes.tolist():
+                counts[(i, p)] = counts.get((i, p), 0) + 1
+        # 2 ** 64 - 1 == 3 * 5 * 17 * 257 * 641 * 65537 * 6700417, and 65537
+        # is past BATCH_TRIAL_LIMIT
+        self.assertEqual(counts, {
+            (1, 2): 63, (2, 3): 40, (3, 4093): 1,
+            (4, 3): 1, (4, 5): 1, (4, 17): 1, (4, 257): 1, (4, 641): 1,
+        })
+
+    def test_isPrime64(self):
+        # type: () -> None
+        rng = random.Random(1)
+        n = TRICKY + [rng.randrange(1 << 24, 1 << 64) | 1 for _ in range(2000)]
+        expected = [isPrime(n_i) for n_i in n]
+        self.assertEqual(isPrime64(np.array(n, dtype=np.uint64)).tolist(), expected)
+        self.assertEqual(expected[:8], [False] * 6 + [True] * 2)
+
+    def test_rho64(self):
+        # type: () -> None
+        # The last 10 would take ~2 ** 16 steps, so they're left once the
+        # others are done and fewer than RHO_MIN_ACTIVE are left
+        n = [4099 * 4111] * 10 + [1000003 * 1000033] * 100 + [4294967291 * 4294967279] * 10
+        c = np.arange(len(n)) + 1
+        found = rho64(np.array(n, dtype=np.uint64), c).tolist()
+        for n_i, d in zip(n, found):
+            # A factor, n when the map cycled, or 0 when it stopped
+            self.assertTrue(d == 0 or n_i % d == 0, (n_i, d))
+        self.assertEqual(set(found[:10]) - {4099, 4111}, set())
+        self.assertGreater(len([d for d in found[10:110] if d in (1000003, 1000033)]), 40)
+        self.assertEqual(found[110:], [0] * 10)
+
+    def test_factorChunk(self):
+        # type: () -> None
+        rng = random.Random(2)
+        numbers = [1, 2, 4, 1 << 64, 10 ** 30 + 57, (1 << 64) - 1] + TRICKY
+        numbers += [rng.randrange(1, 1 << 64) for _ in range(3000)]
+        numbers += [rng.randrange(1, 1 << 32) for _ in range(1000)]
+        self.assertEqual(factorChunk(numbers), [factor(n) for n in numbers])
+        pairs = list(batchFactor(iter(numbers[:100]), chunk_size=7))
+        self.assertEqual([n for n, _factors in pairs], numbers[:100])
+
+    def test_io(self):
+        # type: () -> None
+        lines = ["id\tn\n", "a\t12\n", "b\t\n", "c\t7\n"]
+        self.assertEqual(list(readNumbers(lines, 1, True)), [12, 7])
+        self.assertEqual(list(readNumbers(["5\n", "\n", "6"])), [5, 6])
+        self.assertRaises(Exception, lambda: list(readNumbers(["0\n"])))
+        factors = factor(720)
+        self.assertEqual(formatFactors(720, factors), json.dumps(
+            {"n": 720, "factors": {str(p): factors[p] for p in sorted(factors)}}))
+        self.assertEqual(formatFactors(1, {}), '{"n": 1, "factors": {}}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# test_factor.py
+# Trevor Pottinger
+# Sun Oct 18 20:14:52 PDT 2026
+
+import random
+import unittest
+
+from factor import (
+    brentRho,
+    ecm,
+    ecmCurve,
+    factor,
+    intRoot,
+    perfectPower,
+    smallPrimes,
+    TRIAL_LIMIT,
+    trialDivision,
+)
+from gen_big import isPrime
+from quadratic_sieve import slowFactors
+
+# 2 ** 67 - 1, which Cole factored by hand in 1903
+M67 = 147573952589676412927
+# A 12 digit prime times a 28 digit prime. Rho would take ~10 ** 6 steps.
+ECM_N = 100000000003 * 1000000000000000000000000103
+
+
+class TestFactor(unittest.TestCase):
+
+    def test_trialDivision(self):
+        # type: () -> None
+        self.assertEqual(trialDivision(1), ({}, 1))
+        self.assertEqual(trialDivision(360), ({2: 3, 3: 2, 5: 1}, 1))
+        # A cofactor below TRIAL_LIMIT ** 2 has to be prime
+        self.assertEqual(trialDivision(2 * 65537), ({2: 1, 65537: 1}, 1))
+        self.assertEqual(trialDivision(3 * M67), ({3: 1}, M67))
+
+    def test_perfectPower(self):
+        # type: () -> None
+        self.assertEqual(intRoot(10 ** 40, 4), 10 ** 10)
+        self.assertEqual(intRoot(10 ** 40 - 1, 4), 10 ** 10 - 1)
+        self.assertEqual(perfectPower(2 ** 64), (2, 64))
+        self.assertEqual(perfectPower(1000003 ** 6), (1000003, 6))
+        self.assertEqual(perfectPower(36), (6, 2))
+        self.assertEqual(perfectPower(M67), None)
+
+    def test_brentRho(self):
+        # type: () -> None
+        self.assertIn(brentRho(8051), (83, 97))
+        self.assertIn(brentRho(M67), (193707721, 761838257287))
+        self.assertIn(brentRho(2 ** 64 + 1, 3), (274177, 67280421310721))
+        # Way too small of a budget
+        self.assertEqual(brentRho(ECM_N, 1, 0.0), None)
+
+    def test_ecm(self):
+        # type: () -> None
+        for sigma in range(6, 100):
+            g = ecmCurve((ECM_N, 2000, 200000, sigma))
+            if g is not None:
+                self.assertEqual(g, 100000000003)
+                break
+        else:
+            self.fail("no curve found a factor of %d" % ECM_N)
+        self.assertEqual(ecm(ECM_N, max_digits=15), 100000000003)
+        self.assertEqual(ecm(ECM_N, max_digits=10), None)
+
+    def test_factor(self):
+        # type: () -> None
+        self.assertEqual(factor(1), {})
+        self.assertEqual(factor(2), {2: 1})
+        self.assertEqual(factor(M67), {193707721: 1, 761838257287: 1})
+        self.assertEqual(factor(3 ** 40), {3: 40})
+        self.assertEqual(factor(7 * 1000003 ** 3), {7: 1, 1000003: 3})
+        self.assertEqual(factor(ECM_N * 1000003 ** 2),
+            {1000003: 2, 100000000003: 1, 1000000000000000000000000103: 1})
+        # Two 11 digit primes are left for the quadratic sieve
+        n = 10000000019 * 10000000033
+        self.assertEqual(factor(n, rho_seconds=0.0), {10000000019: 1, 10000000033: 1})
+        # and without enough time, n is left as is
+        self.assertEqual(factor(n, rho_seconds=0.0, qs_seconds=0.0), {n: 1})
+
+        rng = random.Random(0)
+        for _ in range(200):
+            n = rng.randrange(2, TRIAL_LIMIT)
+            self.assertEqual(factor(n), slowFactors(n, smallPrimes())[1])
+        for _ in range(50):
+            n = rng.randrange(2, 10 ** 30)
+            factors = factor(n, rho_seconds=0.1)
+            product = 1
+            for p in factors:
+                self.assertTrue(isPrime(p))
+                product *= p ** factors[p]
+            self.assertEqual(product, n)
+
+
+if __name__ == '__main__':
+    unittest.main()
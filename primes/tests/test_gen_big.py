@@ -2,9 +2,25 @@
 # Trevor Pottinger
 # Fri Dec  6 21:23:27 PST 2019
 
+import itertools
 import unittest
 
-from gen_big import (isPowerOfTwo, isPrime, lucasLehmer, millerRabin)
+from gen_big import (
+    WINDOW,
+    bigPrimes,
+    firstPrimeInWindow,
+    isPowerOfTwo,
+    isPrime,
+    isMersennePrime,
+    isSquare,
+    jacobi,
+    lucasLehmer,
+    mersenneScan,
+    millerRabin,
+    sieveWindow,
+    smallPrimes,
+    strongLucasProbablePrime,
+    strongProbablePrime)
 
 
 class TestPrimeGen(unittest.TestCase):
@@ -28,6 +44,44 @@ class TestPrimeGen(unittest.TestCase):
         self.assertTrue(isPrime(29))
         self.assertFalse(isPrime(7918))
         self.assertTrue(isPrime(7919))
+        # Carmichael numbers, which fool the plain Fermat test
+        self.assertFalse(isPrime(561))
+        self.assertFalse(isPrime(41041))
+        self.assertFalse(isPrime(9746347772161))
+        # 3215031751 is a strong pseudoprime to bases 2, 3, 5 and 7
+        self.assertFalse(isPrime(3215031751))
+        self.assertTrue(isPrime(2 ** 61 - 1))
+        # Above the deterministic witnesses, so these use Baillie-PSW
+        self.assertTrue(isPrime(2 ** 89 - 1))
+        self.assertTrue(isPrime(10 ** 30 + 57))
+        self.assertFalse(isPrime((2 ** 61 - 1) * (2 ** 89 - 1)))
+        self.assertFalse(isPrime((10 ** 30 + 57) ** 2))
+
+    def test_strongProbablePrime(self):
+        # type: () -> None
+        # 2047 = 23 * 89 is the smallest strong pseudoprime to base 2
+        self.assertTrue(strongProbablePrime(2047, 2))
+        self.assertFalse(strongProbablePrime(2047, 3))
+        self.assertFalse(strongProbablePrime(561, 2))
+        self.assertTrue(strongProbablePrime(7919, 2))
+
+    def test_strongLucasProbablePrime(self):
+        # type: () -> None
+        # The first few strong Lucas pseudoprimes, see https://oeis.org/A217255
+        pseudoprimes = [5459, 5777, 10877, 16109, 18971]
+        found = [n for n in range(5, 20000, 2) if not isSquare(n) and
+            strongLucasProbablePrime(n) and not isPrime(n)]
+        self.assertEqual(found, pseudoprimes)
+        for n in pseudoprimes:
+            self.assertFalse(strongProbablePrime(n, 2))
+
+    def test_jacobi(self):
+        # type: () -> None
+        self.assertEqual(jacobi(1001, 9907), -1)
+        self.assertEqual(jacobi(19, 45), 1)
+        self.assertEqual(jacobi(8, 21), -1)
+        self.assertEqual(jacobi(5, 21), 1)
+        self.assertEqual(jacobi(3, 21), 0)
 
     def test_lucasLehmer(self):
         # type: () -> None
@@ -40,6 +94,20 @@ class TestPrimeGen(unittest.TestCase):
         self.assertTrue(lucasLehmer(2 ** 3 - 1))
         self.assertFalse(lucasLehmer(2 ** 11 - 1))
         self.assertTrue(lucasLehmer(2 ** 31 - 1))
+        # Too big for math.log to find p exactly
+        self.assertTrue(lucasLehmer(2 ** 1279 - 1))
+        self.assertFalse(lucasLehmer(2 ** 1277 - 1))
+
+    def test_isMersennePrime(self):
+        # type: () -> None
+        # See https://oeis.org/A000043
+        exponents = [2, 3, 5, 7, 13, 17, 19, 31, 61, 89, 107, 127, 521, 607]
+        self.assertEqual([p for p in range(2, 700) if isMersennePrime(p)], exponents)
+        results = list(mersenneScan(80, 130, workers=2))
+        self.assertEqual([r['p'] for r in results], list(range(80, 131)))
+        self.assertEqual([r['p'] for r in results if r['prime']], [89, 107, 127])
+        # Composite exponents are skipped without any squarings
+        self.assertEqual(results[0]['iterations_per_second'], None)
 
     def test_millerRabin(self):
         # type: () -> None
@@ -52,6 +120,37 @@ class TestPrimeGen(unittest.TestCase):
         self.assertTrue(millerRabin(20, 2 ** 19 - 1))
         self.assertTrue(millerRabin(2, 2866150047031629177512058644832339139))
         self.assertFalse(millerRabin(2, 286615004703162917751205864483233912))
+        self.assertFalse(millerRabin(20, 41041))
+
+    def test_sieveWindow(self):
+        # type: () -> None
+        odd_primes = smallPrimes(30)[1:]
+        # The primes themselves aren't sieved out, only their multiples
+        self.assertEqual(sieveWindow(3, 20, odd_primes),
+            [3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41])
+        survivors = sieveWindow(10 ** 20 + 1, 1000)
+        primes = [n for n in range(10 ** 20 + 1, 10 ** 20 + 2001, 2) if isPrime(n)]
+        self.assertTrue(set(primes) <= set(survivors))
+        self.assertTrue(all(n % 3 != 0 and n % 65521 != 0 for n in survivors))
+
+    def test_bigPrimes(self):
+        # type: () -> None
+        found = list(itertools.islice(bigPrimes(64), 20))
+        for n in found:
+            self.assertEqual(n.bit_length(), 64)
+            self.assertTrue(isPrime(n))
+        # Each prime comes from its own random start, not a shared window
+        found.sort()
+        self.assertTrue(all(b - a > 2 * WINDOW for a, b in zip(found, found[1:])))
+        self.assertEqual(firstPrimeInWindow((20, 2 ** 19 + 1, 100)), 2 ** 19 + 21)
+        # 2 ** 20 - 1 is the only odd left with 20 bits, and it's composite
+        self.assertEqual(firstPrimeInWindow((20, 2 ** 20 - 1, 100)), None)
+        self.assertEqual(set(itertools.islice(bigPrimes(3), 10)), set([5, 7]))
+        parallel = bigPrimes(64, workers=2)
+        found = list(itertools.islice(parallel, 20))
+        parallel.close()
+        self.assertEqual(len(set(found)), 20)
+        self.assertTrue(all(n.bit_length() == 64 and isPrime(n) for n in found))
 
 
 if __name__ == '__main__':
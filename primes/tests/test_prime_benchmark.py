@@ -0,0 +1,64 @@
+# test_prime_benchmark.py
+# Trevor Pottinger
+# Mon Oct 19 00:58:03 PDT 2026
+
+import os
+import random
+import tempfile
+import unittest
+
+from prime_benchmark import (
+    FIELDS,
+    benchmark,
+    benchmarkCases,
+    formatRow,
+    loadReport,
+    regressions)
+
+
+class TestPrimeBenchmark(unittest.TestCase):
+
+    def test_benchmarkCases(self):
+        # type: () -> None
+        cases = benchmarkCases([1000, 10 ** 6], ["slowPrimes", "isPrime"], 100, 2)
+        # slowPrimes is quadratic, so it stops at 10 ** 5
+        self.assertEqual(cases, [
+            ("generator", "slowPrimes", 1000, 100, 2),
+            ("test", "isPrime", 1000, 100, 2),
+            ("test", "isPrime", 10 ** 6, 100, 2),
+        ])
+
+    def test_benchmark(self):
+        # type: () -> None
+        # lucasPrimeTest can miss a witness, so keep its picks the same
+        random.seed(0)
+        cases = benchmarkCases([1000], None, 100)
+        results = list(benchmark(cases, isolate=False))
+        self.assertEqual(len(results), len(cases))
+        for result in results:
+            self.assertEqual(sorted(result), sorted(FIELDS))
+            if result["kind"] == "generator":
+                self.assertEqual(result["primes"], 168, result["name"])
+            else:
+                # 1009 through 1097
+                self.assertEqual(result["primes"], 16, result["name"])
+
+    def test_regressions(self):
+        # type: () -> None
+        results = list(benchmark(benchmarkCases([1000], ["isPrime"], 100), isolate=False))
+        for tsv in (False, True):
+            with tempfile.NamedTemporaryFile("w", suffix=".report", delete=False) as f:
+                if tsv:
+                    f.write("\t".join(FIELDS) + "\n")
+                for result in results:
+                    f.write(formatRow(result, tsv) + "\n")
+            baseline = loadReport(f.name)
+            os.remove(f.name)
+            self.assertEqual(regressions(results, baseline, 20.0, 0.0), [])
+            slower = [dict(results[0], seconds=2 * results[0]["seconds"] + 1)]
+            self.assertEqual(len(regressions(slower, baseline, 20.0, 0.0)), 1)
+            self.assertEqual(regressions(slower, baseline, 20.0, 1000.0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# test_prime_pi.py
+# Trevor Pottinger
+# Sun Oct 18 23:58:16 PDT 2026
+
+import random
+import unittest
+from bisect import bisect_right
+
+from easy_primes import getPrimes
+from prime_pi import lucyHedgehog, meisselLehmer, prime_pi
+from sieve import countPrimes
+
+# pi(10 ** k) for k up to 11
+POWERS_OF_TEN = [0, 4, 25, 168, 1229, 9592, 78498, 664579, 5761455,
+    50847534, 455052511, 4118054813]
+
+
+class TestPrimePi(unittest.TestCase):
+
+    def test_small(self):
+        # type: () -> None
+        primes = getPrimes([2], 10000)
+        for x in list(range(-2, 200)) + [7918, 7919, 7920, 10000]:
+            expected = len([p for p in primes if p <= x])
+            self.assertEqual(prime_pi(x), expected, x)
+            self.assertEqual(meisselLehmer(x, 1000), expected, x)
+
+    def test_lucyHedgehog(self):
+        # type: () -> None
+        x = 10 ** 6 + 7
+        small, large = lucyHedgehog(x)
+        primes = getPrimes(max_num=x)
+        self.assertEqual(small.tolist(), [bisect_right(primes, v) for v in range(len(small))])
+        self.assertEqual(large[1:].tolist(),
+            [bisect_right(primes, x // i) for i in range(1, len(large))])
+
+    def test_sieve(self):
+        # type: () -> None
+        rng = random.Random(0)
+        for _ in range(10):
+            x = rng.randrange(10 ** 5, 10 ** 7)
+            expected = countPrimes(0, x + 1)
+            self.assertEqual(prime_pi(x), expected, x)
+            # A tiny table makes the formula recurse
+            self.assertEqual(meisselLehmer(x, 1000), expected, x)
+
+    def test_powers_of_ten(self):
+        # type: () -> None
+        for k, expected in enumerate(POWERS_OF_TEN):
+            self.assertEqual(prime_pi(10 ** k), expected, k)
+        self.assertEqual(prime_pi(10 ** 9, "lehmer"), POWERS_OF_TEN[9])
+        self.assertEqual(meisselLehmer(10 ** 9, 1 << 14), POWERS_OF_TEN[9])
+
+
+if __name__ == '__main__':
+    unittest.main()
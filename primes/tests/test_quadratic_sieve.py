@@ -2,19 +2,39 @@
 # Trevor Pottinger
 # Sat Dec  7 15:20:28 PST 2019
 
+import os
+import random
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
 from quadratic_sieve import (
     bSmoothList,
+    bSmoothListSimple,
+    bSmoothSieve,
+    blockLanczos,
+    factorBaseRoots,
     fermatsMethod,
     findSquareProduct,
+    filterRelations,
     gcd,
+    gf2NullSpace,
+    gf2Pack,
+    gf2RowReduction,
+    gf2Unpack,
     isQuadraticResidue,
+    lComplexity,
+    largeFactors,
     modularRowReduction,
     pollardsRho,
     quadraticSieve,
+    signedFactors,
+    siqsChunk,
     slowFactors,
-    slowPrimes)
+    slowPrimes,
+    tuneParameters)
 
 
 class TestQuadraticSieve(unittest.TestCase):
@@ -47,6 +67,22 @@ class TestQuadraticSieve(unittest.TestCase):
         self.assertEqual(ints, [78, 79, 80, 81, 82, 83, 85, 87, 88])
         self.assertEqual(squares, [125, 282, 441, 602, 765, 930, 1266, 1610, 1785])
 
+    def test_log_sieve(self):
+        # type: () -> None
+        n = 5959
+        primes = [p for p in slowPrimes(229) if isQuadraticResidue(p, n)]
+        for p, roots, _log_p in factorBaseRoots(primes, n):
+            for root in roots:
+                self.assertEqual((root * root - n) % p, 0)
+        # With enough slack every x gets trial divided, so this matches the
+        # simple version exactly
+        self.assertEqual(bSmoothSieve(primes, n, 10, 1000.0),
+            bSmoothListSimple(primes, n, 10))
+        n = 10925004257145179
+        primes = [p for p in slowPrimes(541) if isQuadraticResidue(p, n)]
+        ints, squares = bSmoothSieve(primes, n, 20000)
+        self.assertEqual((ints, squares), bSmoothListSimple(primes, n, 20000))
+
     def test_row_reduction(self):
         # type: () -> None
         self.assertEqual(modularRowReduction([
@@ -94,6 +130,61 @@ class TestQuadraticSieve(unittest.TestCase):
         # so it is a redundant solution.
         _, products = findSquareProduct(None, [10, 24, 35, 52, 54, 78])
         self.assertEqual(products, [1296, 219024])
+        indices, products = findSquareProduct(None, [10, 24, 35, 52, 54, 78], 1)
+        self.assertEqual(indices, [[0, 1, 0, 0, 1, 0]])
+        self.assertEqual(products, [1296])
+        # -1 is a factor too, so -6 * -24 == 144 is a square
+        self.assertEqual(findSquareProduct(None, [-6, 10, -24])[1], [144])
+
+    def test_gf2_row_reduction(self):
+        # type: () -> None
+        rng = random.Random(1)
+        for ncols in [1, 6, 64, 65, 130]:
+            mat = [[rng.randint(0, 1) for _ in range(ncols)] for _ in range(20)]
+            packed = gf2Pack(np.array(mat))
+            self.assertEqual(gf2Unpack(packed, ncols).tolist(), mat)
+            expected = modularRowReduction([row[:] for row in mat], 2)
+            gf2RowReduction(packed, ncols)
+            self.assertEqual(gf2Unpack(packed, ncols).tolist(), expected)
+
+    def test_filter_relations(self):
+        # type: () -> None
+        # 7 only divides 35, and without 35, 5 only divides 10
+        odd_factors = [{2, 5}, {2, 3}, {5, 7}, {13}, {2, 3}, {2, 3, 13}]
+        ints = [10, 24, 35, 52, 54, 78]
+        self.assertEqual(filterRelations(ints, odd_factors), [1, 3, 4, 5])
+        self.assertEqual(filterRelations(ints + [24], odd_factors + [{2, 3}]), [1, 3, 4, 5])
+
+    def test_block_lanczos(self):
+        # type: () -> None
+        rng = random.Random(2)
+        n_primes, n_relations = 500, 520
+        odd_factors = []
+        for _ in range(n_relations):
+            factors = set(rng.randrange(20) for _ in range(3))
+            factors.update(rng.randrange(n_primes) for _ in range(6))
+            odd_factors.append(factors)
+        rows = np.array([p for factors in odd_factors for p in factors])
+        cols = np.array([j for j, factors in enumerate(odd_factors) for _ in factors])
+        block = blockLanczos(rows, cols, n_primes, n_relations)
+        found = 0
+        for bit in range(64):
+            used = np.flatnonzero((block >> np.uint64(bit)) & np.uint64(1))
+            if len(used) == 0:
+                continue
+            found += 1
+            for p in range(n_primes):
+                self.assertEqual(sum(p in odd_factors[j] for j in used) % 2, 0)
+        self.assertGreaterEqual(found, n_relations - n_primes)
+        # gf2NullSpace only uses block Lanczos for bigger matrices, but
+        # both should find vectors in the same null space
+        for max_vectors in [None, 8]:
+            null_space = gf2Unpack(gf2NullSpace(odd_factors, max_vectors), n_relations)
+            self.assertGreater(len(null_space), 0)
+            for row in null_space:
+                used = np.flatnonzero(row).tolist()
+                for p in range(n_primes):
+                    self.assertEqual(sum(p in odd_factors[j] for j in used) % 2, 0)
 
     def test_quadratic_residue(self):
         # type: () -> None
@@ -120,6 +211,93 @@ class TestQuadraticSieve(unittest.TestCase):
         self.assertEqual(quadraticSieve(90283), {137: 1, 659: 1})
         self.assertEqual(quadraticSieve(1811706971, 14), {17299: 1, 104729: 1})
 
+    def test_signed_factors(self):
+        # type: () -> None
+        self.assertEqual(signedFactors(-12, [2, 3]), (True, {-1: 1, 2: 2, 3: 1}))
+        self.assertEqual(signedFactors(-1, [2, 3]), (True, {-1: 1}))
+        self.assertEqual(signedFactors(12, [2, 3]), (True, {2: 2, 3: 1}))
+        self.assertEqual(signedFactors(-14, [2, 3])[0], False)
+
+    def test_siqs(self):
+        # type: () -> None
+        n = 697515884281052138340007
+        primes = [p for p in slowPrimes(1500) if isQuadraticResidue(p, n)]
+        roots = [slowRoot(n, p) for p in primes]
+        ints, squares, larges, num_polys = siqsChunk((n, primes, roots, 5000, 15.0, 1, 42, 0, False))
+        self.assertTrue(num_polys > 1)
+        self.assertTrue(len(ints) > 0)
+        self.assertEqual(set(larges), {()})
+        for u, square in zip(ints, squares):
+            self.assertEqual(u * u - n, square)
+            self.assertTrue(signedFactors(square, primes)[0])
+        # The same polynomials, but keeping values with two large primes too
+        ints, squares, larges, num_polys = siqsChunk((n, primes, roots, 5000, 40.0, 1, 42, 64 * 1489, True))
+        self.assertTrue(any(len(large) == 2 for large in larges))
+        for u, square, large in zip(ints, squares, larges):
+            self.assertEqual(u * u - n, square)
+            for q in large:
+                self.assertTrue(q > 1489 and q <= 64 * 1489)
+                square //= q
+            self.assertTrue(signedFactors(square, primes)[0])
+        self.assertEqual(
+            quadraticSieve(n, 100, 1500, mode="siqs", num_cores=1),
+            {649522587953: 1, 1073890111319: 1})
+        self.assertEqual(
+            quadraticSieve(n, 100, 1500, mode="siqs", num_cores=2),
+            {649522587953: 1, 1073890111319: 1})
+
+    def test_tune_parameters(self):
+        # type: () -> None
+        # sqrt(ln(10 ** 40) * ln ln(10 ** 40)) is about 20.41
+        self.assertAlmostEqual(lComplexity(10 ** 40, 0.5), 26990, delta=100)
+        sizes = [tuneParameters(10 ** digits)["max_prime"] for digits in range(10, 70, 10)]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertEqual(tuneParameters(10 ** 60)["large_primes"], 1)
+        for n, factors in [(5959, {59: 1, 101: 1}), (1811706971, {17299: 1, 104729: 1})]:
+            stats = {}
+            self.assertEqual(
+                quadraticSieve(n, num_cores=1, stats=stats, **tuneParameters(n)), factors)
+            for key in ["factor_base", "sieve", "linear_algebra", "square_root"]:
+                self.assertTrue(stats[key + "_seconds"] >= 0)
+            self.assertTrue(stats["relations"] > stats["factor_base_size"])
+
+    def test_large_primes(self):
+        # type: () -> None
+        self.assertEqual(largeFactors(1, 97, 1000, False), ())
+        self.assertEqual(largeFactors(997, 97, 1000, False), (997,))
+        self.assertEqual(largeFactors(1009, 97, 1000, True), None)
+        self.assertEqual(largeFactors(101 * 991, 97, 1000, False), None)
+        self.assertEqual(largeFactors(991 * 101, 97, 1000, True), (101, 991))
+        self.assertEqual(largeFactors(101 * 1009, 97, 1000, True), None)
+        # Primes bigger than large_limit ** 2 aren't worth trying to split
+        self.assertEqual(largeFactors(999983, 97, 1000, True), None)
+
+        n = 697515884281052138340007
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "relations.tsv")
+            for large_primes in [1, 2]:
+                self.assertEqual(
+                    quadraticSieve(n, 100, 1500, mode="siqs", num_cores=1,
+                        large_primes=large_primes, relation_file=path),
+                    {649522587953: 1, 1073890111319: 1})
+            # Everything is in the file now, so this doesn't have to sieve
+            with open(path) as f:
+                num_lines = len(f.readlines())
+            self.assertEqual(
+                quadraticSieve(n, 100, 1500, mode="siqs", num_cores=1,
+                    large_primes=2, relation_file=path),
+                {649522587953: 1, 1073890111319: 1})
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), num_lines)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+def slowRoot(n, p):
+    # type: (int, int) -> int
+    return [x for x in range(p) if (x * x - n) % p == 0][0]
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,92 @@
+# test_relations.py
+# Trevor Pottinger
+# Sun Oct 18 17:02:44 PDT 2026
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from relations import RelationStore, modInverse
+
+N = 10 ** 9 + 7
+
+
+def square(k, large):
+    # type: (int, tuple) -> tuple
+    """A relation where u ** 2 == value exactly, and large divides value"""
+    u = k
+    for q in large:
+        u *= q
+    return (u, u * u, large)
+
+
+class TestRelations(unittest.TestCase):
+
+    def setUp(self):
+        # type: () -> None
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        # type: () -> None
+        shutil.rmtree(self.dir)
+
+    def test_modInverse(self):
+        # type: () -> None
+        self.assertEqual(modInverse(3, 7), 5)
+        self.assertEqual(modInverse(-3, 7), 2)
+        self.assertEqual((modInverse(1009, N) * 1009) % N, 1)
+        self.assertRaises(AssertionError, lambda: modInverse(6, 9))
+
+    def test_cycles(self):
+        # type: () -> None
+        store = RelationStore(N)
+        self.assertEqual(store.add(*square(2, ())), 1)
+        self.assertEqual(store.add(*square(3, (1009,))), 0)
+        # Two relations with the same large prime make a cycle through 1
+        self.assertEqual(store.add(*square(5, (1009,))), 1)
+        self.assertEqual(store.add(*square(7, (1013, 1019))), 0)
+        self.assertEqual(store.add(*square(11, (1009, 1013))), 0)
+        # 1 - 1009 - 1013 - 1019 - 1
+        self.assertEqual(store.add(*square(13, (1019,))), 1)
+        # Repeats are ignored
+        self.assertEqual(store.add(*square(13, (1019,))), 0)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.numPartials(), 5)
+        self.assertEqual(sorted(store.partials.keys()), [(1009,), (1009, 1013), (1013, 1019), (1019,)])
+        ints, squares = store.relations()
+        self.assertEqual(ints[0], 2)
+        for u, value in zip(ints, squares):
+            self.assertEqual((u * u - value) % N, 0)
+        # The large primes are divided out of the combined relations
+        self.assertEqual(squares[1], (3 * 5 * 1009) ** 2)
+        self.assertEqual(squares[2], (3 * 11 * 7 * 13 * 1009 * 1013 * 1019) ** 2)
+
+    def test_resume(self):
+        # type: () -> None
+        path = os.path.join(self.dir, "relations.tsv")
+        store = RelationStore(N, path)
+        store.add(*square(3, (1009,)))
+        store.add(*square(2, ()))
+        store.close()
+        self.assertEqual(len(RelationStore(N, path)), 1)
+
+        store = RelationStore(N, path)
+        store.add(*square(5, (1009,)))
+        store.close()
+        # A run killed part way through a write leaves half a line
+        with open(path, "a") as f:
+            f.write("1019\t13")
+        store = RelationStore(N, path)
+        self.assertEqual(len(store), 2)
+        # and the half line gets replaced by the next relation
+        store.add(*square(7, ()))
+        store.close()
+        store = RelationStore(N, path)
+        self.assertEqual(store.relations()[0], [2, 7, (3 * 5 * 1009) % N])
+        store.close()
+        self.assertRaises(Exception, lambda: RelationStore(N + 2, path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# test_rosetta.py
+# Trevor Pottinger
+# Sun Oct 18 23:12:40 PDT 2026
+
+import random
+import unittest
+from itertools import islice
+
+from gen_big import isPrime
+from rosetta import IsPrimeCached, croft, decompose, primes
+from sieve import iterPrimes
+
+
+class TestRosetta(unittest.TestCase):
+
+    def test_primes(self):
+        # type: () -> None
+        self.assertEqual(list(islice(primes(), 20000)), list(islice(croft(), 20000)))
+        # Tiny thresholds switch to the sieve right away, and a threshold
+        # that's prime has to be yielded exactly once
+        for threshold in (0, 2, 3, 10, 7919):
+            self.assertEqual(list(islice(primes(threshold), 2000)),
+                list(islice(croft(), 2000)), threshold)
+        # Across several segments past the threshold
+        expected = list(iterPrimes(2, 3 * 10 ** 6))
+        self.assertEqual(list(islice(primes(10 ** 5), len(expected))), expected)
+
+    def test_IsPrimeCached(self):
+        # type: () -> None
+        cached = IsPrimeCached(maxsize=4, max_segments=2)
+        rng = random.Random(0)
+        numbers = list(range(-3, 1000)) + [rng.randrange(1, 1 << 45) for _ in range(200)]
+        numbers += [rng.randrange(1 << 39, 1 << 41) for _ in range(200)]
+        for n in numbers:
+            self.assertEqual(cached[n], n > 1 and isPrime(n), n)
+        self.assertEqual(len(cached.answers), 4)
+        self.assertEqual(len(cached.segments), 2)
+
+    def test_decompose(self):
+        # type: () -> None
+        self.assertEqual(list(decompose(360)), [2, 2, 2, 3, 3, 5])
+        self.assertEqual(list(decompose(2 ** 59 - 1)), [179951, 3203431780337])
+
+
+if __name__ == '__main__':
+    unittest.main()
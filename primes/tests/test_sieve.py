@@ -0,0 +1,111 @@
+# test_sieve.py
+# Trevor Pottinger
+# Sun Oct 18 10:48:02 PDT 2026
+
+import unittest
+
+import numpy as np
+
+from easy_primes import getPrimes, getPrimesWithSkips, skipsFromScratch
+from quadratic_sieve import slowPrimes
+from sieve import (
+    basePrimes,
+    countPrimes,
+    intSqrt,
+    iterPrimes,
+    packedSegments,
+    primes_in_range,
+    sievePrimes,
+    unpackSegment,
+    wheelDeltas,
+    wheelPrimeSegments,
+    wheelResidues,
+    wheelSievePrimes)
+
+
+class TestSieve(unittest.TestCase):
+
+    def test_intSqrt(self):
+        # type: () -> None
+        self.assertEqual(intSqrt(0), 0)
+        self.assertEqual(intSqrt(24), 4)
+        self.assertEqual(intSqrt(25), 5)
+        self.assertEqual(intSqrt(10 ** 30 - 1), 10 ** 15 - 1)
+
+    def test_basePrimes(self):
+        # type: () -> None
+        self.assertEqual(basePrimes(1).tolist(), [])
+        self.assertEqual(basePrimes(2).tolist(), [2])
+        self.assertEqual(basePrimes(30).tolist(), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+        self.assertEqual(basePrimes(7919).tolist(), slowPrimes(7919))
+
+    def test_segments(self):
+        # type: () -> None
+        # Tiny segments make sure primes that straddle a boundary are found
+        expected = [p for p in slowPrimes(5000) if p >= 1000]
+        self.assertEqual(list(iterPrimes(1000, 5001, 7)), expected)
+        self.assertEqual(list(iterPrimes(999, 5000, 64)), expected)
+        found = []
+        for start, n_odds, bits in packedSegments(1000, 5001, 33):
+            found.extend(unpackSegment(start, n_odds, bits).tolist())
+        self.assertEqual(found, expected)
+
+    def test_sievePrimes(self):
+        # type: () -> None
+        self.assertEqual(sievePrimes(2), [2])
+        self.assertEqual(sievePrimes(10), [2, 3, 5, 7])
+        self.assertEqual(sievePrimes(11, True), [2, 3, 5, 7, 11, 13])
+        self.assertEqual(sievePrimes(7919), getPrimes([2], 7919))
+        self.assertEqual(sievePrimes(1000, True), getPrimes([2], 1000, True))
+        self.assertEqual(getPrimes(max_num=1000, plus_one=True), getPrimes([2], 1000, True))
+
+    def test_wheel(self):
+        # type: () -> None
+        modulus, residues = wheelResidues([2, 3, 5])
+        self.assertEqual(modulus, 30)
+        self.assertEqual(residues.tolist(), [1, 7, 11, 13, 17, 19, 23, 29])
+        self.assertEqual(wheelDeltas([2, 3, 5])[1].tolist(), [6, 4, 2, 4, 2, 4, 6, 2])
+        for wheel in ([2], [2, 3], [2, 3, 5, 7], [2, 3, 5, 7, 11]):
+            self.assertEqual(wheelDeltas(wheel)[1].tolist(), skipsFromScratch(wheel))
+        # phi(2 * 3 * 5 * 7 * 11 * 13 * 17) == 92160
+        modulus, deltas = wheelDeltas([2, 3, 5, 7, 11, 13, 17])
+        self.assertEqual((modulus, len(deltas), deltas.dtype), (510510, 92160, np.int32))
+        self.assertEqual(int(deltas.sum()), modulus)
+
+    def test_wheelPrimeSegments(self):
+        # type: () -> None
+        primes = slowPrimes(20000)
+        for wheel in ([2], [2, 3, 5], [2, 3, 5, 7, 11, 13]):
+            # Tiny segments, and ranges that start and end inside a turn
+            for lo, hi in [(0, 20000), (0, 3), (1, 2), (13, 14), (999, 15015), (5000, 5001), (7, 7)]:
+                found = []
+                for chunk in wheelPrimeSegments(lo, hi, wheel, 64):
+                    found.extend(chunk.tolist())
+                self.assertEqual(found, [p for p in primes if lo <= p < hi], (wheel, lo, hi))
+        found = np.concatenate(list(wheelPrimeSegments(10 ** 12, 10 ** 12 + 10 ** 6)))
+        self.assertEqual(found.tolist(), list(iterPrimes(10 ** 12, 10 ** 12 + 10 ** 6)))
+        self.assertEqual(wheelSievePrimes(1000, True), getPrimes([2], 1000, True))
+        for n in (10, 29, 30, 31, 1000):
+            self.assertEqual(getPrimesWithSkips([2, 3, 5, 7], n, True), getPrimes([2], n, True))
+            self.assertEqual(getPrimesWithSkips(max_num=n, plus_one=True), getPrimes([2], n, True))
+
+    def test_countPrimes(self):
+        # type: () -> None
+        # pi(10 ** 6) == 78498, see https://oeis.org/A006880
+        self.assertEqual(countPrimes(0, 10 ** 6), 78498)
+        # The primes between 10 ** 12 and 10 ** 12 + 1000
+        self.assertEqual(countPrimes(10 ** 12, 10 ** 12 + 1000), 37)
+        self.assertEqual(countPrimes(5, 5), 0)
+
+    def test_primes_in_range(self):
+        # type: () -> None
+        expected = [p for p in slowPrimes(20000) if p >= 1000]
+        self.assertEqual(primes_in_range(1000, 20001, 1, 64).tolist(), expected)
+        # Small segments so the range gets split across several tasks
+        self.assertEqual(primes_in_range(1000, 20001, 3, 64).tolist(), expected)
+        self.assertEqual(primes_in_range(0, 12, 2).tolist(), [2, 3, 5, 7, 11])
+        self.assertEqual(primes_in_range(24, 29, 2).tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
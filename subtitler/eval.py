@@ -3,12 +3,13 @@
 # Thu May 21 22:33:15 PDT 2020
 
 import argparse
+import os
 import sys
 from typing import List, Optional
 
 import pandas as pd
 
-from misc import evalModel
+from misc import FEATURE_CACHE_DIR, evalModel
 
 
 def main() -> None:
@@ -19,6 +20,12 @@ def main() -> None:
   parser.add_argument('--limit', type=float, help='The number of seconds ' +
                       'to take from the beginning of each file')
   parser.add_argument('--test', action='store_true', help='Prints perf')
+  parser.add_argument('--cache_dir', default=FEATURE_CACHE_DIR, help='Where ' +
+                      'to keep the features computed from each file. ' +
+                      'Default is %s' % FEATURE_CACHE_DIR)
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                      help='The number of processes that extract features. ' +
+                      'Default is the number of CPUs')
   args = parser.parse_args()
 
   eval_files = args.files.split(',')
@@ -31,7 +38,9 @@ def main() -> None:
     list(map(lambda vid: 'data/audios/%s/vocals_left.wav' % vid, eval_files)),
     aws_files,
     label_files,
-    limit_seconds=args.limit
+    limit_seconds=args.limit,
+    cache_dir=args.cache_dir,
+    workers=args.workers
   )
 
   # is_talking.astype(str) is so we include NaNs in the groupby
@@ -3,12 +3,16 @@
 # Mon May 18 19:53:44 PDT 2020
 
 import base64
+import hashlib
+import json
 import math
+import multiprocessing
+import os
 import pickle
 import random
 import sys
 import time
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -22,6 +26,13 @@ import sklearn.tree
 
 
 MIN_LENGTH = 0.000001
+# STFT frames computed at a time, ~20 seconds at 200 windows per second
+STFT_BLOCK_FRAMES = 4096
+# Where loadFeatures keeps magnitudes and labels, see readData
+FEATURE_CACHE_DIR = 'data/features'
+FEATURE_MANIFEST = 'manifest.json'
+# Rows QuantileNormalizer buckets at a time, so each block stays in cache
+NORMALIZE_BLOCK_ROWS = 4096
 
 
 def urandom5() -> str:
@@ -35,27 +46,52 @@ def labelsFromUtterances(
   windows_per_second: int,
   n_rows: int,
 ) -> Tuple[int, np.ndarray]:
-  """return: np.ndarray[ndtype=intish, shape=[n_rows]]"""
-  positive_examples = 0
-  is_talking = np.zeros(n_rows, dtype=np.int8)
-  for item in utterances:
-    # math.ceil rounds up to the latest millisecond for labeling
-    start_i = int(math.ceil(item['start'] * windows_per_second))
-    end_i = int(math.ceil(item['end'] * windows_per_second))
-    for i in range(start_i, min(end_i, n_rows)):
-      is_talking[i] = 1
-      positive_examples += 1
-  return positive_examples, is_talking
-
-
-# TODO use a dataclass instead of a Dict
-def readData(
+  """return: np.ndarray[ndtype=intish, shape=[n_rows]]. positive_examples
+  counts overlapping utterances once per utterance."""
+  if len(utterances) == 0:
+    return 0, np.zeros(n_rows, dtype=np.int8)
+  # np.ceil rounds up to the latest millisecond for labeling
+  starts = np.ceil(np.array([item['start'] for item in utterances]) * windows_per_second)
+  ends = np.ceil(np.array([item['end'] for item in utterances]) * windows_per_second)
+  starts = np.maximum(starts.astype(np.int64), 0)
+  ends = np.minimum(ends.astype(np.int64), n_rows)
+  keep = starts < ends
+  starts = starts[keep]
+  ends = ends[keep]
+  # +1 where each utterance starts and -1 after it ends, so the running sum
+  # is the number of utterances covering each row
+  deltas = np.bincount(starts, minlength=n_rows + 1) - np.bincount(ends, minlength=n_rows + 1)
+  is_talking = (np.cumsum(deltas[:n_rows]) > 0).astype(np.int8)
+  return int(np.sum(ends - starts)), is_talking
+
+
+def readUtterances(utt_file: str) -> List[Dict[str, Any]]:
+  """Reads a TSV of start, end, duration, and content"""
+  utterances = []
+  with open(utt_file, 'rb') as f:
+    for line in f:
+      cols = [s.decode('utf-8') for s in line.rstrip(b'\n').split(b'\t')]
+      utterances.append({
+        'start': float(cols[0]),
+        'end': float(cols[1]),
+        'duration': float(cols[2]),
+        'content': cols[3],
+      })
+  return utterances
+
+
+def openAudio(
   audio_file: str,
-  utt_file: Optional[str],
   limit_seconds: Optional[float],
-) -> Dict[str, Any]:
+) -> Tuple[int, np.ndarray]:
+  """Returns (rate, samples) for the first channel, memory mapped when the
+  format allows it so that nothing is read until it's sliced"""
   # dtype should be np.dtype('int16')
-  rate, all_data = scipy.io.wavfile.read(audio_file)
+  try:
+    rate, all_data = scipy.io.wavfile.read(audio_file, mmap=True)
+  except ValueError:
+    # 24 bit WAVs can't be memory mapped
+    rate, all_data = scipy.io.wavfile.read(audio_file)
 
   # TODO allow for sampling strategies other than first-N and first channel
   if limit_seconds is not None:
@@ -65,69 +101,330 @@ def readData(
 
   if len(data.shape) > 1 and data.shape[1] > 1:
     data = data[:, 0]
+  return int(rate), data
+
 
+def stftSizes(rate: int) -> Tuple[int, int, int]:
+  """Returns (window_size, step_size, windows_per_second) for a sample rate"""
   # try wrapping in `int(2 ** math.ceil(math.log(.., 2)))`
-  window_size = int(rate) // 100
+  window_size = rate // 100
   step_size = window_size // 2
   # we want windows_per_second to be 200
-  windows_per_second = int(rate) // step_size
-  expected_num_frames = data.shape[0] // step_size
-
-  _freqs, _times, spectro = scipy.signal.stft(
-    data,
-    rate,
-    window='hann', # default, as specified by the documentation
-    nperseg=window_size,
-    noverlap=window_size // 2
-  )
-
-  # TODO why is this step_size and not window_size? stft's output shape is weird
-  if spectro.shape[0] > step_size:
-    spectro = spectro[:step_size]
-  if spectro.shape[1] > expected_num_frames:
-    spectro = spectro[:, :expected_num_frames]
-  if spectro.shape[1] < expected_num_frames:
-    data = data[:spectro.shape[1] * step_size]
-
-  utterances = []
-  if utt_file is not None:
-    # TODO wrap this in a helper method
-    with open(utt_file, 'rb') as f:
-      for line in f:
-        cols = [s.decode('utf-8') for s in line.rstrip(b'\n').split(b'\t')]
-        utterances.append({
-          'start': float(cols[0]),
-          'end': float(cols[1]),
-          'duration': float(cols[2]),
-          'content': cols[3],
-        })
-
+  windows_per_second = rate // step_size
+  return window_size, step_size, windows_per_second
+
+
+def stftFrameCount(n_samples: int, window_size: int, hop: int) -> int:
+  """The number of frames scipy.signal.stft returns with its default zero
+  boundaries and padding, for n_samples >= window_size"""
+  padded = n_samples + 2 * (window_size // 2)
+  padded += (-(padded - window_size) % hop) % window_size
+  return (padded - window_size) // hop + 1
+
+
+def stftBlocks(
+  data: np.ndarray,
+  window_size: int,
+  n_frames: int,
+  block_frames: int = STFT_BLOCK_FRAMES,
+) -> Iterator[np.ndarray]:
+  """Yields the first n_frames rows of scipy.signal.stft(data, window='hann',
+  nperseg=window_size, noverlap=window_size // 2)[2].T, block_frames rows at
+  a time. Each block only reads the samples under its own frames, so memory
+  doesn't grow with len(data)."""
+  hop = window_size - window_size // 2
+  window = scipy.signal.get_window('hann', window_size)
+  scale = 1.0 / window.sum()
+  for first in range(0, n_frames, block_frames):
+    last = min(n_frames, first + block_frames)
+    # Frame i is centered on sample i * hop, and stft pads both ends with
+    # window_size // 2 zeros
+    lo = first * hop - window_size // 2
+    hi = (last - 1) * hop - window_size // 2 + window_size
+    samples = np.zeros(hi - lo, dtype=np.float64)
+    samples[max(lo, 0) - lo : min(hi, len(data)) - lo] = data[max(lo, 0) : min(hi, len(data))]
+    frames = np.lib.stride_tricks.sliding_window_view(samples, window_size)[::hop]
+    spectro = np.fft.rfft(frames * window, axis=1) * scale
+    yield spectro.astype(np.complex64)
+
+
+def featureFrameCount(n_samples: int, window_size: int, step_size: int) -> int:
+  """The number of rows readData returns for n_samples"""
+  hop = window_size - window_size // 2
+  return min(stftFrameCount(n_samples, window_size, hop), n_samples // step_size)
+
+
+def readLabels(
+  utt_file: Optional[str],
+  windows_per_second: int,
+  n_frames: int,
+) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+  """Returns (num_utterances, is_talking, was_talking, was_was_talking).
+  Without a utt_file, is_talking is all NaN."""
+  utterances = readUtterances(utt_file) if utt_file is not None else []
   _num_examples, is_talking = labelsFromUtterances(
-    utterances, 
-    windows_per_second, 
-    spectro.T.shape[0]
+    utterances,
+    windows_per_second,
+    n_frames
   )
   if utt_file is None:
-    is_talking = np.repeat(np.nan, spectro.T.shape[0])
+    is_talking = np.repeat(np.nan, n_frames)
   was_talking = np.hstack([[0], is_talking[:-1]])
   was_was_talking = np.hstack([[0, 0], is_talking[:-2]])
+  return len(utterances), is_talking, was_talking, was_was_talking
+
 
-  # TODO understand stft input and output shapes
-  # Drop the last frame because I don't know how it's derived...
-  return {
+def streamFeatures(
+  audio_file: str,
+  utt_file: Optional[str],
+  limit_seconds: Optional[float],
+  batch_frames: int = STFT_BLOCK_FRAMES,
+) -> Iterator[Dict[str, Any]]:
+  """Yields the rows of readData in batches of batch_frames, without the raw
+  samples. frame_offset is the index of each batch's first row, out of
+  num_frames."""
+  rate, data = openAudio(audio_file, limit_seconds)
+  window_size, step_size, windows_per_second = stftSizes(rate)
+  n_frames = featureFrameCount(len(data), window_size, step_size)
+  num_utterances, is_talking, was_talking, was_was_talking = readLabels(
+    utt_file,
+    windows_per_second,
+    n_frames
+  )
+
+  first = 0
+  for spectro in stftBlocks(data, window_size, n_frames, batch_frames):
+    last = first + spectro.shape[0]
+    # TODO why is this step_size and not window_size? stft's output shape is weird
+    yield {
+      'file_name': audio_file,
+      'label_file_name': utt_file,
+      'signal_rate': rate,
+      'window_size': window_size,
+      'step_size': step_size,
+      'num_utterances': num_utterances,
+      'num_frames': n_frames,
+      'frame_offset': first,
+      'freqs_vec': spectro[:, :step_size],
+      'is_talking': is_talking[first:last],
+      'was_talking': was_talking[first:last],
+      'was_was_talking': was_was_talking[first:last],
+    }
+    first = last
+
+
+# TODO use a dataclass instead of a Dict
+def readData(
+  audio_file: str,
+  utt_file: Optional[str],
+  limit_seconds: Optional[float],
+) -> Dict[str, Any]:
+  """Every row of streamFeatures at once, plus the raw samples"""
+  batches = list(streamFeatures(audio_file, utt_file, limit_seconds))
+  assert len(batches) > 0, 'type violation, expected at least one frame in %s' % audio_file
+  _rate, data = openAudio(audio_file, limit_seconds)
+  step_size = batches[0]['step_size']  # type: int
+  n_frames = sum(batch['freqs_vec'].shape[0] for batch in batches)
+  if n_frames < data.shape[0] // step_size:
+    data = data[:n_frames * step_size]
+
+  ret = dict(batches[0])
+  del ret['num_frames']
+  del ret['frame_offset']
+  ret['data'] = data # TODO remove this line
+  for key in ['freqs_vec', 'is_talking', 'was_talking', 'was_was_talking']:
+    ret[key] = np.concatenate([batch[key] for batch in batches])
+  # TODO(7d79) phoneme
+  return ret
+
+
+def fileDigest(path: str) -> str:
+  """Returns the sha256 of a file's contents, in hex"""
+  digest = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def readManifest(cache_dir: str) -> Dict[str, Dict[str, Any]]:
+  manifest_file = os.path.join(cache_dir, FEATURE_MANIFEST)
+  if not os.path.isfile(manifest_file):
+    return {}
+  with open(manifest_file, 'rb') as f:
+    return json.loads(f.read().decode('utf-8'))
+
+
+def writeManifest(cache_dir: str, manifest: Dict[str, Dict[str, Any]]) -> None:
+  manifest_file = os.path.join(cache_dir, FEATURE_MANIFEST)
+  tmp_file = '%s.%d' % (manifest_file, os.getpid())
+  with open(tmp_file, 'wb') as f:
+    f.write(json.dumps(manifest, sort_keys=True, indent=2).encode('utf-8'))
+  os.replace(tmp_file, manifest_file)
+
+
+def extractFeatures(
+  audio_file: str,
+  utt_file: Optional[str],
+  limit_seconds: Optional[float],
+  cache_dir: str = FEATURE_CACHE_DIR,
+  manifest: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+  """Returns the manifest entry for audio_file's features, computing them
+  into cache_dir unless manifest already has them. Magnitudes are keyed by
+  the audio's sha256 and the STFT parameters, and labels additionally by the
+  label file's sha256. This doesn't write the manifest."""
+  rate, data = openAudio(audio_file, limit_seconds)
+  window_size, step_size, windows_per_second = stftSizes(rate)
+  audio_digest = fileDigest(audio_file)
+  label_digest = fileDigest(utt_file) if utt_file is not None else 'none'
+  limit = 'all' if limit_seconds is None else repr(float(limit_seconds))
+  audio_key = '%s_w%d_s%d_%s' % (audio_digest[:32], window_size, step_size, limit)
+  key = '%s_%s' % (audio_key, label_digest[:32])
+  entry = (manifest or {}).get(key)
+  if entry is not None and all(
+    os.path.isfile(os.path.join(cache_dir, entry[name]))
+    for name in ['magnitudes_file', 'labels_file']
+  ):
+    return entry
+
+  os.makedirs(cache_dir, exist_ok=True)
+  n_frames = featureFrameCount(len(data), window_size, step_size)
+  entry = {
+    'key': key,
     'file_name': audio_file,
     'label_file_name': utt_file,
+    'audio_digest': audio_digest,
+    'label_digest': label_digest,
+    'limit_seconds': limit_seconds,
     'signal_rate': rate,
     'window_size': window_size,
     'step_size': step_size,
-    'num_utterances': len(utterances),
-    'data': data, # TODO remove this line
-    'freqs_vec': spectro.T,
-    'is_talking': is_talking,
-    'was_talking': was_talking,
-    'was_was_talking': was_was_talking,
-    # TODO(7d79) phoneme
+    'num_frames': n_frames,
+    'magnitudes_file': '%s.magnitudes.npy' % audio_key,
+    'labels_file': '%s.labels.npy' % key,
   }
+  magnitudes_file = os.path.join(cache_dir, entry['magnitudes_file'])
+  # Other label files for the same audio may have already computed these
+  if not os.path.isfile(magnitudes_file):
+    tmp_file = '%s.%d.tmp' % (magnitudes_file, os.getpid())
+    # One row per frequency, so that the first num_frequencies are contiguous
+    magnitudes = np.lib.format.open_memmap(
+      tmp_file,
+      mode='w+',
+      dtype=np.float32,
+      shape=(step_size, n_frames)
+    )
+    first = 0
+    for spectro in stftBlocks(data, window_size, n_frames):
+      magnitudes[:, first : first + spectro.shape[0]] = np.abs(spectro[:, :step_size]).T
+      first += spectro.shape[0]
+    magnitudes.flush()
+    del magnitudes
+    os.replace(tmp_file, magnitudes_file)
+
+  num_utterances, is_talking, was_talking, was_was_talking = readLabels(
+    utt_file,
+    windows_per_second,
+    n_frames
+  )
+  entry['num_utterances'] = num_utterances
+  labels_file = os.path.join(cache_dir, entry['labels_file'])
+  tmp_file = '%s.%d.tmp' % (labels_file, os.getpid())
+  with open(tmp_file, 'wb') as f:
+    np.save(f, np.vstack([is_talking, was_talking, was_was_talking]).astype(np.float32))
+  os.replace(tmp_file, labels_file)
+  return entry
+
+
+def openFeatures(entry: Dict[str, Any], cache_dir: str = FEATURE_CACHE_DIR) -> Dict[str, Any]:
+  """Memory maps the arrays of a manifest entry. magnitudes has one row per
+  frame, like freqs_vec, but is a transposed view of the file."""
+  magnitudes = np.load(os.path.join(cache_dir, entry['magnitudes_file']), mmap_mode='r')
+  labels = np.load(os.path.join(cache_dir, entry['labels_file']), mmap_mode='r')
+  ret = dict(entry)
+  ret['magnitudes'] = magnitudes.T
+  ret['is_talking'] = labels[0]
+  ret['was_talking'] = labels[1]
+  ret['was_was_talking'] = labels[2]
+  return ret
+
+
+def loadFeatures(
+  audio_file: str,
+  utt_file: Optional[str],
+  limit_seconds: Optional[float],
+  cache_dir: str = FEATURE_CACHE_DIR,
+) -> Dict[str, Any]:
+  """The cached equivalent of readData, with magnitudes instead of freqs_vec"""
+  return loadAllFeatures([audio_file], [utt_file], limit_seconds, cache_dir)[0]
+
+
+def _extractFeaturesTask(
+  task: Tuple[str, Optional[str], Optional[float], str, Dict[str, Dict[str, Any]]],
+) -> Dict[str, Any]:
+  return extractFeatures(*task)
+
+
+def loadAllFeatures(
+  audio_files: Sequence[str],
+  label_files: Sequence[Optional[str]],
+  limit_seconds: Optional[float],
+  cache_dir: str = FEATURE_CACHE_DIR,
+  workers: int = 1,
+) -> List[Dict[str, Any]]:
+  """loadFeatures for each pair of files, in order. With more than one
+  worker, the files are hashed and extracted in a pool of that many
+  processes, and only this process writes the manifest."""
+  manifest = readManifest(cache_dir)
+  tasks = [
+    (audio_file, label_file, limit_seconds, cache_dir, manifest)
+    for audio_file, label_file in zip(audio_files, label_files)
+  ]
+  if workers == 1 or len(tasks) <= 1:
+    entries = list(map(_extractFeaturesTask, tasks))
+  else:
+    pool = multiprocessing.Pool(min(workers, len(tasks)))
+    try:
+      entries = pool.map(_extractFeaturesTask, tasks, chunksize=1)
+    finally:
+      pool.close()
+      pool.join()
+
+  changed = [entry for entry in entries if manifest.get(entry['key']) != entry]
+  if len(changed) > 0:
+    for entry in changed:
+      manifest[entry['key']] = entry
+    writeManifest(cache_dir, manifest)
+  return [openFeatures(entry, cache_dir) for entry in entries]
+
+
+def featureFrame(
+  features: List[Dict[str, Any]],
+  num_frequencies: Optional[int] = None,
+) -> Tuple[pd.DataFrame, np.ndarray]:
+  """Returns a DataFrame with a row per frame of every loadFeatures output,
+  and an np.ndarray[dtype=float32, shape=[n_rows, num_frequencies]] of their
+  magnitudes. Only the first num_frequencies are read from the cache."""
+  df = pd.concat([pd.DataFrame(data={
+    'file_name': item['file_name'],
+    'label_file_name': item['label_file_name'],
+    'signal_rate': item['signal_rate'],
+    'window_size': item['window_size'],
+    'step_size': item['step_size'],
+    'num_utterances': item['num_utterances'],
+    'is_talking': item['is_talking'],
+    'was_talking': item['was_talking'],
+    'was_was_talking': item['was_was_talking'],
+  }) for item in features], ignore_index=True)
+  # Labels are stored as float32 to allow NaN, but otherwise they're 0 or 1
+  for name in ['is_talking', 'was_talking', 'was_was_talking']:
+    if not df[name].isna().any():
+      df[name] = df[name].astype(np.int8)
+  magnitudes = np.concatenate([
+    np.asarray(item['magnitudes'][:, :num_frequencies]) for item in features
+  ])
+  return df, magnitudes
 
 
 def dict2packed(data: Dict[str, Any]) -> pd.DataFrame:
@@ -160,63 +457,111 @@ def utterancesFromPredictions(
   windows_per_second: float,
   predictions: np.ndarray,
 ) -> List[Dict[str, Any]]:
-  ones = np.ones(min_word_width)
-  i = 0
-  predicted_utterances = []
-  while i < predictions.shape[0] - min_word_width + 1:
-    # 0 means ~"no words are spoken"
-    if predictions[i] == 0:
-      i += 1
-      continue
-    if (predictions[i : i + min_word_width] != ones).all():
-      predictions[i] = 0
-      i += 1
-      continue
-    for j in range(i + min_word_width, predictions.shape[0]):
-      if predictions[j] == 0:
-        j -= 1
-        break
-    predicted_utterances.append({
-      'start': i / windows_per_second,
-      'end': j / windows_per_second,
-      'duration': (j - i) / windows_per_second,
-      # TODO content is TBD!
-    })
-    i = j + 1
-  return predicted_utterances
+  """Each utterance starts on a non-zero prediction with a 1 somewhere in its
+  first min_word_width frames, and ends right before the first 0 after
+  those frames. Non-zero predictions that didn't start or fall inside an
+  utterance are set to 0 in place."""
+  n = predictions.shape[0]
+  # 0 means ~"no words are spoken"
+  is_zero = predictions == 0
+  ones = np.zeros(n + 1, dtype=np.int64)
+  ones[1:] = np.cumsum(predictions == 1)
+  # can_start[i] is whether predictions[i : i + min_word_width] has a 1
+  n_starts = max(n - min_word_width + 1, 0)
+  can_start = np.zeros(n, dtype=bool)
+  can_start[:n_starts] = ~is_zero[:n_starts] & (
+    ones[min_word_width : min_word_width + n_starts] > ones[:n_starts]
+  )
+  # next_start[i] and next_zero[i] are the first such index >= i, or n
+  indexes = np.arange(n + 1)
+  next_start = np.minimum.accumulate(np.where(np.append(can_start, True), indexes, n)[::-1])[::-1]
+  next_zero = np.minimum.accumulate(np.where(np.append(is_zero, True), indexes, n)[::-1])[::-1]
+
+  # Zeros in an utterance's first min_word_width frames don't end it, so
+  # where one starts depends on where the last one ended. This only loops
+  # once per utterance.
+  bounds = []
+  i = int(next_start[0])
+  while i < n:
+    j = int(next_zero[min(i + min_word_width, n)]) - 1
+    bounds.append((i, j))
+    i = int(next_start[j + 1])
+
+  # +1 where each utterance starts and -1 after it ends, like labelsFromUtterances
+  starts = np.array([i for i, _j in bounds], dtype=np.int64)
+  stops = np.array([j + 1 for _i, j in bounds], dtype=np.int64)
+  deltas = np.bincount(starts, minlength=n + 1) - np.bincount(stops, minlength=n + 1)
+  in_utterance = np.cumsum(deltas[:n]) > 0
+  short = ~is_zero & ~in_utterance
+  short[n_starts:] = False
+  predictions[short] = 0
+
+  return [{
+    'start': i / windows_per_second,
+    'end': j / windows_per_second,
+    'duration': (j - i) / windows_per_second,
+    # TODO content is TBD!
+  } for i, j in bounds]
+
+
+class QuantileNormalizer(object):
+  """Buckets each column by the quantiles of that column in the data it was
+  fit on, so that training and eval share the same buckets"""
+
+  def __init__(self, n_buckets: int) -> None:
+    # TODO scale dtype according to n_buckets
+    assert n_buckets < 250, 'limit n_buckets to fit in int8'
+    self.n_buckets = n_buckets
+    # np.ndarray[shape=[n_buckets - 1, n_columns]]
+    self.quantiles = None  # type: Optional[np.ndarray]
+
+  def fit(self, freqs: np.ndarray) -> 'QuantileNormalizer':
+    buckets = np.arange(1, self.n_buckets) / self.n_buckets
+    self.quantiles = np.quantile(freqs, buckets, axis=0)
+    return self
+
+  def transform(self, freqs: np.ndarray) -> np.ndarray:
+    """return: np.ndarray[dtype=int8, shape=freqs.shape], the same as
+    np.searchsorted(self.quantiles[:, i], freqs[:, i]) for every column i"""
+    assert self.quantiles is not None, 'fit must be called before transform'
+    assert freqs.shape[1] == self.quantiles.shape[1], \
+      'type violation, expected %d columns' % self.quantiles.shape[1]
+    ret = np.zeros(freqs.shape, dtype=np.int8)
+    for first in range(0, freqs.shape[0], NORMALIZE_BLOCK_ROWS):
+      block = freqs[first : first + NORMALIZE_BLOCK_ROWS]
+      out = ret[first : first + NORMALIZE_BLOCK_ROWS]
+      # Counts the boundaries below each value, a row of boundaries at a time
+      for boundaries in self.quantiles:
+        out += block > boundaries
+    return ret
+
+
+def normalizerFile(model_file: str) -> str:
+  """Where trainScorer saves the QuantileNormalizer for model_file"""
+  return model_file + '.normalizer'
 
 
 def normalizeFreqs(freqs: np.ndarray, n_buckets: int) -> np.ndarray:
-  # TODO scale dtype according to n_buckets
-  assert n_buckets < 250, 'limit n_buckets to fit in int8'
-  ret = np.zeros(freqs.shape, dtype=np.int8)
-  buckets = list(map(lambda n: n / n_buckets, range(1, n_buckets)))
-  # Take the transpose so each row represents the quantile summaries for
-  # each column in freqs
-  quantiles = np.quantile(freqs, buckets, axis=0).T
-  # Enumerate each column of input
-  # TODO vectorize this...
-  for i in range(freqs.shape[1]):
-    ret[:, i] = np.searchsorted(quantiles[i], freqs[:, i])
-  return ret
+  return QuantileNormalizer(n_buckets).fit(freqs).transform(freqs)
 
 
 # Copied from notebooks/test-training.ipynb
 def trainScorer(
   df: pd.DataFrame,
+  magnitudes: np.ndarray,
   out_file_name: str,
   n_iter: int = 10,
   num_frequencies: int = 60,
   rand_int: Optional[int] = None,
   num_normalization_buckets: int = 20,
 ) -> str:
-  # TODO(177c) also output the quantiles that are derived in normalization
-  # Normalize the features
-  normalized = np.abs(np.asarray(df.freqs_vec.tolist()))[:, :num_frequencies]
-  # normalized = normalizeFreqs(
-    # np.abs(np.asarray(df.freqs_vec.tolist()))[:, :num_frequencies],
-    # num_normalization_buckets
-  # )
+  # Normalize the features, and save the quantiles for scoreMagnitudes
+  normalizer = QuantileNormalizer(num_normalization_buckets)
+  normalizer.fit(magnitudes[:, :num_frequencies])
+  with open(normalizerFile(out_file_name), 'wb') as normalizer_file:
+    pickle.dump(normalizer, normalizer_file)
+  # As floats, since np.square would overflow int8
+  normalized = normalizer.transform(magnitudes[:, :num_frequencies]).astype(np.float32)
 
   distances = np.zeros(df.shape[0])
   distances[1:] = np.sqrt(np.sum(
@@ -288,22 +633,18 @@ def trainScorer(
   # end def trainScorer
 
 
-def evalScorer(
+def scoreMagnitudes(
   model_file: str,
-  audio_files: List[str],
-  tsv_files: Sequence[Optional[str]],
-  num_frequencies: int = 60,
-  limit_seconds: float = 600.0,
-  num_normalization_buckets: int = 20,
-) -> Tuple[pd.DataFrame, np.ndarray]:
-  read_func = lambda aud, tsv: dict2packed(readData(aud, tsv, limit_seconds))
-  eval_df = pd.concat([read_func(*files) for files in zip(audio_files, tsv_files)])
-  # TODO(177c) use the quantiles that are derived in normalization
-  eval_normalized = np.abs(np.asarray(eval_df.freqs_vec.tolist()))[:, :num_frequencies]
-  # eval_normalized = normalizeFreqs(
-    # np.abs(np.asarray(eval_df.freqs_vec.tolist()))[:, :num_frequencies],
-    # num_normalization_buckets
-  # )
+  eval_magnitudes: np.ndarray,
+) -> np.ndarray:
+  """Returns the scorer's probability of talking for each row of
+  eval_magnitudes, which should have the num_frequencies it was trained on"""
+  eval_normalized = eval_magnitudes
+  # Scorers saved before normalization was added don't have one
+  if os.path.isfile(normalizerFile(model_file)):
+    with open(normalizerFile(model_file), 'rb') as normalizer_file:
+      normalizer = pickle.load(normalizer_file)
+    eval_normalized = normalizer.transform(eval_magnitudes).astype(np.float32)
 
   with open(model_file, 'rb') as model_f:
     # TODO mmap read the model file to avoid the IO hit
@@ -311,7 +652,7 @@ def evalScorer(
     # models from people you don't know.
     model = pickle.load(model_f)
 
-  distances = np.zeros(eval_df.shape[0])
+  distances = np.zeros(eval_normalized.shape[0])
   distances[1:] = np.sqrt(np.sum(
     np.square(eval_normalized[:-1] - eval_normalized[1:]),
     axis=1
@@ -322,7 +663,7 @@ def evalScorer(
   # ever so slightly exceed 1.0.
   unit_lengths = np.sqrt(np.sum(np.square(eval_normalized), axis=1))
   unit_lengths[unit_lengths < MIN_LENGTH] = MIN_LENGTH
-  angles = np.zeros(eval_df.shape[0])
+  angles = np.zeros(eval_normalized.shape[0])
   numerators = np.sum(eval_normalized[1:] * eval_normalized[:-1], axis=1)
   denominators = unit_lengths[1:] * unit_lengths[:-1]
   # This avoids np.arccos resulting in np.nan
@@ -337,27 +678,59 @@ def evalScorer(
     unit_lengths.reshape(-1, 1),
     eval_normalized,
   ]))[:, 1]  # always take the probability of the second class
+  return scores
+  # end def scoreMagnitudes
 
+
+def evalScorer(
+  model_file: str,
+  audio_files: List[str],
+  tsv_files: Sequence[Optional[str]],
+  num_frequencies: int = 60,
+  limit_seconds: Optional[float] = 600.0,
+  num_normalization_buckets: int = 20,
+  cache_dir: str = FEATURE_CACHE_DIR,
+  workers: int = 1,
+) -> Tuple[pd.DataFrame, np.ndarray]:
+  eval_df, eval_magnitudes = featureFrame(loadAllFeatures(
+    audio_files,
+    tsv_files,
+    limit_seconds,
+    cache_dir,
+    workers
+  ), num_frequencies)
+  # num_normalization_buckets is saved with the scorer now
+  scores = scoreMagnitudes(model_file, eval_magnitudes)
   return eval_df, scores
   # end def evalScorer
 
 
 def trainModel(
-  df: pd.DataFrame,
   out_file_name: str,
   out_file_name2: str,
   audio_files: List[str],
   label_files: List[str],
   n_iter: int = 10,
   num_frequencies: int = 60,
-  limit_seconds: float = 600.0,
+  limit_seconds: Optional[float] = 600.0,
   rand_int: Optional[int] = None,
   num_normalization_buckets: int = 20,
+  cache_dir: str = FEATURE_CACHE_DIR,
+  workers: int = 1,
 ) -> Tuple[str, str]:
   start = time.time()
   print('Starting training at %f' % start, file=sys.stderr)
+  # Both stages train on these same rows
+  df, magnitudes = featureFrame(loadAllFeatures(
+    audio_files,
+    label_files,
+    limit_seconds,
+    cache_dir,
+    workers
+  ), num_frequencies)
   scorer_file = trainScorer(
     df,
+    magnitudes,
     out_file_name,
     n_iter,
     num_frequencies,
@@ -365,15 +738,7 @@ def trainModel(
     num_normalization_buckets,
   )
 
-  # TODO don't read the audio files twice
-  eval_df, scores = evalScorer(
-    scorer_file,
-    audio_files,
-    label_files,
-    num_frequencies,
-    limit_seconds,
-    num_normalization_buckets
-  )
+  scores = scoreMagnitudes(scorer_file, magnitudes)
 
   utterances = []
   for utt_file in label_files:
@@ -434,8 +799,10 @@ def evalModel(
   aws_files: List[str],
   label_files: Sequence[Optional[str]],
   num_frequencies: int = 60,
-  limit_seconds: float = 600.0,
+  limit_seconds: Optional[float] = 600.0,
   num_normalization_buckets: int = 20,
+  cache_dir: str = FEATURE_CACHE_DIR,
+  workers: int = 1,
 ) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
   with open(model_file, 'rb') as model_f:
     # TODO mmap read the model file to avoid the IO hit
@@ -449,7 +816,9 @@ def evalModel(
     aws_files,
     num_frequencies,
     limit_seconds,
-    num_normalization_buckets
+    num_normalization_buckets,
+    cache_dir,
+    workers
   )
 
   utterances = []
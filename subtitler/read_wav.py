@@ -7,7 +7,7 @@ import sys
 
 import pandas as pd
 
-from misc import dict2packed, readData
+from misc import FEATURE_CACHE_DIR, featureFrame, loadFeatures
 
 
 def main() -> None:
@@ -15,13 +15,21 @@ def main() -> None:
   parser.add_argument('file', help='A video ID')
   parser.add_argument('--limit', type=float, help='The number of seconds ' +
                       'to take from the beginning of each file')
+  parser.add_argument('--cache_dir', default=FEATURE_CACHE_DIR, help='Where ' +
+                      'to keep the features computed from each file. ' +
+                      'Default is %s' % FEATURE_CACHE_DIR)
   args = parser.parse_args()
-  # use pd.concat if this needs to read multiple files
-  df = dict2packed(readData(
+  # pass more loadFeatures outputs if this needs to read multiple files
+  df, magnitudes = featureFrame([loadFeatures(
     'data/audios/%s.wav' % args.file,
     'data/tsvs/%s.tsv' % args.file,
-    limit_seconds=args.limit
-  ))
+    limit_seconds=args.limit,
+    cache_dir=args.cache_dir
+  )])
+  df = pd.concat([df, pd.DataFrame(
+    data=magnitudes,
+    columns=['magnitude_%d' % i for i in range(magnitudes.shape[1])]
+  )], axis=1)
   df.to_csv(sys.stdout, sep='\t', index=False)
   return
 
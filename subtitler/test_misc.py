@@ -2,11 +2,73 @@
 # Trevor Pottinger
 # Mon May 18 20:32:40 PDT 2020
 
+import math
+import os
+import pickle
+import tempfile
 import unittest
 
+import numpy as np
 import pandas as pd
+import scipy.io.wavfile
+import scipy.signal
 
-from misc import dict2packed, readData
+from misc import (
+  QuantileNormalizer,
+  dict2packed,
+  featureFrame,
+  labelsFromUtterances,
+  loadAllFeatures,
+  loadFeatures,
+  normalizerFile,
+  readData,
+  readManifest,
+  scoreMagnitudes,
+  streamFeatures,
+  trainScorer,
+  utterancesFromPredictions,
+)
+
+
+def loopUtterancesFromPredictions(min_word_width, windows_per_second, predictions):
+  """The original one frame at a time utterancesFromPredictions"""
+  ones = np.ones(min_word_width)
+  i = 0
+  predicted_utterances = []
+  while i < predictions.shape[0] - min_word_width + 1:
+    if predictions[i] == 0:
+      i += 1
+      continue
+    if (predictions[i : i + min_word_width] != ones).all():
+      predictions[i] = 0
+      i += 1
+      continue
+    # The original left j unset when i + min_word_width == len(predictions)
+    j = predictions.shape[0] - 1
+    for j in range(i + min_word_width, predictions.shape[0]):
+      if predictions[j] == 0:
+        j -= 1
+        break
+    predicted_utterances.append({
+      'start': i / windows_per_second,
+      'end': j / windows_per_second,
+      'duration': (j - i) / windows_per_second,
+    })
+    i = j + 1
+  return predicted_utterances
+
+
+def loopLabelsFromUtterances(utterances, windows_per_second, n_rows):
+  """The original one frame at a time labelsFromUtterances"""
+  positive_examples = 0
+  is_talking = np.zeros(n_rows, dtype=np.int8)
+  for item in utterances:
+    start_i = int(math.ceil(item['start'] * windows_per_second))
+    end_i = int(math.ceil(item['end'] * windows_per_second))
+    for i in range(start_i, min(end_i, n_rows)):
+      is_talking[i] = 1
+      positive_examples += 1
+  return positive_examples, is_talking
 
 
 class TestMisc(unittest.TestCase):
@@ -29,6 +91,151 @@ class TestMisc(unittest.TestCase):
     # TODO this shouldn't require a sum(), these should both be scalars
     assert counts.loc[1, 1, 1].sum() > counts.loc[1, 0, 0].sum()
 
+  def test_streaming(self):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+      utt_file = os.path.join(tmp, 'utts.tsv')
+      with open(utt_file, 'wb') as f:
+        f.write(b'0.5\t1.25\t0.75\thello\n2.0\t9.0\t7.0\tworld\n')
+      # 44100 has an odd window, so stft's hop isn't step_size
+      for rate in [44100, 48000]:
+        audio_file = os.path.join(tmp, '%d.wav' % rate)
+        all_data = rng.integers(-2 ** 15, 2 ** 15, (rate * 3 + 17, 2)).astype(np.int16)
+        scipy.io.wavfile.write(audio_file, rate, all_data)
+        data = all_data[:, 0]
+        window_size = rate // 100
+        step_size = window_size // 2
+        _freqs, _times, spectro = scipy.signal.stft(
+          data,
+          rate,
+          window='hann',
+          nperseg=window_size,
+          noverlap=window_size // 2
+        )
+        expected = spectro[:step_size, :data.shape[0] // step_size].T
+
+        batches = list(streamFeatures(audio_file, utt_file, None, 100))
+        self.assertTrue(all(batch['freqs_vec'].shape[0] == 100 for batch in batches[:-1]))
+        self.assertEqual([batch['frame_offset'] for batch in batches],
+          list(range(0, expected.shape[0], 100)))
+        streamed = np.concatenate([batch['freqs_vec'] for batch in batches])
+        self.assertEqual(streamed.shape, expected.shape)
+        np.testing.assert_allclose(streamed, expected, rtol=0, atol=1e-2)
+
+        read = readData(audio_file, utt_file, None)
+        np.testing.assert_array_equal(read['freqs_vec'], streamed)
+        # The samples are only cut when stft came up short
+        if spectro.shape[1] < data.shape[0] // step_size:
+          self.assertEqual(read['data'].shape[0], spectro.shape[1] * step_size)
+        else:
+          self.assertEqual(read['data'].shape[0], data.shape[0])
+        self.assertEqual(read['num_utterances'], 2)
+        # The second utterance runs past the end of the audio
+        self.assertEqual(int(read['is_talking'].sum()), 150 + 200)
+        np.testing.assert_array_equal(read['was_talking'][1:], read['is_talking'][:-1])
+
+  def test_feature_cache(self):
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+      cache_dir = os.path.join(tmp, 'features')
+      audio_file = os.path.join(tmp, 'audio.wav')
+      utt_file = os.path.join(tmp, 'utts.tsv')
+      scipy.io.wavfile.write(audio_file, 16000, rng.integers(-2 ** 15, 2 ** 15, 16000 * 2).astype(np.int16))
+      with open(utt_file, 'wb') as f:
+        f.write(b'0.5\t1.0\t0.5\thello\n')
+
+      read = readData(audio_file, utt_file, None)
+      features = loadFeatures(audio_file, utt_file, None, cache_dir)
+      self.assertIsInstance(features['magnitudes'], np.memmap)
+      np.testing.assert_array_equal(features['magnitudes'], np.abs(read['freqs_vec']))
+      for name in ['is_talking', 'was_talking', 'was_was_talking']:
+        np.testing.assert_array_equal(features[name], read[name])
+      self.assertEqual(len(readManifest(cache_dir)), 1)
+
+      # The second load reads the files back, and a new label file shares
+      # the magnitudes
+      magnitudes_file = os.path.join(cache_dir, features['magnitudes_file'])
+      mtime = os.stat(magnitudes_file).st_mtime_ns
+      self.assertEqual(loadFeatures(audio_file, utt_file, None, cache_dir)['key'], features['key'])
+      unlabeled = loadFeatures(audio_file, None, None, cache_dir)
+      self.assertEqual(unlabeled['magnitudes_file'], features['magnitudes_file'])
+      self.assertEqual(os.stat(magnitudes_file).st_mtime_ns, mtime)
+      self.assertEqual(len(readManifest(cache_dir)), 2)
+
+      df, magnitudes = featureFrame([features, features], 30)
+      self.assertEqual(magnitudes.shape, (2 * read['freqs_vec'].shape[0], 30))
+      self.assertEqual(df.shape[0], magnitudes.shape[0])
+      self.assertEqual(df.is_talking.dtype, np.int8)
+      self.assertEqual(int(df.is_talking.sum()), 2 * 100)
+      df, magnitudes = featureFrame([unlabeled])
+      self.assertTrue(df.is_talking.isna().all())
+      self.assertEqual(magnitudes.shape, read['freqs_vec'].shape)
+
+  def test_parallel_features(self):
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as tmp:
+      audio_files = []
+      for i in range(3):
+        audio_files.append(os.path.join(tmp, '%d.wav' % i))
+        scipy.io.wavfile.write(audio_files[-1], 16000, rng.integers(-2 ** 15, 2 ** 15, 16000 * (i + 1)).astype(np.int16))
+      label_files = [None] * len(audio_files)
+      parallel = loadAllFeatures(audio_files, label_files, None, os.path.join(tmp, 'a'), workers=2)
+      serial = loadAllFeatures(audio_files, label_files, None, os.path.join(tmp, 'b'))
+      self.assertEqual([item['file_name'] for item in parallel], audio_files)
+      for a, b in zip(parallel, serial):
+        np.testing.assert_array_equal(a['magnitudes'], b['magnitudes'])
+      self.assertEqual(len(readManifest(os.path.join(tmp, 'a'))), len(audio_files))
+
+  def test_utterances(self):
+    rng = np.random.default_rng(3)
+    for trial in range(2000):
+      n_rows = int(rng.integers(0, 80))
+      min_word_width = int(rng.integers(1, 10))
+      if trial % 3 == 0:
+        predictions = (rng.random(n_rows) < rng.random()).astype(np.int8)
+      else:
+        # Anything besides 0 and 1 can be zeroed out in place
+        predictions = rng.choice([0.0, 1.0, 0.5, np.nan], n_rows)
+      expected_predictions = predictions.copy()
+      expected = loopUtterancesFromPredictions(min_word_width, 200, expected_predictions)
+      self.assertEqual(utterancesFromPredictions(min_word_width, 200, predictions), expected)
+      np.testing.assert_array_equal(predictions, expected_predictions)
+
+      utterances = [{'start': float(start), 'end': float(start + length)} for start, length in zip(
+        rng.random(int(rng.integers(0, 6))) * 0.5,
+        rng.random(6) * 0.1 - 0.02,
+      )]
+      expected_count, expected_labels = loopLabelsFromUtterances(utterances, 200, n_rows)
+      count, labels = labelsFromUtterances(utterances, 200, n_rows)
+      self.assertEqual(count, expected_count)
+      np.testing.assert_array_equal(labels, expected_labels)
+
+  def test_normalizer(self):
+    rng = np.random.default_rng(4)
+    train = np.abs(rng.normal(size=(5000, 7))).astype(np.float32)
+    train[:, 3] = 1.0  # every quantile is the same
+    normalizer = QuantileNormalizer(20).fit(train)
+    normalizer = pickle.loads(pickle.dumps(normalizer))
+    freqs = np.abs(rng.normal(size=(9000, 7))).astype(np.float32)
+    freqs[:10] = normalizer.quantiles[5]
+    expected = np.zeros(freqs.shape, dtype=np.int8)
+    for i in range(freqs.shape[1]):
+      expected[:, i] = np.searchsorted(normalizer.quantiles[:, i], freqs[:, i])
+    np.testing.assert_array_equal(normalizer.transform(freqs), expected)
+    self.assertEqual(normalizer.transform(train).max(), 19)
+
+  def test_scorer(self):
+    rng = np.random.default_rng(5)
+    is_talking = (np.arange(3000) // 100 % 2).astype(np.int8)
+    magnitudes = np.abs(rng.normal(size=(3000, 10)) + 3 * is_talking.reshape(-1, 1)).astype(np.float32)
+    df = pd.DataFrame(data={'is_talking': is_talking})
+    with tempfile.TemporaryDirectory() as tmp:
+      scorer_file = trainScorer(df, magnitudes, os.path.join(tmp, 'scorer'), 1, 10, 0, 20)
+      self.assertTrue(os.path.isfile(normalizerFile(scorer_file)))
+      scores = scoreMagnitudes(scorer_file, magnitudes)
+    self.assertEqual(scores.shape, (3000,))
+    self.assertGreater(np.mean((scores > 0.5) == is_talking), 0.9)
+
   # TODO test the following
   # >>> df = pd.concat([dict2packed(readData('audios/%s.wav' % in_file, 'data/tsvs/%s.tsv' % in_file, 180)) for in_file in ['NrgmdOz227I']])
   # >>> model_file = trainModel(df, 'data/models/%s' % urandom5())
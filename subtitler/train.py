@@ -5,9 +5,7 @@
 import argparse
 import os
 
-import pandas as pd
-
-from misc import dict2packed, readData, trainModel, urandom5
+from misc import FEATURE_CACHE_DIR, trainModel, urandom5
 
 
 def main() -> None:
@@ -18,6 +16,12 @@ def main() -> None:
   parser.add_argument('--n_iter', type=int, default=10, help='The number of ' +
                       'iterations that RandomizedSearchCV should use. ' +
                       'Default is 10')
+  parser.add_argument('--cache_dir', default=FEATURE_CACHE_DIR, help='Where ' +
+                      'to keep the features computed from each file. ' +
+                      'Default is %s' % FEATURE_CACHE_DIR)
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                      help='The number of processes that extract features. ' +
+                      'Default is the number of CPUs')
   args = parser.parse_args()
 
   def _labelSelector(in_file: str) -> str:
@@ -25,26 +29,21 @@ def main() -> None:
     if not os.path.isfile(tsv_file):
       tsv_file = 'data/tsvs/aws_%s.tsv' % in_file
     return tsv_file
-  def _readWrapper(in_file: str) -> pd.DataFrame:
-    return dict2packed(readData(
-      'data/audios/%s/vocals_left.wav' % in_file,
-      _labelSelector(in_file),
-      limit_seconds=args.limit
-    ))
 
   train_files = args.files.split(',')
-  df = pd.concat(list(map(_readWrapper, train_files)))
   label_files = list(map(_labelSelector, train_files))
   audio_files = list(map(lambda f: 'data/audios/%s/vocals_left.wav' % f, train_files))
 
   # TODO seed rand_int
   scorer_file, model_file = trainModel(
-    df,
     'data/models/%s' % urandom5(),
     'data/models/%s' % urandom5(),
     audio_files,
     label_files,
-    n_iter=args.n_iter
+    n_iter=args.n_iter,
+    limit_seconds=args.limit,
+    cache_dir=args.cache_dir,
+    workers=args.workers
   )
   print('Saving scorer file to %s' % scorer_file)
   print('Saving model file to %s' % model_file)